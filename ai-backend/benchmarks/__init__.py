@@ -0,0 +1 @@
+# Empty init file for benchmarks package
@@ -0,0 +1,103 @@
+"""
+Benchmark: tutor-stream latency while course reads run concurrently.
+
+Simulates an SSE tutor stream emitting a token every few milliseconds on the
+event loop while a burst of course reads hits Supabase. "before" calls the
+synchronous client inline (as the routes used to); "after" goes through
+services.data_access, which runs queries on its bounded executor.
+
+The Supabase client is replaced with an in-process fake whose ``execute()``
+sleeps for a fixed round-trip time, so no network or credentials are needed.
+
+Usage:
+    cd ai-backend
+    python -m benchmarks.bench_db_blocking --reads 200 --rtt-ms 40
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from services import data_access
+
+
+class _FakeQuery:
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+
+    def __getattr__(self, _name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        time.sleep(self.rtt)
+        return type("Response", (), {"data": [{"id": "course", "title": "Course"}]})()
+
+
+class _FakeClient:
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+
+    def table(self, _name):
+        return _FakeQuery(self.rtt)
+
+
+async def _tutor_stream(tokens: int, interval: float, gaps: list[float]):
+    last = time.perf_counter()
+    for _ in range(tokens):
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        gaps.append((now - last - interval) * 1000)
+        last = now
+
+
+async def _blocking_read(client: _FakeClient):
+    # What the routes did before: a sync .execute() inside async def.
+    client.table("courses").select("*").eq("id", "x").execute()
+    client.table("lessons").select("*").eq("course_id", "x").execute()
+
+
+async def _async_read():
+    await data_access.fetch_course("x")
+    await data_access.fetch_lessons("x")
+
+
+async def _run(mode: str, reads: int, client: _FakeClient, tokens: int, interval: float) -> dict:
+    gaps: list[float] = []
+    stream = asyncio.create_task(_tutor_stream(tokens, interval, gaps))
+    started = time.perf_counter()
+    if mode == "before":
+        await asyncio.gather(*[_blocking_read(client) for _ in range(reads)])
+    else:
+        await asyncio.gather(*[_async_read() for _ in range(reads)])
+    reads_s = time.perf_counter() - started
+    await stream
+
+    gaps.sort()
+    return {
+        "mode": mode,
+        "reads_wall_s": round(reads_s, 3),
+        "token_delay_p50_ms": round(statistics.median(gaps), 2),
+        "token_delay_p99_ms": round(gaps[int(len(gaps) * 0.99) - 1], 2),
+        "token_delay_max_ms": round(gaps[-1], 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reads", type=int, default=100, help="concurrent course reads")
+    parser.add_argument("--rtt-ms", type=float, default=40.0, help="simulated PostgREST round trip")
+    parser.add_argument("--tokens", type=int, default=300, help="tokens in the tutor stream")
+    parser.add_argument("--interval-ms", type=float, default=5.0, help="upstream token interval")
+    args = parser.parse_args()
+
+    client = _FakeClient(args.rtt_ms / 1000)
+    data_access.get_supabase_client = lambda: client
+
+    for mode in ("before", "after"):
+        print(await _run(mode, args.reads, client, args.tokens, args.interval_ms / 1000))
+
+    data_access.shutdown_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
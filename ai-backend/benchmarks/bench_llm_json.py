@@ -0,0 +1,78 @@
+"""
+Micro-benchmark: parsing model JSON output.
+
+Compares the two ad-hoc parsers the routes used before services.llm_json
+(regex over code fences in the quiz route, string replace of fence markers
+in the course generator) with ``parse_llm_json`` on a corpus of malformed
+quiz and course outputs (fences, leading prose, trailing commas and
+max_tokens truncation). Reports how many samples each parser recovers, how
+many complete objects were salvaged, and the cost per parse.
+
+Usage:
+    cd ai-backend
+    python -m benchmarks.bench_llm_json
+"""
+import json
+import re
+import time
+from pathlib import Path
+
+from services.llm_json import parse_llm_json
+
+CORPUS = Path(__file__).parent / "data" / "malformed_llm_outputs.json"
+
+
+def legacy_quiz_parse(text: str):
+    json_match = re.search(r'```(?:json)?\s*([\s\S]*?)```', text)
+    json_str = json_match.group(1) if json_match else text
+    return json.loads(json_str.strip())
+
+
+def legacy_course_parse(text: str):
+    return json.loads(text.replace("```json", "").replace("```", "").strip())
+
+
+def shared_parse(text: str):
+    return parse_llm_json(text).data
+
+
+def _objects(data) -> int:
+    if not isinstance(data, dict):
+        return 0
+    if "questions" in data:
+        return len(data["questions"])
+    return sum(len(m.get("lessons", [])) for m in data.get("modules", []))
+
+
+def run(name, parser, samples, repeat: int) -> dict:
+    ok = salvaged = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for sample in samples:
+            try:
+                data = parser(sample["text"])
+            except Exception:
+                continue
+            ok += 1
+            salvaged += _objects(data)
+    elapsed = time.perf_counter() - started
+    return {
+        "parser": name,
+        "recovered": f"{ok // repeat}/{len(samples)}",
+        "objects_salvaged": salvaged // repeat,
+        "us_per_parse": round(elapsed / (repeat * len(samples)) * 1e6, 1),
+    }
+
+
+def main(repeat: int = 200):
+    samples = json.loads(CORPUS.read_text())
+    for name, parser in (
+        ("legacy_quiz_regex", legacy_quiz_parse),
+        ("legacy_course_replace", legacy_course_parse),
+        ("parse_llm_json", shared_parse),
+    ):
+        print(run(name, parser, samples, repeat))
+
+
+if __name__ == "__main__":
+    main()
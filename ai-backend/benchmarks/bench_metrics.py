@@ -0,0 +1,87 @@
+"""
+Micro-benchmark: cost of metrics collection.
+
+Measures, single-threaded on one event loop:
+
+    record      one labelled histogram observation and one counter increment
+    middleware  a request through MetricsMiddleware around a minimal ASGI
+                endpoint, minus the same request without it
+    stream      the same for an SSE response of 50 frames (header scan,
+                active-stream gauge)
+    scrape      rendering /api/ai/metrics with the populated registry
+
+Usage:
+    cd ai-backend
+    python -m benchmarks.bench_metrics --requests 50000
+"""
+import argparse
+import asyncio
+import time
+
+from starlette.routing import Route
+
+from middleware.metrics import MetricsMiddleware
+from services.metrics import HTTP_REQUEST_DURATION, LLM_TOKENS, registry
+
+JSON_HEADERS = [(b"content-type", b"application/json"), (b"content-length", b"2")]
+SSE_HEADERS = [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")]
+
+
+def _endpoint(headers, frames: int):
+    async def app(scope, receive, send):
+        # What Starlette's router leaves in the scope for a matched route.
+        scope["endpoint"] = app
+        scope["route"] = route
+        scope["path_params"] = {"course_id": "7f3a"}
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        for _ in range(frames - 1):
+            await send({"type": "http.response.body", "body": b"data: {}\n\n", "more_body": True})
+        await send({"type": "http.response.body", "body": b"{}"})
+    route = Route("/{course_id}", app)
+    return app
+
+
+async def _per_request(app, requests: int) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/api/courses/7f3a", "headers": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    started = time.process_time()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.process_time() - started) / requests
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50000)
+    args = parser.parse_args()
+
+    started = time.process_time()
+    for i in range(args.requests):
+        HTTP_REQUEST_DURATION.observe(0.042, "POST", "/api/ai/tutor/chat", "200")
+        LLM_TOKENS.inc("tutor", "llama-3.1-8b-instant", "completion", amount=180)
+    record = (time.process_time() - started) / args.requests
+
+    results = {"record": record}
+    for name, headers, frames in (("middleware", JSON_HEADERS, 1), ("stream", SSE_HEADERS, 50)):
+        endpoint = _endpoint(headers, frames)
+        bare = await _per_request(endpoint, args.requests)
+        measured = await _per_request(MetricsMiddleware(endpoint), args.requests)
+        results[name] = measured - bare
+
+    started = time.process_time()
+    body = registry.render()
+    results["scrape"] = time.process_time() - started
+
+    print(f"requests={args.requests} series={sum(1 for line in body.splitlines() if not line.startswith('#'))}")
+    for name, seconds in results.items():
+        print(f"{name:<11} {seconds * 1e6:>8.2f} us")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
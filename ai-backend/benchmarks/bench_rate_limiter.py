@@ -0,0 +1,104 @@
+"""
+Benchmark: rate limiter overhead per request and cross-worker accuracy.
+
+For each storage URI, measures the cost of one sliding-window hit (what
+slowapi does once per limited request), then starts several processes that
+hammer the same key at once and counts how many hits were admitted. With
+``memory://`` every process admits the full limit; a shared storage admits
+exactly the limit between them.
+
+Pass ``--storage-uri redis://localhost:6379`` to include a Redis-protocol
+server (Redis, Valkey, KeyDB or any local stand-in; needs ``redis``).
+
+Usage:
+    cd ai-backend
+    python -m benchmarks.bench_rate_limiter --hits 20000 --workers 4 --limit 100
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import STRATEGIES
+
+import middleware.limiter_storage  # noqa: F401  (registers sqlite://)
+
+
+def _limiter(uri: str, strategy: str):
+    return STRATEGIES[strategy](storage_from_string(uri))
+
+
+def _overhead(uri: str, strategy: str, hits: int, keys: int) -> list[float]:
+    limiter = _limiter(uri, strategy)
+    item = parse("1000000/minute")
+    samples = []
+    for i in range(hits):
+        started = time.perf_counter()
+        limiter.hit(item, "bench", f"user:{i % keys}")
+        samples.append((time.perf_counter() - started) * 1_000_000)
+    limiter.storage.reset()
+    return samples
+
+
+def _hammer(uri: str, strategy: str, limit: int, attempts: int, start, admitted):
+    limiter = _limiter(uri, strategy)
+    item = parse(f"{limit}/minute")
+    start.wait()
+    count = sum(1 for _ in range(attempts) if limiter.hit(item, "bench", "user:shared"))
+    with admitted.get_lock():
+        admitted.value += count
+
+
+def _accuracy(uri: str, strategy: str, workers: int, limit: int) -> int:
+    _limiter(uri, strategy).storage.reset()
+    ctx = multiprocessing.get_context("fork")
+    start = ctx.Event()
+    admitted = ctx.Value("i", 0)
+    procs = [
+        ctx.Process(target=_hammer, args=(uri, strategy, limit, limit * 2, start, admitted))
+        for _ in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    start.set()
+    for p in procs:
+        p.join()
+    return admitted.value
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hits", type=int, default=20000)
+    parser.add_argument("--keys", type=int, default=500, help="distinct users")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--strategy", default="sliding-window-counter")
+    parser.add_argument("--storage-uri", action="append", default=[], help="extra storage to compare")
+    args = parser.parse_args()
+
+    tmpfs = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    db = os.path.join(tmpfs, f"bench-ratelimit-{os.getpid()}.db")
+    uris = ["memory://", f"sqlite:///{db}"] + args.storage_uri
+
+    print(f"strategy={args.strategy} hits={args.hits} keys={args.keys} "
+          f"workers={args.workers} limit={args.limit}")
+    print(f"{'storage':<48} {'p50 us':>8} {'p99 us':>8} {'admitted':>9} {'expected':>9}")
+    try:
+        for uri in uris:
+            samples = sorted(_overhead(uri, args.strategy, args.hits, args.keys))
+            p99 = samples[int(len(samples) * 0.99)]
+            admitted = _accuracy(uri, args.strategy, args.workers, args.limit)
+            print(f"{uri:<48} {statistics.median(samples):>8.1f} {p99:>8.1f} "
+                  f"{admitted:>9} {args.limit:>9}")
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db + suffix):
+                os.remove(db + suffix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark: SSE framing cost of the streaming endpoints.
+
+Runs many concurrent simulated Groq streams (deltas of a few characters at
+a configurable tokens/sec, no network) through three framings and reports
+frames per stream, frames/sec and process CPU per stream. "framing" is the
+CPU left after subtracting a run that only drains the simulated source:
+
+    legacy      ``full_response += chunk`` and ``json.dumps`` per delta
+    framed      ``TextStream`` with coalescing off (list buffer, fast encoder)
+    coalesced   ``TextStream`` with the endpoint's SSE_COALESCING window
+
+Each frame is encoded and written through h11's chunked framing, as
+uvicorn does for a StreamingResponse body.
+
+Usage:
+    cd ai-backend
+    python -m benchmarks.bench_sse --streams 300 --tokens 600 --rate 400
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import h11
+
+from config import settings
+from services import sse
+from services.sse import TextStream
+
+
+def _script(tokens: int, rate: float, seed: int) -> list[tuple[str, float]]:
+    """Deltas and the pause after each; Groq delivers a few per network read."""
+    rng = random.Random(seed)
+    return [
+        (
+            " " + "".join(rng.choice("abcdefghijklmnop") for _ in range(rng.randint(1, 6))),
+            4 / rate * rng.uniform(0.5, 1.5) if rate and i % 4 == 3 else 0.0
+        )
+        for i in range(tokens)
+    ]
+
+
+async def _deltas(script: list[tuple[str, float]]):
+    for delta, pause in script:
+        yield delta
+        if pause:
+            await asyncio.sleep(pause)
+
+
+async def _source(script) -> tuple[int, int]:
+    async for _ in _deltas(script):
+        pass
+    return 0, 0
+
+
+def _connection() -> h11.Connection:
+    conn = h11.Connection(h11.SERVER)
+    conn.receive_data(b"GET /api/ai/tutor/chat HTTP/1.1\r\nHost: bench\r\n\r\n")
+    conn.next_event()
+    conn.send(h11.Response(status_code=200, headers=[("content-type", "text/event-stream")]))
+    return conn
+
+
+async def _legacy(script) -> tuple[int, int]:
+    conn, written = _connection(), 0
+    full_response, frames = "", 0
+    async for chunk in _deltas(script):
+        full_response += chunk
+        written += len(conn.send(h11.Data(data=f"data: {json.dumps({'content': chunk})}\n\n".encode())))
+        frames += 1
+    written += len(conn.send(h11.Data(data=f"data: {json.dumps({'done': True})}\n\n".encode())))
+    return frames + 1, len(full_response)
+
+
+async def _text_stream(script) -> tuple[int, int]:
+    conn, written = _connection(), 0
+    stream = TextStream("tutor")
+    async for frame in stream.frames(_deltas(script)):
+        written += len(conn.send(h11.Data(data=frame.encode())))
+    written += len(conn.send(h11.Data(data=sse.sse_event({"done": True}).encode())))
+    return stream.frames_sent + 1, len(stream.text)
+
+
+WORKERS = {"source": _source, "legacy": _legacy, "framed": _text_stream, "coalesced": _text_stream}
+
+
+async def _run(mode: str, scripts: list) -> dict:
+    settings.sse_coalesce_enabled = mode == "coalesced"
+    worker = WORKERS[mode]
+    cpu, wall = time.process_time(), time.perf_counter()
+    results = await asyncio.gather(*[worker(script) for script in scripts])
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    frames = sum(r[0] for r in results)
+    return {
+        "frames_per_stream": frames / len(scripts),
+        "frames_per_sec": frames / wall,
+        "cpu_ms_per_stream": cpu * 1000 / len(scripts),
+        "wall_s": wall,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=300)
+    parser.add_argument("--tokens", type=int, default=600, help="deltas per stream")
+    parser.add_argument("--rate", type=float, default=400, help="deltas/sec per stream, 0 = unpaced")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    scripts = [_script(args.tokens, args.rate, args.seed + i) for i in range(args.streams)]
+    print(f"streams={args.streams} deltas={args.tokens} rate={args.rate:.0f}/s "
+          f"encoder={'orjson' if sse.orjson else 'json'}")
+    print(f"{'mode':<10} {'frames/stream':>14} {'frames/sec':>11} {'cpu ms/stream':>14} "
+          f"{'framing ms':>11} {'wall s':>7}")
+    baseline = None
+    for mode in WORKERS:
+        r = await _run(mode, scripts)
+        if baseline is None:
+            baseline = r["cpu_ms_per_stream"]
+            continue
+        print(f"{mode:<10} {r['frames_per_stream']:>14.0f} {r['frames_per_sec']:>11.0f} "
+              f"{r['cpu_ms_per_stream']:>14.2f} {r['cpu_ms_per_stream'] - baseline:>11.2f} "
+              f"{r['wall_s']:>7.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
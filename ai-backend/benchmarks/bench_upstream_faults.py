@@ -0,0 +1,130 @@
+"""
+Benchmark: tail latency of non-streaming Groq calls under injected faults.
+
+A mock upstream (httpx.MockTransport, no network) answers most requests in
+a few tens of milliseconds, stalls a small fraction for seconds and fails
+another fraction with 500s. The summarizer and quiz model configurations
+are driven through ``groq_client.chat_completion`` with:
+
+    baseline   one attempt, no hedging (the old behaviour)
+    retries    jittered exponential backoff on 5xx/timeouts
+    hedged     retries plus a second request after the model's p95
+
+Usage:
+    cd ai-backend
+    python -m benchmarks.bench_upstream_faults --calls 400 --slow 0.03 --errors 0.05
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+
+import httpx
+
+from config import settings, get_model_config
+import openrouter_client
+from openrouter_client import groq_client
+from services import upstream_resilience
+
+MODES = {
+    "baseline": {"groq_max_retries": 0, "groq_hedge_enabled": False},
+    "retries": {"groq_max_retries": 2, "groq_hedge_enabled": False},
+    "hedged": {"groq_max_retries": 2, "groq_hedge_enabled": True},
+}
+
+
+def _fault_handler(args, faults: dict):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        roll = random.random() if faults["on"] else 1.0
+        if roll < args.errors:
+            await asyncio.sleep(args.base_ms / 1000)
+            return httpx.Response(500, json={"error": "injected"})
+        delay = random.gauss(args.base_ms, args.base_ms / 4) / 1000
+        if roll < args.errors + args.slow:
+            delay += args.stall_ms / 1000
+        await asyncio.sleep(max(delay, 0.001))
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": "ok"}, "finish_reason": "stop"}],
+            "usage": {"total_tokens": 10},
+        })
+    return handler
+
+
+async def _run(tool: str, calls: int, concurrency: int) -> tuple[list[float], int]:
+    config = get_model_config(tool)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await groq_client.chat_completion(
+                    messages=[{"role": "user", "content": "benchmark"}],
+                    model=config["model"],
+                    temperature=config["temperature"],
+                    max_tokens=config["max_tokens"]
+                )
+            except Exception:
+                failures += 1
+                return
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    await asyncio.gather(*[one() for _ in range(calls)])
+    return latencies, failures
+
+
+def _pct(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else float("nan")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--base-ms", type=float, default=60)
+    parser.add_argument("--stall-ms", type=float, default=3000)
+    parser.add_argument("--slow", type=float, default=0.03, help="fraction of stalled responses")
+    parser.add_argument("--errors", type=float, default=0.05, help="fraction of 500 responses")
+    parser.add_argument("--warmup", type=int, default=50, help="fault-free calls to seed p95")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    settings.upstream_initial_concurrency = settings.upstream_max_concurrency
+    settings.groq_retry_base_delay = 0.05
+    settings.groq_breaker_failure_threshold = 1000  # measure retries, not fail-fast
+
+    print(f"calls={args.calls} concurrency={args.concurrency} base={args.base_ms:.0f}ms "
+          f"stall={args.stall_ms:.0f}ms slow={args.slow:.0%} errors={args.errors:.0%}")
+    print(f"{'tool':<11} {'mode':<9} {'ok':>5} {'fail':>5} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8} {'hedges':>7}")
+
+    for tool in ("summarizer", "quiz"):
+        for mode, overrides in MODES.items():
+            random.seed(args.seed)
+            for name, value in overrides.items():
+                setattr(settings, name, value)
+            openrouter_client.latency_tracker = upstream_resilience.LatencyTracker()
+            faults = {"on": False}
+            groq_client._client = httpx.AsyncClient(
+                base_url="http://mock-groq", transport=httpx.MockTransport(_fault_handler(args, faults))
+            )
+
+            # A running service has a warm latency history; so does the benchmark.
+            await _run(tool, args.warmup, args.concurrency)
+            faults["on"] = True
+            groq_client._hedges = 0
+            latencies, failures = await _run(tool, args.calls, args.concurrency)
+            await groq_client.close()
+            print(f"{tool:<11} {mode:<9} {len(latencies):>5} {failures:>5} "
+                  f"{statistics.median(latencies):>8.0f} {_pct(latencies, 0.95):>8.0f} "
+                  f"{_pct(latencies, 0.99):>8.0f} {max(latencies):>8.0f} {groq_client._hedges:>7}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
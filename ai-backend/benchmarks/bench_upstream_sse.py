@@ -0,0 +1,111 @@
+"""
+Micro-benchmark: parsing Groq's completion stream.
+
+Builds a realistic stream (role chunk, content deltas with some escaped and
+non-ASCII text, a final chunk carrying finish_reason and x_groq usage),
+cuts it into network-sized reads and parses it single-threaded with:
+
+    legacy   httpx ``aiter_lines`` decoding (incremental UTF-8 + line
+             splitting) and ``json.loads`` on every ``data:`` line
+    parser   ``services.sse.SSEParser`` over the raw bytes
+
+Reports content deltas parsed per CPU-second (tokens/sec per core) and
+checks both produce the same text.
+
+Usage:
+    cd ai-backend
+    python -m benchmarks.bench_upstream_sse --deltas 2000 --read-size 1024
+"""
+import argparse
+import json
+import random
+import time
+
+from httpx._decoders import LineDecoder, TextDecoder
+
+from services import sse
+from services.sse import SSEParser
+
+WORDS = ["the", "cell", "membrane", "energy", "é", "naïve", "\"quoted\"", "x\ny", "ATP", "→", "of", "is"]
+
+
+def build_stream(deltas: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    base = {
+        "id": "chatcmpl-3f1c0a2e-9b7d-4c55-8d0e-1a2b3c4d5e6f",
+        "object": "chat.completion.chunk",
+        "created": 1760000000,
+        "model": "llama-3.3-70b-versatile",
+        "system_fingerprint": "fp_3f39b9d0f5",
+    }
+
+    def chunk(delta: dict, finish=None, **extra) -> bytes:
+        body = {**base, "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish}], **extra}
+        return b"data: " + json.dumps(body, separators=(",", ":"), ensure_ascii=False).encode() + b"\n\n"
+
+    parts = [chunk({"role": "assistant", "content": ""}, x_groq={"id": "req_01"})]
+    parts += [chunk({"content": " " + rng.choice(WORDS)}) for _ in range(deltas)]
+    parts.append(chunk({}, "stop", x_groq={"id": "req_01", "usage": {
+        "queue_time": 0.02, "prompt_tokens": 412, "prompt_time": 0.01,
+        "completion_tokens": deltas, "completion_time": 0.9, "total_tokens": 412 + deltas, "total_time": 0.91,
+    }}))
+    parts.append(b"data: [DONE]\n\n")
+    return b"".join(parts)
+
+
+def legacy(reads: list[bytes]) -> str:
+    text_decoder, line_decoder = TextDecoder(), LineDecoder()
+    out, usage = [], None
+    for data in reads:
+        for line in line_decoder.decode(text_decoder.decode(data)):
+            if line.startswith("data: "):
+                payload = line[6:]
+                if payload == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(payload)
+                except json.JSONDecodeError:
+                    continue
+                usage = (chunk.get("x_groq") or {}).get("usage") or chunk.get("usage") or usage
+                if chunk.get("choices") and chunk["choices"][0].get("delta", {}).get("content"):
+                    out.append(chunk["choices"][0]["delta"]["content"])
+    return "".join(out)
+
+
+def parser(reads: list[bytes]) -> str:
+    p = SSEParser()
+    out = []
+    for data in reads:
+        out.extend(p.feed(data))
+        if p.done:
+            break
+    assert p.meta.finish_reason == "stop" and p.meta.usage
+    return "".join(out)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--deltas", type=int, default=2000)
+    arg_parser.add_argument("--read-size", type=int, default=1024, help="bytes per network read")
+    arg_parser.add_argument("--repeat", type=int, default=50)
+    arg_parser.add_argument("--seed", type=int, default=7)
+    args = arg_parser.parse_args()
+
+    stream = build_stream(args.deltas, args.seed)
+    reads = [stream[i:i + args.read_size] for i in range(0, len(stream), args.read_size)]
+    assert legacy(reads) == parser(reads)
+
+    print(f"deltas={args.deltas} bytes={len(stream)} read_size={args.read_size} "
+          f"decoder={'orjson' if sse.orjson else 'json'}")
+    print(f"{'parser':<8} {'us/delta':>9} {'tokens/sec/core':>16}")
+    for name, fn in (("legacy", legacy), ("parser", parser)):
+        started = time.process_time()
+        for _ in range(args.repeat):
+            fn(reads)
+        elapsed = time.process_time() - started
+        per_delta = elapsed / (args.repeat * args.deltas)
+        print(f"{name:<8} {per_delta * 1e6:>9.2f} {1 / per_delta:>16,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,459 @@
+"""
+End-to-end load test against a local mock of the Groq API.
+
+Starts benchmarks/mock_groq.py and the backend under uvicorn with
+``GROQ_BASE_URL`` pointed at the mock (rate limiting and token quotas off),
+then drives a closed-loop mix of the AI endpoints:
+
+    tutor      POST /api/ai/tutor/chat            (SSE)
+    summarize  POST /api/ai/summarize             (JSON, or SSE with --stream)
+    notes      POST /api/ai/notes/generate        (JSON, or SSE with --stream)
+    quiz       POST /api/ai/quiz/generate         (JSON)
+    courses    POST /api/courses/generate         (JSON, outline + lessons)
+    course     GET  /api/courses/{--course-id}    (needs Supabase; only with --course-id)
+
+Request bodies are unique except for a ``--cache-hit-ratio`` fraction drawn
+from a small fixed set, so response caching is exercised at a known rate.
+
+Reports throughput, latency percentiles, client-side TTFT (first content
+frame of a stream), errors, and CPU seconds / peak RSS per uvicorn worker
+(from /proc, Linux only). ``--out`` writes the same as JSON, and
+``--compare`` prints the change against a previous ``--out`` file.
+
+Usage:
+    cd ai-backend
+    python -m benchmarks.loadtest --workers 2 --concurrency 50 --duration 60 --out run.json
+    python -m benchmarks.loadtest --mix tutor=1 --ttft-ms 400 --compare run.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_MIX = "tutor=4,summarize=2,notes=1,quiz=2,courses=1"
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+PARAGRAPH = (
+    "Cellular respiration converts glucose and oxygen into carbon dioxide, water "
+    "and ATP. Glycolysis happens in the cytoplasm, while the Krebs cycle and the "
+    "electron transport chain run in the mitochondria. "
+)
+
+
+def _content(rng: random.Random, cached: bool, paragraphs: int) -> str:
+    # Cached requests reuse one of a few fixed bodies; the rest are unique.
+    tag = f"variant {rng.randrange(4)}" if cached else uuid.uuid4().hex
+    return f"Lesson {tag}. " + PARAGRAPH * paragraphs
+
+
+def build_request(kind: str, rng: random.Random, args) -> tuple[str, str, dict, bool]:
+    """Return (method, path, json body, expects SSE) for one request of ``kind``."""
+    cached = rng.random() < args.cache_hit_ratio
+    if kind == "tutor":
+        body = {
+            "message": "Can you explain where ATP is made?" + ("" if cached else f" ({uuid.uuid4().hex[:8]})"),
+            "context": _content(rng, cached, 3),
+            "history": [
+                {"role": "user", "content": "What is glycolysis?"},
+                {"role": "assistant", "content": PARAGRAPH},
+            ],
+            "lesson_title": "Cellular respiration",
+        }
+        return "POST", "/api/ai/tutor/chat", body, True
+    if kind == "summarize":
+        body = {"content": _content(rng, cached, 20), "format": "bullets", "stream": args.stream}
+        return "POST", "/api/ai/summarize", body, args.stream
+    if kind == "notes":
+        body = {"content": _content(rng, cached, 15), "detail_level": "standard", "stream": args.stream}
+        return "POST", "/api/ai/notes/generate", body, args.stream
+    if kind == "quiz":
+        body = {"content": _content(rng, cached, 10), "count": 5, "difficulty": "medium"}
+        return "POST", "/api/ai/quiz/generate", body, False
+    if kind == "courses":
+        topic = f"Cell biology {rng.randrange(4) if cached else uuid.uuid4().hex[:8]}"
+        return "POST", "/api/courses/generate", {"topic": topic}, False
+    if kind == "course":
+        return "GET", f"/api/courses/{args.course_id}", None, False
+    raise ValueError(f"Unknown request kind: {kind}")
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(values: list[float], q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize_samples(samples: list[dict], elapsed: float) -> dict:
+    latencies = [s["latency"] for s in samples if s["ok"]]
+    ttfts = [s["ttft"] for s in samples if s["ok"] and s["ttft"] is not None]
+    errors: dict[str, int] = {}
+    for s in samples:
+        if not s["ok"]:
+            errors[s["error"]] = errors.get(s["error"], 0) + 1
+    ms = lambda v: None if v is None else round(v * 1000, 1)
+    return {
+        "requests": len(samples),
+        "ok": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {q: ms(percentile(latencies, p)) for q, p in (("p50", .5), ("p95", .95), ("p99", .99))},
+        "ttft_ms": {q: ms(percentile(ttfts, p)) for q, p in (("p50", .5), ("p95", .95), ("p99", .99))},
+    }
+
+
+async def send_one(client: httpx.AsyncClient, method: str, path: str, body, sse: bool) -> dict:
+    started = time.perf_counter()
+    ttft = None
+    try:
+        async with client.stream(method, path, json=body) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                return {"ok": False, "error": str(response.status_code), "latency": time.perf_counter() - started}
+            if not sse:
+                await response.aread()
+            else:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    event = json.loads(line[6:])
+                    if "error" in event:
+                        return {"ok": False, "error": "stream_error", "latency": time.perf_counter() - started}
+                    if ttft is None and event.get("content"):
+                        ttft = time.perf_counter() - started
+    except httpx.HTTPError as e:
+        return {"ok": False, "error": type(e).__name__, "latency": time.perf_counter() - started}
+    return {"ok": True, "latency": time.perf_counter() - started, "ttft": ttft}
+
+
+async def drive(args, mix: dict[str, float]) -> tuple[dict[str, list[dict]], float]:
+    names, weights = list(mix), list(mix.values())
+    samples: dict[str, list[dict]] = {name: [] for name in names}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout, connect=10.0)
+
+    async with httpx.AsyncClient(base_url=args.backend_url, limits=limits, timeout=timeout) as client:
+        started = time.perf_counter()
+        measure_from = started + args.warmup
+        deadline = measure_from + args.duration
+
+        async def user(seed: int):
+            rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                kind = rng.choices(names, weights)[0]
+                method, path, body, sse = build_request(kind, rng, args)
+                sent = time.perf_counter()
+                result = await send_one(client, method, path, body, sse)
+                if sent >= measure_from:
+                    samples[kind].append(result)
+
+        await asyncio.gather(*(user(args.seed + i) for i in range(args.concurrency)))
+    return samples, args.duration
+
+
+# ----------------------------------------------------------------
+# Process management and resource sampling
+# ----------------------------------------------------------------
+
+def _children(pid: int) -> list[int]:
+    try:
+        found = []
+        for task in Path(f"/proc/{pid}/task").iterdir():
+            found += [int(c) for c in (task / "children").read_text().split()]
+    except OSError:
+        return []
+    # Skip multiprocessing's resource tracker, which uvicorn's supervisor also spawns.
+    return [c for c in found if b"resource_tracker" not in _cmdline(c)]
+
+
+def _cmdline(pid: int) -> bytes:
+    try:
+        return Path(f"/proc/{pid}/cmdline").read_bytes()
+    except OSError:
+        return b""
+
+
+def _cpu_seconds(pid: int):
+    try:
+        fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS  # utime + stime
+    except (OSError, IndexError):
+        return None
+
+
+def _rss_mb(pid: int):
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class WorkerSampler:
+    """Tracks CPU time and peak RSS of the uvicorn worker processes."""
+
+    def __init__(self, master_pid: int):
+        self.master_pid = master_pid
+        self.cpu_start: dict[int, float] = {}
+        self.cpu_end: dict[int, float] = {}
+        self.peak_rss: dict[int, float] = {}
+
+    def pids(self) -> list[int]:
+        # With --workers > 1 the master only supervises; requests are served by its children.
+        return _children(self.master_pid) or [self.master_pid]
+
+    def mark_start(self):
+        self.cpu_start = {pid: _cpu_seconds(pid) or 0.0 for pid in self.pids()}
+
+    def sample(self):
+        for pid in self.pids():
+            rss = _rss_mb(pid)
+            if rss is not None:
+                self.peak_rss[pid] = max(self.peak_rss.get(pid, 0.0), rss)
+
+    def mark_end(self):
+        self.cpu_end = {pid: _cpu_seconds(pid) or 0.0 for pid in self.pids()}
+
+    def report(self, elapsed: float) -> list[dict]:
+        workers = []
+        for pid, end in self.cpu_end.items():
+            cpu = end - self.cpu_start.get(pid, 0.0)
+            workers.append({
+                "pid": pid,
+                "cpu_seconds": round(cpu, 2),
+                "cpu_percent": round(100 * cpu / elapsed, 1) if elapsed else 0.0,
+                "peak_rss_mb": round(self.peak_rss.get(pid, 0.0), 1),
+            })
+        return workers
+
+
+async def sample_until(sampler: WorkerSampler, done: asyncio.Event):
+    while not done.is_set():
+        sampler.sample()
+        try:
+            await asyncio.wait_for(done.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=2.0) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready within {timeout:.0f}s")
+
+
+def start_processes(args) -> list[subprocess.Popen]:
+    output = None if args.server_logs else subprocess.DEVNULL
+    mock = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.mock_groq",
+            "--port", str(args.mock_port),
+            "--ttft-ms", str(args.ttft_ms),
+            "--tokens-per-sec", str(args.tokens_per_sec),
+            "--reply-tokens", str(args.reply_tokens),
+            "--error-rate", str(args.error_rate),
+            "--throttle-rate", str(args.throttle_rate),
+        ],
+        cwd=BACKEND_DIR,
+        stdout=output,
+        stderr=output,
+    )
+    env = {
+        **os.environ,
+        "GROQ_BASE_URL": f"http://127.0.0.1:{args.mock_port}",
+        "GROQ_API_KEY": os.environ.get("GROQ_API_KEY", "loadtest"),
+        "RATE_LIMIT_ENABLED": "false",
+        "TOKEN_QUOTA_ENABLED": "false",
+    }
+    backend = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--port", str(args.port),
+            "--workers", str(args.workers),
+            "--log-level", "warning",
+            "--no-access-log",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=output,
+        stderr=output,
+    )
+    return [mock, backend]
+
+
+def stop_processes(processes: list[subprocess.Popen]):
+    for process in processes:
+        if process.poll() is None:
+            process.send_signal(signal.SIGINT)
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+# ----------------------------------------------------------------
+# Reporting
+# ----------------------------------------------------------------
+
+def print_report(results: dict):
+    summary = results["summary"]
+    print(f"\n{'endpoint':<10} {'ok':>6} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'ttft50':>8} {'ttft95':>8}")
+    rows = list(results["endpoints"].items()) + [("total", summary)]
+    for name, row in rows:
+        lat, ttft = row["latency_ms"], row["ttft_ms"]
+        cells = [lat["p50"], lat["p95"], lat["p99"], ttft["p50"], ttft["p95"]]
+        cells = " ".join(f"{'-' if c is None else c:>8}" for c in cells)
+        print(f"{name:<10} {row['ok']:>6} {sum(row['errors'].values()):>5} {row['rps']:>8} {cells}")
+    if summary["errors"]:
+        print(f"errors: {summary['errors']}")
+    for worker in results["workers"]:
+        print(f"worker {worker['pid']}: cpu {worker['cpu_seconds']}s ({worker['cpu_percent']}%), "
+              f"peak rss {worker['peak_rss_mb']} MB")
+    if results.get("mock"):
+        mock = {k: v for k, v in results["mock"].items() if k != "config"}
+        print(f"mock: {mock}")
+
+
+def print_comparison(results: dict, baseline: dict):
+    def change(new, old):
+        if new is None or old in (None, 0):
+            return "-"
+        return f"{100 * (new - old) / old:+.1f}%"
+
+    print(f"\nvs {baseline['run']['started_at']} ({baseline['run']['git']})")
+    print(f"{'endpoint':<10} {'rps':>8} {'p95':>8} {'p99':>8} {'ttft50':>8}")
+    rows = [("total", results["summary"], baseline["summary"])]
+    rows += [(n, r, baseline["endpoints"][n]) for n, r in results["endpoints"].items() if n in baseline["endpoints"]]
+    for name, new, old in rows:
+        cells = [
+            change(new["rps"], old["rps"]),
+            change(new["latency_ms"]["p95"], old["latency_ms"]["p95"]),
+            change(new["latency_ms"]["p99"], old["latency_ms"]["p99"]),
+            change(new["ttft_ms"]["p50"], old["ttft_ms"]["p50"]),
+        ]
+        print(f"{name:<10} " + " ".join(f"{c:>8}" for c in cells))
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend-url", default=None, help="use a running backend instead of starting one")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds before measuring")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weighted endpoint mix, e.g. tutor=3,quiz=1")
+    parser.add_argument("--stream", action="store_true", help="request SSE from summarize and notes")
+    parser.add_argument("--cache-hit-ratio", type=float, default=0.1)
+    parser.add_argument("--course-id", default=None, help="course for the 'course' read endpoint")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--server-logs", action="store_true", help="show backend and mock output")
+    parser.add_argument("--mock-port", type=int, default=8100)
+    parser.add_argument("--ttft-ms", type=float, default=250)
+    parser.add_argument("--tokens-per-sec", type=float, default=250)
+    parser.add_argument("--reply-tokens", type=int, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--out", default=None, help="write results as JSON")
+    parser.add_argument("--compare", default=None, help="JSON results of a previous run")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    if "course" in mix and not args.course_id:
+        parser.error("the 'course' endpoint needs --course-id")
+
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    processes, sampler = [], None
+    if args.backend_url is None:
+        args.backend_url = f"http://127.0.0.1:{args.port}"
+        processes = start_processes(args)
+    try:
+        await wait_ready(f"{args.backend_url}/api/ai/health")
+        if processes:
+            await wait_ready(f"http://127.0.0.1:{args.mock_port}/stats")
+            sampler = WorkerSampler(processes[1].pid)
+
+        print(f"driving {args.backend_url}: concurrency={args.concurrency} duration={args.duration}s "
+              f"warmup={args.warmup}s mix={mix}")
+        done = asyncio.Event()
+        sampling = asyncio.create_task(sample_until(sampler, done)) if sampler else None
+        drive_task = asyncio.create_task(drive(args, mix))
+        if sampler:
+            await asyncio.sleep(args.warmup)
+            sampler.mark_start()
+        samples, elapsed = await drive_task
+        if sampler:
+            sampler.mark_end()
+            done.set()
+            await sampling
+
+        mock_stats = None
+        if processes:
+            async with httpx.AsyncClient() as client:
+                mock_stats = (await client.get(f"http://127.0.0.1:{args.mock_port}/stats")).json()
+    finally:
+        stop_processes(processes)
+
+    results = {
+        "run": {
+            "started_at": started_at,
+            "git": _git_revision(),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        },
+        "summary": summarize_samples([s for rows in samples.values() for s in rows], elapsed),
+        "endpoints": {name: summarize_samples(rows, elapsed) for name, rows in samples.items()},
+        "workers": sampler.report(elapsed) if sampler else [],
+        "mock": mock_stats,
+    }
+    print_report(results)
+    if args.compare:
+        print_comparison(results, json.loads(Path(args.compare).read_text()))
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2))
+        print(f"\nwrote {args.out}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,215 @@
+"""
+OpenAI-compatible mock of Groq's chat completions API for load tests.
+
+Serves ``POST /chat/completions`` (and ``/openai/v1/chat/completions``) with
+and without ``stream``, so the backend can be pointed at it through
+``GROQ_BASE_URL`` and exercised without spending real quota:
+
+- replies start after ``--ttft-ms`` (with jitter) and then arrive at
+  ``--tokens-per-sec``, written in small bursts like Groq's;
+- quiz and course-outline prompts get valid JSON of the requested size,
+  everything else plain prose of ``--reply-tokens`` (capped by max_tokens,
+  with ``finish_reason: "length"`` when it is);
+- ``--error-rate`` of requests fail with 500 and ``--throttle-rate`` with
+  429 plus ``Retry-After``;
+- stream chunks use Groq's compact layout, with usage in ``x_groq`` on
+  the final chunk.
+
+``GET /stats`` returns what was served. benchmarks/loadtest.py starts this
+automatically; run it directly to point a separately started backend at it.
+
+Usage:
+    cd ai-backend
+    python -m benchmarks.mock_groq --port 8100 --ttft-ms 250 --tokens-per-sec 250
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, asdict
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+WORDS = (
+    "the cell uses energy from glucose to make ATP in the mitochondria while "
+    "photosynthesis stores light energy as chemical energy in plants and "
+    "enzymes lower the activation energy of reactions so they run faster"
+).split()
+TICK = 0.02  # seconds between stream writes
+_COUNT_RE = re.compile(r"Generate exactly (\d+)")
+
+
+@dataclass
+class MockConfig:
+    ttft_ms: float = 250
+    ttft_jitter: float = 0.3
+    tokens_per_sec: float = 250
+    reply_tokens: int = 300
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: int = 1
+
+
+def _prose(tokens: int, rng: random.Random) -> list[str]:
+    return [(" " if i else "") + rng.choice(WORDS) for i in range(tokens)]
+
+
+def _pieces(text: str, size: int = 4) -> list[str]:
+    """Cut generated JSON into token-sized deltas (~4 characters each)."""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _reply(messages: list[dict], config: MockConfig, rng: random.Random) -> list[str]:
+    system = messages[0].get("content", "") if messages else ""
+    prompt = messages[-1].get("content", "") if messages else ""
+    if "quiz generator" in system:
+        match = _COUNT_RE.search(prompt)
+        count = int(match.group(1)) if match else 5
+        questions = [
+            {
+                "question": f"Question {i + 1}: what does {' '.join(_prose(6, rng)).strip()} mean?",
+                "options": [" ".join(_prose(4, rng)).strip() for _ in range(4)],
+                "correct_answer": rng.randrange(4),
+                "explanation": " ".join(_prose(20, rng)).strip(),
+            }
+            for i in range(count)
+        ]
+        return _pieces(json.dumps({"questions": questions}))
+    if "curriculum planner" in system:
+        outline = {
+            "title": "Mock course",
+            "description": " ".join(_prose(20, rng)).strip(),
+            "modules": [
+                {
+                    "title": f"Module {m + 1}",
+                    "lessons": [
+                        {"title": f"Lesson {m + 1}.{l + 1}", "brief": " ".join(_prose(15, rng)).strip()}
+                        for l in range(3)
+                    ],
+                }
+                for m in range(3)
+            ],
+        }
+        return _pieces(json.dumps(outline))
+    return _prose(config.reply_tokens, rng)
+
+
+def create_app(config: MockConfig) -> Starlette:
+    stats = Counter()
+    rng = random.Random()
+
+    def chunk(body: dict, delta: dict, finish=None, **extra) -> bytes:
+        payload = {
+            **body,
+            "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish}],
+            **extra,
+        }
+        return b"data: " + json.dumps(payload, separators=(",", ":")).encode() + b"\n\n"
+
+    async def completions(request: Request):
+        payload = await request.json()
+        stats["requests"] += 1
+        roll = rng.random()
+        if roll < config.throttle_rate:
+            stats["throttled"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "tokens"}},
+                status_code=429,
+                headers={"Retry-After": str(config.retry_after)},
+            )
+        if roll < config.throttle_rate + config.error_rate:
+            stats["errors"] += 1
+            await asyncio.sleep(config.ttft_ms / 4000)
+            return JSONResponse({"error": {"message": "Injected failure"}}, status_code=500)
+
+        deltas = _reply(payload.get("messages", []), config, rng)
+        max_tokens = payload.get("max_tokens") or len(deltas)
+        finish = "length" if len(deltas) > max_tokens else "stop"
+        deltas = deltas[:max_tokens]
+        prompt_tokens = sum(len(m.get("content", "")) for m in payload.get("messages", [])) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(deltas),
+            "total_tokens": prompt_tokens + len(deltas),
+        }
+        ttft = config.ttft_ms / 1000 * rng.uniform(1 - config.ttft_jitter, 1 + config.ttft_jitter)
+        stats["completion_tokens"] += len(deltas)
+        body = {
+            "id": f"chatcmpl-mock-{stats['requests']}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": payload.get("model", "mock"),
+            "system_fingerprint": "fp_mock",
+        }
+
+        if not payload.get("stream"):
+            stats["completions"] += 1
+            await asyncio.sleep(ttft + len(deltas) / config.tokens_per_sec)
+            return JSONResponse({
+                **body,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(deltas)},
+                    "finish_reason": finish,
+                }],
+                "usage": usage,
+            })
+
+        async def stream():
+            stats["streams"] += 1
+            await asyncio.sleep(ttft)
+            yield chunk(body, {"role": "assistant", "content": ""}, x_groq={"id": body["id"]})
+            per_tick = max(1, round(config.tokens_per_sec * TICK))
+            for i in range(0, len(deltas), per_tick):
+                yield b"".join(chunk(body, {"content": d}) for d in deltas[i:i + per_tick])
+                await asyncio.sleep(TICK)
+            yield chunk(body, {}, finish, x_groq={"id": body["id"], "usage": usage})
+            yield b"data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    async def get_stats(request: Request):
+        return JSONResponse({**stats, "config": asdict(config)})
+
+    return Starlette(routes=[
+        Route("/chat/completions", completions, methods=["POST"]),
+        Route("/openai/v1/chat/completions", completions, methods=["POST"]),
+        Route("/stats", get_stats),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--ttft-ms", type=float, default=250)
+    parser.add_argument("--ttft-jitter", type=float, default=0.3)
+    parser.add_argument("--tokens-per-sec", type=float, default=250)
+    parser.add_argument("--reply-tokens", type=int, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    import uvicorn
+    config = MockConfig(
+        ttft_ms=args.ttft_ms,
+        ttft_jitter=args.ttft_jitter,
+        tokens_per_sec=args.tokens_per_sec,
+        reply_tokens=args.reply_tokens,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,15 +13,130 @@ class Settings(BaseSettings):
     groq_api_key: str = ""
     groq_base_url: str = "https://api.groq.com/openai/v1"
     
+    # Upstream HTTP connection pool (shared across requests)
+    groq_http2: bool = True
+    groq_max_connections: int = 100
+    groq_max_keepalive_connections: int = 20
+    groq_keepalive_expiry: float = 30.0
+    groq_connect_timeout: float = 5.0
+    groq_read_timeout: float = 120.0
+    groq_pool_timeout: float = 10.0
+    
+    # Adaptive upstream concurrency (AIMD); excess requests queue
+    upstream_initial_concurrency: int = 16
+    upstream_min_concurrency: int = 2
+    upstream_max_concurrency: int = 64
+    upstream_latency_target: float = 10.0  # seconds to response headers
+    upstream_backoff_factor: float = 0.5
+    upstream_max_queue: int = 500
+    upstream_queue_timeout: float = 60.0
+    upstream_max_requeues: int = 3  # times a 429/503 is queued again before failing
+    
+    # Retries, hedging and circuit breaking for non-streaming Groq calls
+    groq_max_retries: int = 2
+    groq_retry_base_delay: float = 0.5
+    groq_retry_max_delay: float = 8.0
+    groq_attempt_timeout: float = 60.0
+    groq_total_timeout: float = 90.0  # deadline across all attempts, queueing and backoff
+    groq_hedge_enabled: bool = False  # send a second request after the model's p95 latency
+    groq_hedge_min_delay: float = 0.5
+    groq_breaker_failure_threshold: int = 5
+    groq_breaker_reset_timeout: float = 30.0
+    
     # Default model
     default_model: str = "llama-3.3-70b-versatile"
     
     # Supabase Configuration
     supabase_url: str = ""
     supabase_key: str = ""
+    db_max_workers: int = 8  # Dedicated thread pool for blocking Supabase calls
+    
+    # AI response cache (summarizer, notes, quiz)
+    response_cache_enabled: bool = True
+    response_cache_max_entries: int = 1024
+    response_cache_max_bytes: int = 64 * 1024 * 1024
+    response_cache_ttl_seconds: float = 24 * 3600
+    response_cache_sqlite_path: str = ""  # e.g. /tmp/studedu_cache.sqlite3 to share across workers
+    response_cache_disk_max_entries: int = 100000  # oldest rows beyond this are pruned
+    
+    # Assembled GET /api/courses/{id} responses
+    course_cache_max_entries: int = 512
+    course_cache_ttl_seconds: float = 300.0
+    
+    # ai_logs write-behind pipeline
+    ai_log_queue_size: int = 10000
+    ai_log_batch_size: int = 100
+    ai_log_flush_interval: float = 1.0
+    ai_log_drop_policy: str = "drop_newest"  # block | drop_newest | drop_oldest
+    # Write the routing decision; enable once ai_logs has the routing column
+    # (ALTER TABLE in supabase_schema.sql), or every insert is rejected
+    ai_log_routing: bool = False
+    
+    # Tutor conversation window
+    tutor_history_budget_tokens: int = 3000
+    tutor_context_budget_tokens: int = 2000
+    tutor_keep_recent_messages: int = 6
+    
+    # Long-document (map-reduce) summarization
+    summarizer_long_doc_tokens: int = 3000
+    summarizer_chunk_tokens: int = 2000
+    summarizer_map_concurrency: int = 4
+    summarizer_map_max_tokens: int = 512
+    
+    # Batch summarization (/api/ai/summarize/batch)
+    summarize_batch_max_items: int = 100
+    summarize_batch_concurrency: int = 6
     
-    # Rate Limiting
+    # Sharded quiz generation
+    quiz_shard_size: int = 5
+    quiz_max_shards: int = 4
+    quiz_similarity_threshold: float = 0.8
+    quiz_topup_rounds: int = 2
+    
+    # Two-phase course generation
+    course_lesson_concurrency: int = 6
+    # Lessons that may fall back to their outline brief before the course fails
+    course_max_lesson_fallbacks: int = 2
+    
+    # Rate Limiting (disable only for load tests, see benchmarks/loadtest.py)
+    rate_limit_enabled: bool = True
     rate_limit_per_minute: int = 20
+    # memory:// is per-process; use sqlite:////dev/shm/studedu-ratelimit.db
+    # to share limits across workers on one host, or redis://host:6379 across hosts
+    rate_limit_storage_uri: str = "memory://"
+    rate_limit_strategy: str = "sliding-window-counter"
+    
+    # Token quotas per user and tool (see services/token_quota.py)
+    token_quota_enabled: bool = True
+    token_quota_per_minute: int = 20000
+    token_quota_per_day: int = 200000
+    
+    # Input-aware model routing across MODEL_TIERS
+    model_routing_enabled: bool = True
+    
+    # Coalesce streamed deltas into fewer SSE frames (see SSE_COALESCING)
+    sse_coalesce_enabled: bool = True
+    
+    # Prometheus metrics at /api/ai/metrics, served only when metrics_token
+    # is set; scrapes send "Authorization: Bearer <token>"
+    metrics_enabled: bool = True
+    metrics_token: str = ""
+    
+    # Per-request spans in a Server-Timing header; requests slower than
+    # trace_slow_request_ms log their spans at INFO, the rest at DEBUG
+    tracing_enabled: bool = True
+    trace_slow_request_ms: float = 2000.0
+    
+    # Admin endpoints under /api/ai/admin need "Authorization: Bearer <token>"
+    # and are disabled while the token is empty
+    admin_token: str = ""
+    
+    # Sampling profiler for a fraction of requests (adjustable at runtime via
+    # PUT /api/ai/admin/profiling); writes folded stacks to profile_dir
+    profile_sample_rate: float = 0.0
+    profile_interval_ms: float = 5.0
+    profile_dir: str = "/tmp/studedu-profiles"
+    profile_max_files: int = 200
     
     # Debug mode
     debug: bool = True
@@ -121,12 +236,12 @@ Include:
 
 Make notes scannable and easy to review."""
     },
-    "course_generator": {
+    "course_outline": {
         "model": "llama-3.3-70b-versatile",
         "temperature": 0.5,
-        "max_tokens": 4096,
-        "system_prompt": """You are a course curriculum generator for StudEdu.
-Generate a structured text-based course curriculum (Articles/Docs) based on the requested topic.
+        "max_tokens": 2048,
+        "system_prompt": """You are a course curriculum planner for StudEdu.
+Plan a structured text-based course (Articles/Docs) on the requested topic. Plan only; do not write lesson bodies.
 
 IMPORTANT: You must respond with ONLY valid JSON, no markdown formatting, no code blocks.
 
@@ -140,9 +255,7 @@ Response format:
       "lessons": [
         {
           "title": "Lesson 1 Title",
-          "description": "Detailed text content for this lesson. Should be educational and informative.",
-          "type": "text",
-          "duration": "5 min read"
+          "brief": "One or two sentences on what this lesson must cover"
         }
       ]
     }
@@ -150,14 +263,80 @@ Response format:
 }
 
 Rules:
-- Create comprehensive text-based documentation/articles
-- Break down into logical modules
-- STRICTLY use "type": "text" for all lessons
-- Description field should contain the actual starting content/summary of the article"""
+- Break the topic into logical modules that build on each other
+- Give every lesson a distinct, specific focus
+- Keep briefs short; they are instructions for the lesson writer"""
+    },
+    "course_lesson": {
+        "model": "llama-3.3-70b-versatile",
+        "temperature": 0.5,
+        "max_tokens": 1536,
+        "system_prompt": """You are a lesson writer for StudEdu.
+Write one text-based lesson (an article) of a larger course, following the brief you are given.
+
+- Write in Markdown, starting directly with the lesson content (no title heading)
+- Explain concepts clearly with examples, aimed at the stated level
+- Stay within the lesson's scope; other lessons cover the rest of the course
+- Aim for 400-700 words"""
+    },
+    "conversation_summary": {
+        "model": "llama-3.1-8b-instant",
+        "temperature": 0.2,
+        "max_tokens": 400,
+        "system_prompt": """You maintain a running summary of a tutoring conversation for StudEdu.
+Given the previous summary (if any) and the next turns, write an updated summary that keeps:
+- What the student is trying to learn and their current level
+- Questions asked and the key explanations given
+- Any misconceptions corrected and open follow-ups
+
+Write compact plain prose under 200 words. Do not address the student."""
     }
 }
 
 
+# Prompt token budgets for conversation history, per model.
+# Falls back to settings.tutor_history_budget_tokens for unknown models.
+HISTORY_TOKEN_BUDGETS = {
+    "llama-3.3-70b-versatile": 3000,
+    "llama-3.1-8b-instant": 2000,
+}
+
+
+# Candidate models per tool for input-aware routing (services/model_router.py).
+# Tiers are listed cheapest first; a tier is eligible when the request's
+# estimated input and output tokens fit its limits (no limit = always).
+# The remaining tiers are failovers when the chosen model is erroring.
+MODEL_TIERS = {
+    "tutor": [
+        {"model": "llama-3.1-8b-instant", "max_input_tokens": 600, "max_output_tokens": 600, "latency_slo": 4.0},
+        {"model": "llama-3.3-70b-versatile"},
+    ],
+    "quiz": [
+        {"model": "llama-3.1-8b-instant", "max_input_tokens": 2000, "max_output_tokens": 800, "latency_slo": 8.0},
+        {"model": "llama-3.3-70b-versatile"},
+    ],
+    "summarizer": [
+        {"model": "llama-3.1-8b-instant", "max_input_tokens": 24000, "latency_slo": 8.0},
+        {"model": "llama-3.3-70b-versatile"},
+    ],
+    "notes": [
+        {"model": "llama-3.1-8b-instant", "max_input_tokens": 1500, "max_output_tokens": 1200, "latency_slo": 8.0},
+        {"model": "llama-3.3-70b-versatile"},
+    ],
+}
+
+
+# SSE frame coalescing per streaming endpoint (services/sse.py). Deltas are
+# buffered until ``max_chars`` are pending or the oldest has waited
+# ``max_delay_ms``; the first delta of a stream is always sent at once.
+SSE_COALESCING = {
+    "default": {"max_chars": 64, "max_delay_ms": 20},
+    "tutor": {"max_chars": 32, "max_delay_ms": 10},
+    "summarizer": {"max_chars": 128, "max_delay_ms": 25},
+    "notes": {"max_chars": 128, "max_delay_ms": 25},
+}
+
+
 def get_model_config(tool: str) -> dict:
     """Get configuration for a specific AI tool."""
     return MODEL_CONFIGS.get(tool, MODEL_CONFIGS["tutor"])
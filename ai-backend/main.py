@@ -4,13 +4,27 @@ FastAPI main application entry point for AI Backend.
 
 from fastapi import FastAPI, Request, Response, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from slowapi.errors import RateLimitExceeded
 import logging
+import math
+import secrets
 
 from config import settings
-from middleware.rate_limit import limiter, rate_limit_exceeded_handler
-from routes import tutor, quiz, summarizer, notes, dashboard, courses
+from middleware.rate_limit import limiter, rate_limit_exceeded_handler, token_quota_exceeded_handler
+from middleware.metrics import MetricsMiddleware
+from middleware.tracing import TracingMiddleware
+from openrouter_client import groq_client
+from services.response_cache import response_cache
+from services.token_quota import token_quota, TokenQuotaExceeded
+from services.single_flight import single_flight
+from services.model_router import model_router
+from services.metrics import registry
+from services.upstream_governor import upstream_governor, UpstreamBusy
+from services.supabase_logger import ai_log_writer
+from services.data_access import shutdown_executor
+from services.course_cache import course_cache
+from routes import tutor, quiz, summarizer, notes, dashboard, courses, admin
 
 # --------------------------------------------------
 # Logging
@@ -38,6 +52,7 @@ app = FastAPI(
 # --------------------------------------------------
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
+app.add_exception_handler(TokenQuotaExceeded, token_quota_exceeded_handler)
 
 # --------------------------------------------------
 # CORS (FIXED)
@@ -57,8 +72,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Tokens-Saved", "Retry-After", "Server-Timing"],
 )
 
+app.add_middleware(TracingMiddleware)
+# Added last, so outermost: latency covers CORS, error handling and tracing too
+app.add_middleware(MetricsMiddleware)
+
 # --------------------------------------------------
 # OPTIONS preflight handler (CRITICAL FIX)
 # --------------------------------------------------
@@ -66,6 +86,21 @@ app.add_middleware(
 async def preflight_handler(path: str):
     return Response(status_code=200)
 
+# --------------------------------------------------
+# Upstream saturated: tell the client when to retry
+# --------------------------------------------------
+@app.exception_handler(UpstreamBusy)
+async def upstream_busy_handler(request: Request, exc: UpstreamBusy):
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+        content={
+            "error": "upstream_busy",
+            "message": str(exc),
+            "retry_after": str(math.ceil(exc.retry_after))
+        }
+    )
+
 # --------------------------------------------------
 # Global exception handler
 # --------------------------------------------------
@@ -91,6 +126,38 @@ async def health_check():
         "version": "1.0.0"
     }
 
+@app.get("/api/ai/health/upstream")
+async def upstream_health():
+    return {
+        "pool": groq_client.pool_stats(),
+        "governor": upstream_governor.stats(),
+        "resilience": groq_client.resilience_stats(),
+        "routing": model_router.stats(),
+        "single_flight": single_flight.stats(),
+        "token_quota": token_quota.stats()
+    }
+
+@app.get("/api/ai/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    # Never served unauthenticated: without a token the endpoint does not exist
+    if not settings.metrics_enabled or not settings.metrics_token:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    expected = f"Bearer {settings.metrics_token}"
+    if not secrets.compare_digest(request.headers.get("Authorization", ""), expected):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/ai/health/logs")
+async def logs_health():
+    return ai_log_writer.stats()
+
+@app.get("/api/ai/health/cache")
+async def cache_health():
+    return {
+        **response_cache.stats(),
+        "courses": course_cache.stats()
+    }
+
 # --------------------------------------------------
 # Models
 # --------------------------------------------------
@@ -109,6 +176,7 @@ app.include_router(tutor.router)
 app.include_router(quiz.router)
 app.include_router(summarizer.router)
 app.include_router(notes.router)
+app.include_router(admin.router)
 app.include_router(
     courses.router, 
     prefix="/api/courses", 
@@ -134,8 +202,11 @@ async def startup_event():
     else:
         logger.info("Groq API configured")
 
+    await groq_client.start()
+
     if settings.supabase_url and settings.supabase_key:
         logger.info("Supabase enabled")
+        ai_log_writer.start()
     else:
         logger.warning("Supabase not configured")
 
@@ -147,6 +218,9 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Shutting down backend")
+    await ai_log_writer.stop()
+    await groq_client.close()
+    shutdown_executor()
 
 # --------------------------------------------------
 # Local run
@@ -0,0 +1,199 @@
+"""
+SQLite storage backend for the rate limiter.
+
+slowapi's default ``memory://`` storage lives inside one process, so with
+several uvicorn workers each enforces ``RATE_LIMITS`` on its own and the
+effective limit is multiplied by the worker count. Importing this module
+registers a ``sqlite://`` scheme with ``limits``; pointing it at a file on
+tmpfs (``sqlite:////dev/shm/studedu-ratelimit.db``) gives every worker on
+the host one set of counters without running a separate server.
+
+Each sliding-window hit reads, checks and increments its counter inside a
+single ``BEGIN IMMEDIATE`` transaction, so concurrent workers can never
+admit more than the limit between them.
+
+For several hosts use ``redis://`` instead, which ``limits`` supports
+natively with the same sliding-window strategy (requires ``redis``).
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport
+
+# Expired rows are purged once every this many writes.
+PURGE_EVERY = 1000
+
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport):
+    """
+    Rate limit storage in a local SQLite database shared across processes.
+
+    URI: ``sqlite:///relative/path.db`` or ``sqlite:////absolute/path.db``.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = uri[len("sqlite:///"):] or "studedu-ratelimit.db"
+        self.timeout = float(options.get("timeout", 5.0))
+        self._local = threading.local()
+        self._writes = 0
+
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS counters ("
+            " key TEXT PRIMARY KEY,"
+            " value INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sliding_windows ("
+            " key TEXT PRIMARY KEY,"
+            " window INTEGER NOT NULL,"
+            " current INTEGER NOT NULL,"
+            " previous INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread, reopened in a forked worker.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Counters are ephemeral; losing the last few on power loss is fine.
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _maybe_purge(self, conn: sqlite3.Connection, now: float):
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            conn.execute("DELETE FROM counters WHERE expires_at < ?", (now,))
+            conn.execute("DELETE FROM sliding_windows WHERE expires_at < ?", (now,))
+
+    # ----------------------------------------------------------------
+    # Fixed window
+    # ----------------------------------------------------------------
+
+    def incr(self, key: str, expiry: int, elastic_expiry: bool = False, amount: int = 1) -> int:
+        # ``elastic_expiry`` is only passed by limits 4.x (fixed-window-elastic-expiry).
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value, expires_at FROM counters WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                value, expires_at = amount, now + expiry
+            else:
+                value, expires_at = row[0] + amount, now + expiry if elastic_expiry else row[1]
+            conn.execute(
+                "INSERT OR REPLACE INTO counters (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._maybe_purge(conn, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def get(self, key: str) -> int:
+        row = self._connect().execute(
+            "SELECT value FROM counters WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        row = self._connect().execute(
+            "SELECT expires_at FROM counters WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row and row[0] > time.time() else time.time()
+
+    def check(self) -> bool:
+        try:
+            self._connect().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int:
+        conn = self._connect()
+        removed = conn.execute("DELETE FROM counters").rowcount
+        removed += conn.execute("DELETE FROM sliding_windows").rowcount
+        return removed
+
+    def clear(self, key: str) -> None:
+        self._connect().execute("DELETE FROM counters WHERE key = ?", (key,))
+
+    # ----------------------------------------------------------------
+    # Sliding window counter
+    # ----------------------------------------------------------------
+
+    @staticmethod
+    def _window(row, expiry: int, now: float) -> tuple[int, int, int, float]:
+        """Return (window index, previous count, current count, seconds into window)."""
+        index = math.floor(now / expiry)
+        elapsed = now - index * expiry
+        if row is None:
+            return index, 0, 0, elapsed
+        window, current, previous = row
+        if window == index:
+            return index, previous, current, elapsed
+        if window == index - 1:
+            return index, current, 0, elapsed
+        return index, 0, 0, elapsed
+
+    def acquire_sliding_window_entry(
+        self, key: str, limit: int, expiry: int, amount: int = 1
+    ) -> bool:
+        if amount > limit:
+            return False
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT window, current, previous FROM sliding_windows WHERE key = ?", (key,)
+            ).fetchone()
+            index, previous, current, elapsed = self._window(row, expiry, now)
+            weighted = previous * (expiry - elapsed) / expiry + current
+            allowed = math.floor(weighted) + amount <= limit
+            if allowed:
+                conn.execute(
+                    "INSERT OR REPLACE INTO sliding_windows"
+                    " (key, window, current, previous, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, index, current + amount, previous, (index + 2) * expiry),
+                )
+                self._maybe_purge(conn, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed
+
+    def get_sliding_window(self, key: str, expiry: int) -> tuple[int, float, int, float]:
+        now = time.time()
+        row = self._connect().execute(
+            "SELECT window, current, previous FROM sliding_windows WHERE key = ?", (key,)
+        ).fetchone()
+        _, previous, current, elapsed = self._window(row, expiry, now)
+        previous_ttl = float(expiry - elapsed) if previous else 0.0
+        current_ttl = float(2 * expiry - elapsed)
+        return previous, previous_ttl, current, current_ttl
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        self._connect().execute("DELETE FROM sliding_windows WHERE key = ?", (key,))
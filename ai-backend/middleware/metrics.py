@@ -0,0 +1,64 @@
+"""
+ASGI middleware recording request latency and active SSE streams.
+
+Written as a plain ASGI callable rather than ``BaseHTTPMiddleware`` so it
+adds no task or body buffering to streaming responses; per request it costs
+one ``perf_counter`` pair, a header scan and a histogram observation.
+Routes are labelled by their template (``/api/courses/{course_id}``), never
+the raw path, to keep label cardinality bounded; unrouted requests share the
+``unmatched`` label.
+"""
+import time
+
+from config import settings
+from services.metrics import HTTP_REQUEST_DURATION, SSE_ACTIVE_STREAMS, current_tool, tool_for_path
+
+
+def route_template(scope) -> str:
+    """The matched route's path template, e.g. ``/api/courses/{course_id}``."""
+    route = scope.get("route")
+    if route is None or "endpoint" not in scope:
+        return "unmatched"
+    # Routes of a router included with a prefix keep their own path; the
+    # prefix is whatever of the request path precedes the part they match.
+    path = scope["path"]
+    for i, ch in enumerate(path):
+        if ch == "/" and route.path_regex.match(path[i:]):
+            return path[:i] + route.path_format
+    return route.path_format
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.metrics_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        token = current_tool.set(tool_for_path(scope["path"]))
+        status = 500
+        stream_route = None
+
+        async def send_with_metrics(message):
+            nonlocal status, stream_route
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for name, value in message.get("headers", ()):
+                    if name == b"content-type" and value.startswith(b"text/event-stream"):
+                        stream_route = route_template(scope)
+                        SSE_ACTIVE_STREAMS.inc(stream_route)
+                        break
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            if stream_route is not None:
+                SSE_ACTIVE_STREAMS.dec(stream_route)
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started, scope["method"], route_template(scope), str(status)
+            )
+            current_tool.reset(token)
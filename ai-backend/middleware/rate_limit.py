@@ -7,6 +7,9 @@ from slowapi.errors import RateLimitExceeded
 from fastapi import Request, Response
 from fastapi.responses import JSONResponse
 from config import settings
+from services.token_quota import TokenQuotaExceeded
+# Registers the sqlite:// storage scheme with limits.
+import middleware.limiter_storage  # noqa: F401
 
 
 def get_user_id_or_ip(request: Request) -> str:
@@ -23,8 +26,16 @@ def get_user_id_or_ip(request: Request) -> str:
     return get_remote_address(request)
 
 
-# Create limiter instance
-limiter = Limiter(key_func=get_user_id_or_ip)
+# Create limiter instance. Counters live in settings.rate_limit_storage_uri
+# so every worker shares them; a shared backend that goes away falls back
+# to per-process memory rather than failing requests.
+limiter = Limiter(
+    key_func=get_user_id_or_ip,
+    storage_uri=settings.rate_limit_storage_uri,
+    strategy=settings.rate_limit_strategy,
+    in_memory_fallback_enabled=not settings.rate_limit_storage_uri.startswith("memory://"),
+    enabled=settings.rate_limit_enabled
+)
 
 
 def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded) -> Response:
@@ -39,11 +50,27 @@ def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded) -> Res
     )
 
 
+def token_quota_exceeded_handler(request: Request, exc: TokenQuotaExceeded) -> Response:
+    """Handler for exhausted per-user token quotas."""
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(exc.retry_after)},
+        content={
+            "error": "token_quota_exceeded",
+            "message": f"Token quota exceeded ({exc.limit} tokens per {exc.window}). "
+                       f"Try again in {exc.retry_after} seconds.",
+            "retry_after": str(exc.retry_after),
+            "window": exc.window
+        }
+    )
+
+
 # Rate limit strings for different endpoints
 RATE_LIMITS = {
     "default": f"{settings.rate_limit_per_minute}/minute",
     "tutor": "15/minute",  # Lower for chat (more resource intensive)
     "quiz": "10/minute",   # Lower for quiz generation
     "summarize": "20/minute",
+    "summarize_batch": "5/minute",  # Per batch; items are bounded by the token quota
     "notes": "15/minute"
 }
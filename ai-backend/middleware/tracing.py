@@ -0,0 +1,69 @@
+"""
+ASGI middleware that traces each request's spans (see services/tracing.py).
+
+Adds a ``Server-Timing`` header with the spans finished before the response
+starts, plus ``app`` for the time to the response headers. Streaming
+responses send their headers before the upstream call, so their upstream
+spans only appear in the log line written when the response ends. That line
+is logged at INFO above ``trace_slow_request_ms`` and at DEBUG otherwise,
+with the spans also attached as ``extra={"trace": ...}`` for JSON log
+formatters. A sampled fraction of requests is handed to the profiler.
+"""
+import logging
+
+from config import settings
+from middleware.metrics import route_template
+from services.profiler import profiler
+from services.tracing import RequestTrace, current_trace
+
+logger = logging.getLogger(__name__)
+
+
+class TracingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.tracing_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = current_trace.set(trace)
+        profiled = profiler.should_sample()
+        if profiled:
+            profiler.begin(trace)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = trace.server_timing(app=trace.elapsed()).encode()
+                message["headers"] = list(message.get("headers", ())) + [(b"server-timing", timing)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            total = trace.elapsed()
+            route = route_template(scope)
+            if profiled:
+                profiler.end(trace, f"{scope['method']} {route}")
+            level = logging.INFO if total * 1000 >= settings.trace_slow_request_ms else logging.DEBUG
+            if logger.isEnabledFor(level):
+                spans = trace.as_log()
+                logger.log(
+                    level,
+                    f"{scope['method']} {route} {status} {total * 1000:.1f}ms "
+                    + " ".join(f"{name}={ms}ms" for name, ms in spans.items()),
+                    extra={"trace": {
+                        "method": scope["method"],
+                        "route": route,
+                        "status": status,
+                        "total_ms": round(total * 1000, 1),
+                        "spans_ms": spans,
+                        "profiled": profiled,
+                    }}
+                )
+            current_trace.reset(token)
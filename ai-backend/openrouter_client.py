@@ -1,13 +1,58 @@
+import asyncio
 import httpx
-import json
 import logging
+import time
 from typing import AsyncGenerator, Optional
 from config import settings, get_model_config
+from services.metrics import current_tool, LLM_GENERATION_DURATION, LLM_TOKENS, LLM_TTFT, LLM_UPSTREAM_ERRORS
+from services.sse import SSEParser, StreamMeta
+from services.token_quota import token_quota
+from services.tracing import record
+from services.tokens import estimate_tokens, message_tokens
+from services.upstream_governor import upstream_governor, UpstreamBusy
+from services.upstream_resilience import (
+    GroqAPIError,
+    backoff_delay,
+    circuit_breakers,
+    latency_tracker,
+)
+
+# Statuses that mean "too much load, try again later" rather than a bad request.
+THROTTLE_STATUSES = (429, 503)
 
 logger = logging.getLogger(__name__)
 
+
+def _record_usage(model: str, usage: Optional[dict]):
+    if not usage:
+        return
+    tool = current_tool.get()
+    LLM_TOKENS.inc(tool, model, "prompt", amount=usage.get("prompt_tokens", 0))
+    LLM_TOKENS.inc(tool, model, "completion", amount=usage.get("completion_tokens", 0))
+
+
+def _error_kind(error: BaseException) -> str:
+    if isinstance(error, GroqAPIError):
+        return str(error.status_code)
+    return "timeout" if isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException)) else "transport"
+
+
+def _retry_after(response: httpx.Response) -> float:
+    """Seconds the upstream asked us to wait, defaulting to one."""
+    try:
+        return min(max(float(response.headers.get("Retry-After", 1.0)), 0.0), 60.0)
+    except ValueError:
+        return 1.0
+
+
 class GroqClient:
-    """Async client for Groq API (OpenAI-compatible)."""
+    """Async client for Groq API (OpenAI-compatible).
+
+    A single pooled ``httpx.AsyncClient`` is shared by every request so
+    connections (and their TLS sessions) are reused across calls. The pool
+    is opened in the FastAPI startup hook and closed at shutdown; if a call
+    arrives before ``start()`` the client is created lazily.
+    """
     
     def __init__(self):
         self.api_key = settings.groq_api_key
@@ -16,6 +61,181 @@ class GroqClient:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
+        self._client: Optional[httpx.AsyncClient] = None
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._total_requests = 0
+        self._retries = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+    
+    def _build_client(self) -> httpx.AsyncClient:
+        """Create the shared pooled client from settings."""
+        limits = httpx.Limits(
+            max_connections=settings.groq_max_connections,
+            max_keepalive_connections=settings.groq_max_keepalive_connections,
+            keepalive_expiry=settings.groq_keepalive_expiry,
+        )
+        timeout = httpx.Timeout(
+            connect=settings.groq_connect_timeout,
+            read=settings.groq_read_timeout,
+            write=settings.groq_connect_timeout,
+            pool=settings.groq_pool_timeout,
+        )
+        http2 = settings.groq_http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("h2 package not installed, falling back to HTTP/1.1")
+                http2 = False
+        
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.headers,
+            limits=limits,
+            timeout=timeout,
+            http2=http2,
+        )
+    
+    async def start(self):
+        """Open the shared connection pool."""
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+            logger.info(
+                f"Groq client pool opened (max_connections={settings.groq_max_connections}, "
+                f"keepalive={settings.groq_max_keepalive_connections})"
+            )
+    
+    async def close(self):
+        """Close the shared connection pool."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("Groq client pool closed")
+        self._client = None
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Return the shared pooled client, creating it if needed."""
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+    
+    def _acquire(self):
+        self._in_flight += 1
+        self._total_requests += 1
+        self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+    
+    def _release(self):
+        self._in_flight -= 1
+    
+    def pool_stats(self) -> dict:
+        """Report connection pool utilisation for sizing the limits."""
+        stats = {
+            "open": self._client is not None and not self._client.is_closed,
+            "max_connections": settings.groq_max_connections,
+            "max_keepalive_connections": settings.groq_max_keepalive_connections,
+            "in_flight_requests": self._in_flight,
+            "peak_in_flight_requests": self._peak_in_flight,
+            "total_requests": self._total_requests,
+            "connections": 0,
+            "idle_connections": 0,
+            "http2_connections": 0,
+        }
+        if not stats["open"]:
+            return stats
+        
+        # httpx does not expose pool internals publicly; read httpcore's
+        # connection list defensively so a version bump only loses detail.
+        pool = getattr(self._client._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        stats["connections"] = len(connections)
+        for conn in connections:
+            try:
+                if conn.is_idle():
+                    stats["idle_connections"] += 1
+                if "HTTP/2" in repr(conn):
+                    stats["http2_connections"] += 1
+            except Exception:
+                continue
+        return stats
+    
+    def resilience_stats(self) -> dict:
+        """Retry, hedging and circuit breaker counters."""
+        return {
+            "retries": self._retries,
+            "hedged_requests": self._hedges,
+            "hedge_wins": self._hedge_wins,
+            "hedging_enabled": settings.groq_hedge_enabled,
+            "circuit_breakers": circuit_breakers.stats(),
+        }
+    
+    async def _attempt(self, payload: dict, timeout: float) -> dict:
+        """One request through the governor; 429/503 are queued again."""
+        for _ in range(settings.upstream_max_requeues + 1):
+            async with upstream_governor.slot() as slot:
+                self._acquire()
+                try:
+                    response = await asyncio.wait_for(
+                        self.client.post("/chat/completions", json=payload),
+                        timeout
+                    )
+                finally:
+                    self._release()
+                
+                if response.status_code != 200:
+                    LLM_UPSTREAM_ERRORS.inc(payload["model"], str(response.status_code))
+                if response.status_code in THROTTLE_STATUSES:
+                    # Queue again behind the governor's back-off instead of failing.
+                    slot.throttle(_retry_after(response))
+                    logger.warning(f"Groq API throttled: {response.status_code}, requeueing")
+                    continue
+                if response.status_code == 200:
+                    slot.mark_ready()
+                    latency_tracker.observe(payload["model"], slot.latency)
+            break
+        else:
+            raise UpstreamBusy(f"Groq API error: {response.status_code}", slot.retry_after)
+        
+        if response.status_code != 200:
+            error_text = response.text
+            logger.error(f"Groq API error: {response.status_code} - {error_text}")
+            raise GroqAPIError(response.status_code)
+        
+        return response.json()
+    
+    async def _hedged(self, payload: dict, timeout: float) -> dict:
+        """
+        Run an attempt; if it outlives the model's p95 latency, race an
+        identical second attempt against it and keep whichever wins.
+        """
+        primary = asyncio.ensure_future(self._attempt(payload, timeout))
+        tasks = {primary}
+        try:
+            delay = latency_tracker.hedge_delay(payload["model"])
+            if delay is None:
+                return await primary
+            
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self._hedges += 1
+                hedge = asyncio.ensure_future(self._attempt(payload, timeout))
+                tasks.add(hedge)
+            
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
     
     async def chat_completion(
         self,
@@ -25,7 +245,13 @@ class GroqClient:
         max_tokens: int = 2048,
         stream: bool = False
     ) -> dict:
-        """Send a chat completion request to Groq API."""
+        """
+        Send a chat completion request to Groq API.
+        Transient failures are retried with jittered backoff, slow attempts
+        may be hedged, and an open circuit for ``model`` fails fast. All
+        attempts, including queueing and backoff, share one deadline of
+        ``groq_total_timeout`` seconds.
+        """
         
         payload = {
             "model": model,
@@ -34,20 +260,45 @@ class GroqClient:
             "max_tokens": max_tokens,
             "stream": stream,
         }
+        breaker = circuit_breakers.get(model)
+        started = time.perf_counter()
+        deadline = time.monotonic() + settings.groq_total_timeout
         
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json=payload
-            )
-            
-            if response.status_code != 200:
-                error_text = response.text
-                logger.error(f"Groq API error: {response.status_code} - {error_text}")
-                raise Exception(f"Groq API error: {response.status_code}")
-            
-            return response.json()
+        try:
+            for attempt in range(settings.groq_max_retries + 1):
+                remaining = deadline - time.monotonic()
+                breaker.before_call()
+                try:
+                    data = await asyncio.wait_for(
+                        self._hedged(payload, min(settings.groq_attempt_timeout, remaining)),
+                        remaining
+                    )
+                except (GroqAPIError, httpx.TransportError, asyncio.TimeoutError) as e:
+                    if not isinstance(e, GroqAPIError):
+                        LLM_UPSTREAM_ERRORS.inc(model, _error_kind(e))
+                    if isinstance(e, GroqAPIError) and not e.retryable:
+                        # The upstream answered; the request itself was bad.
+                        breaker.record_success()
+                        raise
+                    breaker.record_failure()
+                    delay = backoff_delay(attempt)
+                    if attempt == settings.groq_max_retries or time.monotonic() + delay >= deadline:
+                        raise
+                    self._retries += 1
+                    logger.warning(f"Groq call to {model} failed ({e!r}), retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                except BaseException:
+                    breaker.release_probe()
+                    raise
+                
+                breaker.record_success()
+                token_quota.charge(data.get("usage", {}).get("total_tokens", 0))
+                LLM_GENERATION_DURATION.observe(time.perf_counter() - started, current_tool.get(), model, "false")
+                _record_usage(model, data.get("usage"))
+                return data
+        finally:
+            record("llm", time.perf_counter() - started)
     
     async def chat_completion_stream(
         self,
@@ -55,8 +306,12 @@ class GroqClient:
         model: str = "llama-3.3-70b-versatile",
         temperature: float = 0.7,
         max_tokens: int = 2048,
+        meta: Optional[StreamMeta] = None,
     ) -> AsyncGenerator[str, None]:
-        """Stream chat completion from Groq API."""
+        """
+        Stream chat completion from Groq API. ``meta``, if given, receives
+        the finish reason and usage reported at the end of the stream.
+        """
         
         payload = {
             "model": model,
@@ -66,29 +321,77 @@ class GroqClient:
             "stream": True,
         }
         
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async with client.stream(
-                "POST",
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json=payload
-            ) as response:
-                if response.status_code != 200:
-                    error_text = await response.aread()
-                    logger.error(f"Groq API stream error: {response.status_code} - {error_text}")
-                    raise Exception(f"Groq API error: {response.status_code}")
-                
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]
-                        if data == "[DONE]":
-                            break
-                        try:
-                            chunk = json.loads(data)
-                            if chunk.get("choices") and chunk["choices"][0].get("delta", {}).get("content"):
-                                yield chunk["choices"][0]["delta"]["content"]
-                        except json.JSONDecodeError:
-                            continue
+        # Groq reports usage on the final chunk; estimate if it never arrives.
+        meta = meta or StreamMeta()
+        generated = []
+        started = time.perf_counter()
+        completed = False
+        
+        breaker = circuit_breakers.get(model)
+        breaker.before_call()
+        
+        try:
+            for _ in range(settings.upstream_max_requeues + 1):
+                async with upstream_governor.slot() as slot:
+                    self._acquire()
+                    try:
+                        async with self.client.stream(
+                            "POST",
+                            "/chat/completions",
+                            json=payload
+                        ) as response:
+                            if response.status_code != 200:
+                                LLM_UPSTREAM_ERRORS.inc(model, str(response.status_code))
+                            if response.status_code in THROTTLE_STATUSES:
+                                await response.aread()
+                                slot.throttle(_retry_after(response))
+                                logger.warning(f"Groq API stream throttled: {response.status_code}, requeueing")
+                                continue
+                            if response.status_code != 200:
+                                error_text = await response.aread()
+                                logger.error(f"Groq API stream error: {response.status_code} - {error_text}")
+                                error = GroqAPIError(response.status_code)
+                                if error.retryable:
+                                    breaker.record_failure()
+                                else:
+                                    breaker.record_success()
+                                raise error
+                            slot.mark_ready()
+                            breaker.record_success()
+                            
+                            parser = SSEParser(meta)
+                            async for data in response.aiter_bytes():
+                                for delta in parser.feed(data):
+                                    if not generated:
+                                        LLM_TTFT.observe(time.perf_counter() - started, current_tool.get(), model)
+                                        record("llm_ttft", time.perf_counter() - started)
+                                    generated.append(delta)
+                                    yield delta
+                                if parser.done:
+                                    break
+                            completed = True
+                            if meta.finish_reason == "length":
+                                logger.warning(f"Groq stream for {model} stopped at max_tokens={max_tokens}")
+                    finally:
+                        self._release()
+                return
+            raise UpstreamBusy(f"Groq API error: {response.status_code}", slot.retry_after)
+        except (httpx.TransportError, asyncio.TimeoutError) as e:
+            LLM_UPSTREAM_ERRORS.inc(model, _error_kind(e))
+            breaker.record_failure()
+            raise
+        finally:
+            breaker.release_probe()
+            record("llm_stream", time.perf_counter() - started)
+            if completed:
+                LLM_GENERATION_DURATION.observe(time.perf_counter() - started, current_tool.get(), model, "true")
+                _record_usage(model, meta.usage)
+            if meta.usage:
+                token_quota.charge(meta.usage.get("total_tokens", 0))
+            elif generated:
+                token_quota.charge(
+                    sum(message_tokens(m) for m in messages) + estimate_tokens("".join(generated))
+                )
 
 
 # Global client instance
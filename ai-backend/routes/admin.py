@@ -0,0 +1,72 @@
+"""
+Admin endpoints for the request profiler.
+Disabled (404) unless ADMIN_TOKEN is set; every call needs it as a bearer token.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+import logging
+import secrets
+
+from services.profiler import profiler
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def require_admin(request: Request):
+    """Reject the request unless it carries the admin bearer token."""
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    expected = f"Bearer {settings.admin_token}"
+    if not secrets.compare_digest(request.headers.get("Authorization", ""), expected):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+router = APIRouter(
+    prefix="/api/ai/admin",
+    tags=["Admin"],
+    include_in_schema=False,
+    dependencies=[Depends(require_admin)]
+)
+
+
+class ProfilingUpdate(BaseModel):
+    """New profiler settings."""
+    sample_rate: float = Field(..., ge=0.0, le=1.0, description="Fraction of requests to profile; 0 turns it off")
+
+
+@router.get("/profiling")
+async def profiling_status():
+    """Profiler state and the most recent profiles."""
+    return {
+        **profiler.stats(),
+        "profiles": profiler.list_profiles()[:50]
+    }
+
+
+@router.put("/profiling")
+async def update_profiling(body: ProfilingUpdate):
+    """
+    Set the profiled fraction of requests for all workers on this host.
+    Takes effect within a second.
+    """
+    try:
+        profiler.set_sample_rate(body.sample_rate)
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Could not store sample rate: {e}")
+
+    logger.warning(f"Request profiling sample rate set to {body.sample_rate}")
+    return profiler.stats()
+
+
+@router.get("/profiling/profiles/{name}", response_class=PlainTextResponse)
+async def get_profile(name: str):
+    """
+    One profile in collapsed-stack format, e.g. for
+    ``flamegraph.pl profile.folded > profile.svg`` or speedscope.
+    """
+    profile = profiler.read_profile(name)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile)
@@ -1,13 +1,19 @@
 
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends, Header, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
+import asyncio
+import json
 import logging
 import uuid
 from datetime import datetime
 
-from services.course_generator import generate_course_content
-from services.db import get_supabase_client
+from services.course_generator import generate_course_content, generate_course_events
+from services import data_access
+from services.data_access import DatabaseUnavailable
+from services.upstream_governor import UpstreamBusy
+from services.course_cache import CachedCourse, course_cache, etag_matches, serialize_course
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -19,6 +25,7 @@ logger = logging.getLogger(__name__)
 class GenerateCourseRequest(BaseModel):
     topic: str
     difficulty: Optional[str] = "intermediate"
+    stream: bool = False
 
 class LessonModel(BaseModel):
     title: str
@@ -43,10 +50,35 @@ class CourseGeneratedResponse(BaseModel):
 async def generate_course(request: GenerateCourseRequest):
     """
     Generate a formatted course curriculum using AI.
+    With stream=true, returns SSE events as the outline and each lesson
+    become ready, ending with the assembled course.
     """
+    if request.stream:
+        async def generate():
+            """Generator for streaming response."""
+            try:
+                async for event in generate_course_events(request.topic, request.difficulty):
+                    yield f"data: {json.dumps(event)}\n\n"
+                yield f"data: {json.dumps({'done': True})}\n\n"
+            except Exception as e:
+                logger.error(f"Course generation failed: {e}")
+                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+        
+        return StreamingResponse(
+            generate(),
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "Connection": "keep-alive",
+                "X-Accel-Buffering": "no"
+            }
+        )
+    
     try:
         course_data = await generate_course_content(request.topic, request.difficulty)
         return course_data
+    except UpstreamBusy:
+        raise
     except Exception as e:
         logger.error(f"Course generation failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -66,14 +98,10 @@ async def save_course(
     # Extract user_id from "Bearer <user_id>"
     # In production, verify JWT. Here we trust the client for prototype speed.
     user_id = authorization.replace("Bearer ", "")
-    
-    supabase = get_supabase_client()
-    if not supabase:
-        raise HTTPException(status_code=503, detail="Database unavailable")
 
     try:
         # 1. Insert Course
-        course_res = supabase.table("courses").insert({
+        course = await data_access.insert_course({
             "title": course_data.title,
             "description": course_data.description,
             "instructor_id": user_id,
@@ -82,12 +110,9 @@ async def save_course(
             "difficulty": "Intermediate",
             "price": 0,
             "published": True
-        }).execute()
+        })
         
-        if not course_res.data:
-            raise Exception("Failed to save course")
-            
-        course_id = course_res.data[0]['id']
+        course_id = course['id']
         
         # 2. Insert Lessons (Flattening modules for now as schema might be simpler)
         # Check schema structure next step to refine this. 
@@ -121,39 +146,55 @@ async def save_course(
                 })
                 order_index += 1
                 
-        if all_lessons:
-            supabase.table("lessons").insert(all_lessons).execute()
+        await data_access.insert_lessons(all_lessons)
             
         return {"id": course_id, "message": "Course saved successfully"}
 
+    except DatabaseUnavailable:
+        raise HTTPException(status_code=503, detail="Database unavailable")
     except Exception as e:
         logger.error(f"Failed to save course: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{course_id}")
-async def get_course(course_id: str):
+async def get_course(course_id: str, if_none_match: Optional[str] = Header(None)):
     """
     Get a full course with modules and lessons.
+    Responses carry a strong ETag; a matching If-None-Match returns 304.
     """
-    supabase = get_supabase_client()
-    if not supabase:
-        raise HTTPException(status_code=503, detail="Database unavailable")
+    cached = course_cache.get(course_id)
+    if cached is None:
+        course = await _assemble_course(course_id)
+        if course["lessons"][0]["items"]:
+            cached = course_cache.put(course_id, course)
+        else:
+            # Lessons are inserted after the course row, so an empty course may
+            # still be mid-save; serve it without pinning it in the cache.
+            cached = CachedCourse(serialize_course(course), expires_at=0.0)
+    
+    headers = {
+        "ETag": cached.etag,
+        "Cache-Control": "no-cache"
+    }
+    if etag_matches(if_none_match, cached.etag):
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
 
+async def _assemble_course(course_id: str) -> dict:
+    """Fetch a course and its lessons and shape them for the frontend."""
     try:
-        # 1. Get Course
-        course_res = supabase.table("courses").select("*").eq("id", course_id).execute()
+        # 1. Get Course and Lessons (independent, so fetched concurrently)
+        course, lessons = await asyncio.gather(
+            data_access.fetch_course(course_id),
+            data_access.fetch_lessons(course_id)
+        )
         
-        if not course_res.data:
+        if not course:
             raise HTTPException(status_code=404, detail="Course not found")
-            
-        course = course_res.data[0]
-        
-        # 2. Get Lessons
-        lessons_res = supabase.table("lessons").select("*").eq("course_id", course_id).order("order_index").execute()
         
-        lessons = lessons_res.data if lessons_res.data else []
-        
-        # 3. Format Lessons for Frontend
+        # 2. Format Lessons for Frontend
         formatted_lessons = []
         for l in lessons:
             # Format duration seconds -> mm:ss
@@ -183,6 +224,8 @@ async def get_course(course_id: str):
             "lessons": modules
         }
 
+    except DatabaseUnavailable:
+        raise HTTPException(status_code=503, detail="Database unavailable")
     except Exception as e:
         logger.error(f"Failed to fetch course: {e}")
         if isinstance(e, HTTPException):
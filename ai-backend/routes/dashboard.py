@@ -1,9 +1,16 @@
-from fastapi import APIRouter, HTTPException, Header
+from fastapi import APIRouter, HTTPException, Header, Query, Response
 from pydantic import BaseModel
 from typing import List, Optional
-from services.db import get_supabase_client
+from datetime import datetime
+import base64
+import json
+import logging
+import uuid
+from services import data_access
+from services.data_access import DatabaseUnavailable
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 class DashboardStats(BaseModel):
     total_learning_time: str
@@ -24,8 +31,7 @@ class CourseProgress(BaseModel):
 @router.get("/stats", response_model=DashboardStats)
 async def get_dashboard_stats(authorization: str = Header(None)):
     """Get dashboard stats for the authenticated user."""
-    client = get_supabase_client()
-    if not client:
+    if not data_access.is_configured():
         raise HTTPException(status_code=500, detail="Database not configured")
     
     # In a real app, verifying the JWT from 'authorization' header would give us the user_id.
@@ -42,33 +48,80 @@ async def get_dashboard_stats(authorization: str = Header(None)):
         "streak_days": 3
     }
 
-@router.get("/courses", response_model=List[CourseProgress])
-async def get_dashboard_courses():
-    """Get courses for the dashboard."""
-    client = get_supabase_client()
-    if not client:
-         # Return mock data if DB not connected
-        return []
+def _encode_cursor(created_at: str, course_id: str) -> str:
+    raw = json.dumps([created_at, course_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
 
+def _decode_cursor(cursor: str) -> tuple[str, str]:
     try:
-        # Fetch courses from DB
-        response = client.table("courses").select("*").execute()
-        courses = response.data
-        
-        # Transform to match response model (adding mock progress for now)
-        return [
-            {
-                "id": c["id"],
-                "title": c["title"],
-                "description": c["description"] or "",
-                "thumbnail_url": c["thumbnail_url"],
-                "progress": 0, # Placeholder
-                "total_lessons": 10, # Placeholder
-                "completed_lessons": 0, # Placeholder
-                "instructor_name": "StudEdu Instructor" 
-            }
-            for c in courses
-        ]
-    except Exception as e:
-        print(f"Error fetching courses: {e}")
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, course_id = json.loads(base64.urlsafe_b64decode(padded))
+        # Re-serialize both values: they end up inside a PostgREST filter string.
+        return datetime.fromisoformat(created_at).isoformat(), str(uuid.UUID(course_id))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _to_course_progress(c: dict, with_progress: bool) -> dict:
+    """Aggregate embedded lessons/progress into a CourseProgress row."""
+    lessons = c.get("lessons") or []
+    
+    if with_progress:
+        total = len(lessons)
+        completed = sum(
+            1 for lesson in lessons
+            if any(p.get("is_completed") for p in (lesson.get("progress") or []))
+        )
+    else:
+        # lessons(count) embeds as [{"count": n}]
+        total = lessons[0].get("count", 0) if lessons else 0
+        completed = 0
+    
+    instructor = c.get("instructor") or {}
+    return {
+        "id": c["id"],
+        "title": c["title"],
+        "description": c.get("description") or "",
+        "thumbnail_url": c.get("thumbnail_url"),
+        "progress": round(completed * 100 / total) if total else 0,
+        "total_lessons": total,
+        "completed_lessons": completed,
+        "instructor_name": instructor.get("full_name") or "StudEdu Instructor"
+    }
+
+
+@router.get("/courses", response_model=List[CourseProgress])
+async def get_dashboard_courses(
+    response: Response,
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="Opaque cursor from X-Next-Cursor"),
+    authorization: str = Header(None)
+):
+    """
+    Get a page of courses for the dashboard with the user's progress.
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    user_id = None
+    if authorization:
+        # The id is used in the query filter, so it must be a real UUID.
+        try:
+            user_id = str(uuid.UUID(authorization.replace("Bearer ", "")))
+        except ValueError:
+            raise HTTPException(status_code=401, detail="Invalid Authorization header")
+    after = _decode_cursor(cursor) if cursor else None
+    
+    try:
+        courses = await data_access.list_dashboard_courses(user_id, limit, after)
+    except DatabaseUnavailable:
+        # Return mock data if DB not connected
         return []
+    except Exception as e:
+        logger.exception(f"Failed to fetch dashboard courses: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch courses")
+    
+    if len(courses) == limit:
+        last = courses[-1]
+        response.headers["X-Next-Cursor"] = _encode_cursor(last["created_at"], last["id"])
+    
+    return [_to_course_progress(c, with_progress=bool(user_id)) for c in courses]
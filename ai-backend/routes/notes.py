@@ -5,15 +5,22 @@ from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, Literal
-import json
 
-from openrouter_client import groq_client
+from services.model_router import model_router
+from services.tokens import message_tokens
 from services.supabase_logger import log_ai_interaction_async
-from middleware.rate_limit import limiter, RATE_LIMITS
+from services.sse import TextStream, StreamMeta, sse_event
+from services.response_cache import response_cache, make_cache_key, replay_as_sse
+from services.token_quota import token_quota, projected_cost
+from services.upstream_governor import UpstreamBusy
+from middleware.rate_limit import limiter, RATE_LIMITS, get_user_id_or_ip
 from config import MODEL_CONFIGS
 
 router = APIRouter(prefix="/api/ai/notes", tags=["AI Notes Generator"])
 
+# Typical reply size per detail level, for model routing
+NOTES_OUTPUT_TOKENS = {"brief": 500, "standard": 1200, "comprehensive": 3000}
+
 
 class NotesGenerateRequest(BaseModel):
     """Request body for notes generation."""
@@ -81,32 +88,63 @@ Make the notes:
     
     user_id = request.headers.get("X-User-ID")
     
+    cache_key = make_cache_key(
+        "notes",
+        body.content,
+        detail_level=body.detail_level,
+        include_examples=body.include_examples,
+        include_summary=body.include_summary,
+        lesson_title=body.lesson_title
+    )
+    cached = await response_cache.get(cache_key)
+    if cached is None:
+        token_quota.check(get_user_id_or_ip(request), "notes", projected_cost(messages, config["max_tokens"]))
+    route = model_router.route(
+        "notes",
+        sum(message_tokens(m) for m in messages),
+        NOTES_OUTPUT_TOKENS.get(body.detail_level)
+    )
+    
     if body.stream:
+        if cached is not None:
+            return StreamingResponse(
+                replay_as_sse(cached["notes"]),
+                media_type="text/event-stream",
+                headers={
+                    "Cache-Control": "no-cache",
+                    "Connection": "keep-alive"
+                }
+            )
+        
         async def generate():
             """Generator for streaming response."""
-            full_response = ""
+            stream = TextStream("notes")
+            meta = StreamMeta()
             
             try:
-                async for chunk in groq_client.chat_completion_stream(
+                async for frame in stream.frames(model_router.chat_completion_stream(
+                    route,
                     messages=messages,
-                    model=config["model"],
                     temperature=config["temperature"],
-                    max_tokens=config["max_tokens"]
-                ):
-                    full_response += chunk
-                    yield f"data: {json.dumps({'content': chunk})}\n\n"
+                    max_tokens=config["max_tokens"],
+                    meta=meta
+                )):
+                    yield frame
+                
+                yield sse_event({"done": True, "finish_reason": meta.finish_reason})
                 
-                yield f"data: {json.dumps({'done': True})}\n\n"
+                await response_cache.set(cache_key, {"notes": stream.text, "model": route.model})
                 
                 await log_ai_interaction_async(
                     user_id=user_id,
                     prompt=f"Generate {body.detail_level} notes",
-                    response=full_response,
-                    model=config["model"]
+                    response=stream.text,
+                    model=route.model,
+                    routing=route.as_log()
                 )
                 
             except Exception as e:
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                yield sse_event({"error": str(e)})
         
         return StreamingResponse(
             generate(),
@@ -118,30 +156,43 @@ Make the notes:
         )
     
     else:
+        if cached is not None:
+            return NotesGenerateResponse(
+                notes=cached["notes"],
+                detail_level=body.detail_level,
+                model=cached.get("model", config["model"]),
+                lesson_title=body.lesson_title
+            )
+        
         try:
-            response = await groq_client.chat_completion(
+            response = await model_router.chat_completion(
+                route,
                 messages=messages,
-                model=config["model"],
                 temperature=config["temperature"],
                 max_tokens=config["max_tokens"]
             )
             
             notes = response["choices"][0]["message"]["content"]
             
+            await response_cache.set(cache_key, {"notes": notes, "model": route.model})
+            
             await log_ai_interaction_async(
                 user_id=user_id,
                 prompt=f"Generate {body.detail_level} notes for {body.lesson_title}",
                 response=notes,
-                model=config["model"],
-                tokens_used=response.get("usage", {}).get("total_tokens")
+                model=route.model,
+                tokens_used=response.get("usage", {}).get("total_tokens"),
+                routing=route.as_log()
             )
             
             return NotesGenerateResponse(
                 notes=notes,
                 detail_level=body.detail_level,
-                model=config["model"],
+                model=route.model,
                 lesson_title=body.lesson_title
             )
             
+        except UpstreamBusy:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
@@ -2,14 +2,24 @@
 AI Quiz Generator endpoint.
 """
 from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List
 import json
-import re
 
-from openrouter_client import groq_client
+from services.model_router import model_router
 from services.supabase_logger import log_ai_interaction_async
-from middleware.rate_limit import limiter, RATE_LIMITS
+from services.response_cache import response_cache, make_cache_key
+from services.llm_json import ArrayItemStream, LLMJSONError
+from services.quiz_generator import (
+    build_quiz_messages, generate_quiz_questions, is_valid_question, plan_shards, route_quiz, QUESTION_TOKENS
+)
+from services.sse import sse_event
+from services.tokens import message_tokens
+from services.tracing import span
+from services.token_quota import token_quota, projected_cost
+from services.upstream_governor import UpstreamBusy
+from middleware.rate_limit import limiter, RATE_LIMITS, get_user_id_or_ip
 from config import MODEL_CONFIGS
 
 router = APIRouter(prefix="/api/ai/quiz", tags=["AI Quiz Generator"])
@@ -39,6 +49,16 @@ class QuizGenerateResponse(BaseModel):
     model: str
 
 
+def quiz_cache_key(body: QuizGenerateRequest) -> str:
+    return make_cache_key(
+        "quiz",
+        body.content,
+        count=body.count,
+        difficulty=body.difficulty,
+        topic=body.topic
+    )
+
+
 @router.post("/generate", response_model=QuizGenerateResponse)
 @limiter.limit(RATE_LIMITS["quiz"])
 async def generate_quiz(request: Request, body: QuizGenerateRequest):
@@ -48,70 +68,44 @@ async def generate_quiz(request: Request, body: QuizGenerateRequest):
     """
     config = MODEL_CONFIGS["quiz"]
     
-    # Build the prompt
-    difficulty_guide = {
-        "easy": "straightforward questions testing basic recall and understanding",
-        "medium": "questions requiring application and analysis of concepts",
-        "hard": "challenging questions requiring synthesis and evaluation"
-    }
+    cache_key = quiz_cache_key(body)
+    cached = await response_cache.get(cache_key)
+    if cached is not None:
+        return QuizGenerateResponse(
+            questions=[QuizQuestion(**q) for q in cached["questions"]],
+            topic=body.topic,
+            difficulty=body.difficulty,
+            model=cached.get("model", config["model"])
+        )
     
-    prompt = f"""Generate exactly {body.count} {body.difficulty} difficulty quiz questions based on this content:
-
----
-{body.content}
----
-
-{f"Focus specifically on: {body.topic}" if body.topic else ""}
-
-Difficulty guideline: {difficulty_guide.get(body.difficulty, difficulty_guide["medium"])}
-
-IMPORTANT: Respond ONLY with valid JSON in this exact format:
-{{
-  "questions": [
-    {{
-      "question": "Question text here?",
-      "options": ["Option A", "Option B", "Option C", "Option D"],
-      "correct_answer": 0,
-      "explanation": "Brief explanation of why this is correct"
-    }}
-  ]
-}}
-
-Make sure:
-- Each question has exactly 4 options
-- correct_answer is the index (0-3) of the correct option
-- Questions are diverse and test different aspects of the content
-- Explanations are educational and helpful"""
-
-    messages = [
-        {"role": "system", "content": config["system_prompt"]},
-        {"role": "user", "content": prompt}
-    ]
+    with span("prompt"):
+        # Every shard can use a full max_tokens reply.
+        messages = build_quiz_messages(body.content, body.count, body.difficulty, body.topic)
+        shards = len(plan_shards(body.count))
+        token_quota.check(get_user_id_or_ip(request), "quiz", projected_cost(messages, config["max_tokens"] * shards))
+        route = route_quiz(body.content, body.count, body.difficulty, body.topic)
     
     try:
-        response = await groq_client.chat_completion(
-            messages=messages,
-            model=config["model"],
-            temperature=config["temperature"],
-            max_tokens=config["max_tokens"]
+        generated, tokens_used = await generate_quiz_questions(
+            body.content,
+            body.count,
+            body.difficulty,
+            body.topic,
+            route=route
         )
         
-        content = response["choices"][0]["message"]["content"]
-        
-        # Parse JSON from response (handle markdown code blocks)
-        json_match = re.search(r'```(?:json)?\s*([\s\S]*?)```', content)
-        if json_match:
-            json_str = json_match.group(1)
-        else:
-            json_str = content
-        
-        # Clean and parse JSON
-        json_str = json_str.strip()
-        quiz_data = json.loads(json_str)
+        questions = [QuizQuestion(**q) for q in generated]
+        if len(questions) != body.count:
+            # Top-up failed or dedupe left too few; never cache or return a short quiz.
+            raise HTTPException(
+                status_code=502,
+                detail=f"Generated only {len(questions)} of {body.count} questions"
+            )
         
-        questions = [
-            QuizQuestion(**q) for q in quiz_data.get("questions", [])
-        ]
+        await response_cache.set(
+            cache_key,
+            {"questions": [q.model_dump() for q in questions], "model": route.model}
+        )
         
         # Log the interaction
         user_id = request.headers.get("X-User-ID")
@@ -119,21 +113,113 @@ Make sure:
             user_id=user_id,
             prompt=f"Generate {body.count} {body.difficulty} quiz questions",
             response=f"Generated {len(questions)} questions",
-            model=config["model"],
-            tokens_used=response.get("usage", {}).get("total_tokens")
+            model=route.model,
+            tokens_used=tokens_used,
+            routing=route.as_log()
         )
         
         return QuizGenerateResponse(
             questions=questions,
             topic=body.topic,
             difficulty=body.difficulty,
-            model=config["model"]
+            model=route.model
         )
         
-    except json.JSONDecodeError as e:
+    except LLMJSONError as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to parse quiz response: {str(e)}"
         )
+    except (UpstreamBusy, HTTPException):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/generate/stream")
+@limiter.limit(RATE_LIMITS["quiz"])
+async def generate_quiz_stream(request: Request, body: QuizGenerateRequest):
+    """
+    Generate quiz questions and stream each one as an SSE event as soon as
+    its JSON object is complete.
+    
+    Events:
+        {"question": {...}, "index": n}     a parsed QuizQuestion
+        {"error": "...", "index": n}        a question that failed to parse
+        {"done": true, "count": n}          generation finished
+    """
+    config = MODEL_CONFIGS["quiz"]
+    messages = build_quiz_messages(body.content, body.count, body.difficulty, body.topic)
+    cache_key = quiz_cache_key(body)
+    cached = await response_cache.get(cache_key)
+    if cached is None:
+        token_quota.check(get_user_id_or_ip(request), "quiz", projected_cost(messages, config["max_tokens"]))
+        # One unsharded reply carries every question.
+        route = model_router.route(
+            "quiz",
+            sum(message_tokens(m) for m in messages),
+            body.count * QUESTION_TOKENS
+        )
+    user_id = request.headers.get("X-User-ID")
+    
+    async def generate():
+        """Generator for streaming response."""
+        if cached is not None:
+            for index, question in enumerate(cached["questions"]):
+                yield sse_event({"question": question, "index": index})
+            yield sse_event({"done": True, "count": len(cached["questions"]), "cached": True})
+            return
+        
+        parser = ArrayItemStream()
+        questions = []
+        failed = 0
+        index = 0
+        
+        try:
+            async for chunk in model_router.chat_completion_stream(
+                route,
+                messages=messages,
+                temperature=config["temperature"],
+                max_tokens=config["max_tokens"]
+            ):
+                for raw in parser.feed(chunk):
+                    try:
+                        parsed = json.loads(raw)
+                        # Same checks as the non-streaming path (answer in range, distinct options).
+                        if not isinstance(parsed, dict) or not is_valid_question(parsed):
+                            raise ValueError("invalid question structure")
+                        question = QuizQuestion(**parsed)
+                    except Exception as e:
+                        failed += 1
+                        yield sse_event({"error": f"Failed to parse question: {e}", "index": index})
+                    else:
+                        questions.append(question.model_dump())
+                        yield sse_event({"question": questions[-1], "index": index})
+                    index += 1
+            
+            yield sse_event({"done": True, "count": len(questions), "failed": failed})
+            
+            # Shared with the non-streaming endpoint, which promises exactly count questions.
+            if len(questions) == body.count and not failed:
+                await response_cache.set(cache_key, {"questions": questions, "model": route.model})
+            
+            await log_ai_interaction_async(
+                user_id=user_id,
+                prompt=f"Generate {body.count} {body.difficulty} quiz questions (stream)",
+                response=f"Generated {len(questions)} questions",
+                model=route.model,
+                routing=route.as_log()
+            )
+            
+        except Exception as e:
+            yield sse_event({"error": str(e)})
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
@@ -4,15 +4,23 @@ AI Summarizer endpoint.
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional, Literal
-import json
+from typing import Optional, Literal, List
+import asyncio
+import logging
 
-from openrouter_client import groq_client
+from services.model_router import model_router, RouteDecision
+from services.tokens import message_tokens
+from services.long_summarizer import is_long_document, map_reduce_summarize, map_reduce_summarize_stream
 from services.supabase_logger import log_ai_interaction_async
-from middleware.rate_limit import limiter, RATE_LIMITS
-from config import MODEL_CONFIGS
+from services.sse import TextStream, StreamMeta, dumps, sse_event
+from services.response_cache import response_cache, make_cache_key, replay_as_sse
+from services.token_quota import token_quota, projected_cost
+from services.upstream_governor import UpstreamBusy
+from middleware.rate_limit import limiter, RATE_LIMITS, get_user_id_or_ip
+from config import MODEL_CONFIGS, settings
 
 router = APIRouter(prefix="/api/ai", tags=["AI Summarizer"])
+logger = logging.getLogger(__name__)
 
 
 class SummarizeRequest(BaseModel):
@@ -37,78 +45,197 @@ class SummarizeResponse(BaseModel):
     word_count: int
 
 
-@router.post("/summarize")
-@limiter.limit(RATE_LIMITS["summarize"])
-async def summarize_content(request: Request, body: SummarizeRequest):
-    """
-    Summarize content in the requested format.
-    Supports both streaming and non-streaming responses.
-    """
-    config = MODEL_CONFIGS["summarizer"]
-    
-    format_instructions = {
-        "bullets": """Format your summary as bullet points:
+class BatchSummarizeItem(BaseModel):
+    """One document of a batch."""
+    id: Optional[str] = Field(default=None, description="Client key echoed in the result (defaults to the index)")
+    content: str = Field(..., description="Content to summarize")
+    format: Literal["bullets", "paragraph", "concepts"] = Field(default="bullets")
+    max_length: Optional[int] = Field(default=None, description="Maximum length in words (approximate)")
+
+
+class BatchSummarizeRequest(BaseModel):
+    """Request body for batch summarization."""
+    items: List[BatchSummarizeItem] = Field(
+        ...,
+        min_length=1,
+        max_length=settings.summarize_batch_max_items,
+        description="Documents to summarize"
+    )
+
+
+FORMAT_INSTRUCTIONS = {
+    "bullets": """Format your summary as bullet points:
 • Each bullet should be a complete, concise point
 • Use nested bullets for sub-points if needed
 • Start with the most important points""",
-        "paragraph": """Format your summary as flowing paragraphs:
+    "paragraph": """Format your summary as flowing paragraphs:
 • Write in clear, academic prose
 • Maintain logical flow between ideas
 • Use transitions between paragraphs""",
-        "concepts": """Format your summary as key concepts:
+    "concepts": """Format your summary as key concepts:
 **Concept Name**: Brief explanation
 • List supporting details
 • Include relationships between concepts"""
-    }
-    
-    length_instruction = ""
-    if body.max_length:
-        length_instruction = f"\nKeep the summary to approximately {body.max_length} words."
-    
+}
+
+
+def format_instruction(format: str, max_length: Optional[int]) -> str:
+    """Format and length instructions shared by direct and map-reduce prompts."""
+    instruction = FORMAT_INSTRUCTIONS.get(format, FORMAT_INSTRUCTIONS["bullets"])
+    if max_length:
+        instruction += f"\n\nKeep the summary to approximately {max_length} words."
+    return instruction
+
+
+def summary_cache_key(content: str, format: str, max_length: Optional[int]) -> str:
+    return make_cache_key("summarizer", content, format=format, max_length=max_length)
+
+
+def build_summary_messages(content: str, instructions: str) -> list[dict]:
+    """Messages for summarizing ``content`` in one completion."""
     prompt = f"""Summarize the following content:
 
 ---
-{body.content}
+{content}
 ---
 
-{format_instructions.get(body.format, format_instructions["bullets"])}
-{length_instruction}
+{instructions}
 
 Create a clear, educational summary that captures all key information."""
 
-    messages = [
-        {"role": "system", "content": config["system_prompt"]},
+    return [
+        {"role": "system", "content": MODEL_CONFIGS["summarizer"]["system_prompt"]},
         {"role": "user", "content": prompt}
     ]
+
+
+def route_summary(content: str, messages: list[dict], max_length: Optional[int]) -> Optional[RouteDecision]:
+    """
+    Model route for a direct summary, or None for a long document, which is
+    map-reduced on the summarizer model instead.
+    """
+    if is_long_document(content):
+        return None
+    return model_router.route(
+        "summarizer",
+        sum(message_tokens(m) for m in messages),
+        int(max_length * 1.4) if max_length else None
+    )
+
+
+async def generate_summary(
+    content: str,
+    format: str,
+    instructions: str,
+    messages: list[dict],
+    route: Optional[RouteDecision],
+    cache_key: str,
+    user_id: Optional[str]
+) -> tuple[str, str]:
+    """
+    Summarize one uncached document (map-reduce when ``route`` is None),
+    then cache and log the result. Returns the summary and the model used.
+    """
+    config = MODEL_CONFIGS["summarizer"]
+    
+    finish_reason = None
+    if route is None:
+        result = await map_reduce_summarize(content, instructions)
+        summary = result["summary"]
+        tokens_used = result["tokens_used"]
+    else:
+        response = await model_router.chat_completion(
+            route,
+            messages=messages,
+            temperature=config["temperature"],
+            max_tokens=config["max_tokens"]
+        )
+        summary = response["choices"][0]["message"]["content"]
+        finish_reason = response["choices"][0].get("finish_reason")
+        tokens_used = response.get("usage", {}).get("total_tokens")
+    
+    model = route.model if route else config["model"]
+    if finish_reason != "length":
+        await response_cache.set(cache_key, {"summary": summary, "model": model})
+    
+    await log_ai_interaction_async(
+        user_id=user_id,
+        prompt=f"Summarize ({format})",
+        response=summary,
+        model=model,
+        tokens_used=tokens_used,
+        routing=route.as_log() if route else None
+    )
+    return summary, model
+
+
+@router.post("/summarize")
+@limiter.limit(RATE_LIMITS["summarize"])
+async def summarize_content(request: Request, body: SummarizeRequest):
+    """
+    Summarize content in the requested format.
+    Supports both streaming and non-streaming responses.
+    """
+    config = MODEL_CONFIGS["summarizer"]
+    
+    instructions = format_instruction(body.format, body.max_length)
+    messages = build_summary_messages(body.content, instructions)
     
     user_id = request.headers.get("X-User-ID")
     
+    cache_key = summary_cache_key(body.content, body.format, body.max_length)
+    cached = await response_cache.get(cache_key)
+    if cached is None:
+        token_quota.check(get_user_id_or_ip(request), "summarize", projected_cost(messages, config["max_tokens"]))
+    route = route_summary(body.content, messages, body.max_length)
+    
     if body.stream:
+        if cached is not None:
+            return StreamingResponse(
+                replay_as_sse(cached["summary"]),
+                media_type="text/event-stream",
+                headers={
+                    "Cache-Control": "no-cache",
+                    "Connection": "keep-alive"
+                }
+            )
+        
         async def generate():
             """Generator for streaming response."""
-            full_response = ""
+            stream = TextStream("summarizer")
+            meta = StreamMeta()
             
             try:
-                async for chunk in groq_client.chat_completion_stream(
-                    messages=messages,
-                    model=config["model"],
-                    temperature=config["temperature"],
-                    max_tokens=config["max_tokens"]
-                ):
-                    full_response += chunk
-                    yield f"data: {json.dumps({'content': chunk})}\n\n"
+                if route is None:
+                    source = map_reduce_summarize_stream(body.content, instructions, meta)
+                else:
+                    source = model_router.chat_completion_stream(
+                        route,
+                        messages=messages,
+                        temperature=config["temperature"],
+                        max_tokens=config["max_tokens"],
+                        meta=meta
+                    )
+                async for frame in stream.frames(source):
+                    yield frame
                 
-                yield f"data: {json.dumps({'done': True})}\n\n"
+                yield sse_event({"done": True, "finish_reason": meta.finish_reason})
+                
+                model = route.model if route else config["model"]
+                # A summary cut off at max_tokens is not worth serving again.
+                if meta.finish_reason != "length":
+                    await response_cache.set(cache_key, {"summary": stream.text, "model": model})
                 
                 await log_ai_interaction_async(
                     user_id=user_id,
                     prompt=f"Summarize ({body.format})",
-                    response=full_response,
-                    model=config["model"]
+                    response=stream.text,
+                    model=model,
+                    routing=route.as_log() if route else None
                 )
                 
             except Exception as e:
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                yield sse_event({"error": str(e)})
         
         return StreamingResponse(
             generate(),
@@ -120,31 +247,127 @@ Create a clear, educational summary that captures all key information."""
         )
     
     else:
-        try:
-            response = await groq_client.chat_completion(
-                messages=messages,
-                model=config["model"],
-                temperature=config["temperature"],
-                max_tokens=config["max_tokens"]
+        if cached is not None:
+            return SummarizeResponse(
+                summary=cached["summary"],
+                format=body.format,
+                model=cached.get("model", config["model"]),
+                word_count=len(cached["summary"].split())
             )
-            
-            summary = response["choices"][0]["message"]["content"]
-            word_count = len(summary.split())
-            
-            await log_ai_interaction_async(
-                user_id=user_id,
-                prompt=f"Summarize ({body.format})",
-                response=summary,
-                model=config["model"],
-                tokens_used=response.get("usage", {}).get("total_tokens")
+        
+        try:
+            summary, model = await generate_summary(
+                body.content,
+                body.format,
+                instructions,
+                messages,
+                route,
+                cache_key,
+                user_id
             )
             
             return SummarizeResponse(
                 summary=summary,
                 format=body.format,
-                model=config["model"],
-                word_count=word_count
+                model=model,
+                word_count=len(summary.split())
             )
             
+        except UpstreamBusy:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/summarize/batch")
+@limiter.limit(RATE_LIMITS["summarize_batch"])
+async def summarize_batch(request: Request, body: BatchSummarizeRequest):
+    """
+    Summarize many documents in one request.
+    Items run concurrently (up to ``summarize_batch_concurrency``) and each
+    result is streamed as one NDJSON line as soon as it is ready, so cached
+    and short items arrive first:
+        {"index": 0, "id": "...", "summary": "...", "format": ..., "model": ..., "word_count": ..., "cached": false}
+        {"index": 3, "id": "...", "error": "..."}
+        {"done": true, "succeeded": 49, "failed": 1}
+    The token quota is checked once for all uncached items up front.
+    """
+    config = MODEL_CONFIGS["summarizer"]
+    user_id = request.headers.get("X-User-ID")
+    
+    instructions = [format_instruction(item.format, item.max_length) for item in body.items]
+    messages = [build_summary_messages(item.content, text) for item, text in zip(body.items, instructions)]
+    cache_keys = [summary_cache_key(item.content, item.format, item.max_length) for item in body.items]
+    cached = await asyncio.gather(*(response_cache.get(key) for key in cache_keys))
+    
+    pending = [i for i, hit in enumerate(cached) if hit is None]
+    if pending:
+        token_quota.check(
+            get_user_id_or_ip(request),
+            "summarize",
+            sum(projected_cost(messages[i], config["max_tokens"]) for i in pending)
+        )
+    
+    def result_line(index: int, **fields) -> str:
+        item = body.items[index]
+        return dumps({"index": index, "id": item.id if item.id is not None else str(index), **fields}) + "\n"
+    
+    def summary_line(index: int, summary: str, model: str, from_cache: bool) -> str:
+        return result_line(
+            index,
+            summary=summary,
+            format=body.items[index].format,
+            model=model,
+            word_count=len(summary.split()),
+            cached=from_cache
+        )
+    
+    semaphore = asyncio.Semaphore(settings.summarize_batch_concurrency)
+    
+    async def summarize_item(index: int) -> tuple[bool, str]:
+        item = body.items[index]
+        async with semaphore:
+            try:
+                route = route_summary(item.content, messages[index], item.max_length)
+                summary, model = await generate_summary(
+                    item.content,
+                    item.format,
+                    instructions[index],
+                    messages[index],
+                    route,
+                    cache_keys[index],
+                    user_id
+                )
+            except Exception as e:
+                logger.warning(f"Batch summary item {index} failed: {e}")
+                return False, result_line(index, error=str(e))
+        return True, summary_line(index, summary, model, False)
+    
+    async def generate():
+        """Generator for the NDJSON response."""
+        succeeded = 0
+        for index, hit in enumerate(cached):
+            if hit is not None:
+                succeeded += 1
+                yield summary_line(index, hit["summary"], hit.get("model", config["model"]), True)
+        
+        tasks = [asyncio.create_task(summarize_item(i)) for i in pending]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                ok, line = await finished
+                succeeded += ok
+                yield line
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        yield dumps({"done": True, "succeeded": succeeded, "failed": len(body.items) - succeeded}) + "\n"
+    
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
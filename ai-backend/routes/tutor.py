@@ -5,14 +5,22 @@ from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
-import json
+import logging
 
 from openrouter_client import groq_client
 from services.supabase_logger import log_ai_interaction_async
-from middleware.rate_limit import limiter, RATE_LIMITS
-from config import MODEL_CONFIGS
+from services.sse import TextStream, StreamMeta, sse_event
+from services.tracing import span
+from middleware.rate_limit import limiter, RATE_LIMITS, get_user_id_or_ip
+from services.conversation_window import conversation_window
+from services.token_quota import token_quota
+from services.model_router import model_router
+from services.tokens import message_tokens, truncate_to_tokens
+from services.upstream_governor import UpstreamBusy
+from config import MODEL_CONFIGS, settings
 
 router = APIRouter(prefix="/api/ai/tutor", tags=["AI Tutor"])
+logger = logging.getLogger(__name__)
 
 
 class ChatMessage(BaseModel):
@@ -34,6 +42,7 @@ class TutorChatResponse(BaseModel):
     """Response from tutor chat (non-streaming)."""
     response: str
     model: str
+    tokens_saved: int = 0
 
 
 @router.post("/chat")
@@ -45,64 +54,86 @@ async def chat_with_tutor(request: Request, body: TutorChatRequest):
     """
     config = MODEL_CONFIGS["tutor"]
     
-    # Build messages with history
-    messages = [
-        {"role": "system", "content": config["system_prompt"]}
-    ]
-    
-    # Add context about current lesson/course if provided
-    if body.context or body.lesson_title or body.course_title:
-        context_parts = []
-        if body.course_title:
-            context_parts.append(f"Course: {body.course_title}")
-        if body.lesson_title:
-            context_parts.append(f"Lesson: {body.lesson_title}")
-        if body.context:
-            context_parts.append(f"Content: {body.context}")
+    with span("prompt"):
+        # Build messages with history
+        messages = [
+            {"role": "system", "content": config["system_prompt"]}
+        ]
         
-        messages.append({
-            "role": "system",
-            "content": f"Current learning context:\n{chr(10).join(context_parts)}"
-        })
-    
-    # Add chat history
-    for msg in (body.history or []):
-        messages.append({"role": msg.role, "content": msg.content})
-    
-    # Add current message
-    messages.append({"role": "user", "content": body.message})
+        # Add context about current lesson/course if provided
+        if body.context or body.lesson_title or body.course_title:
+            context_parts = []
+            if body.course_title:
+                context_parts.append(f"Course: {body.course_title}")
+            if body.lesson_title:
+                context_parts.append(f"Lesson: {body.lesson_title}")
+            if body.context:
+                context = truncate_to_tokens(body.context, settings.tutor_context_budget_tokens)
+                context_parts.append(f"Content: {context}")
+            
+            messages.append({
+                "role": "system",
+                "content": f"Current learning context:\n{chr(10).join(context_parts)}"
+            })
+        
+        history = [{"role": msg.role, "content": msg.content} for msg in (body.history or [])]
+        current = {"role": "user", "content": body.message}
+        
+        # Quota and routing use the history capped at the window budget, since
+        # fitting the window may call upstream to summarize.
+        prompt_tokens = (
+            sum(message_tokens(m) for m in messages + [current])
+            + min(sum(message_tokens(m) for m in history), conversation_window.budget(config["model"]))
+        )
+        token_quota.check(get_user_id_or_ip(request), "tutor", prompt_tokens + config["max_tokens"])
+        route = model_router.route("tutor", prompt_tokens)
+        
+        # Add chat history, folded into the routed model's token budget
+        window = await conversation_window.fit(history, route.model)
+        messages.extend(window.history)
+        
+        # Add current message
+        messages.append(current)
     
     # Get user ID from headers for logging
     user_id = request.headers.get("X-User-ID")
     
+    if window.tokens_saved:
+        logger.info(
+            f"Tutor window saved {window.tokens_saved} tokens "
+            f"({window.summarized_messages} messages summarized)"
+        )
+    
     async def generate():
         """Generator for streaming response."""
-        full_response = ""
+        stream = TextStream("tutor")
+        meta = StreamMeta()
         
         try:
-            async for chunk in groq_client.chat_completion_stream(
+            async for frame in stream.frames(model_router.chat_completion_stream(
+                route,
                 messages=messages,
-                model=config["model"],
                 temperature=config["temperature"],
-                max_tokens=config["max_tokens"]
-            ):
-                full_response += chunk
-                # Send as Server-Sent Event format
-                yield f"data: {json.dumps({'content': chunk})}\n\n"
+                max_tokens=config["max_tokens"],
+                client=groq_client,
+                meta=meta
+            )):
+                yield frame
             
             # Send completion signal
-            yield f"data: {json.dumps({'done': True})}\n\n"
+            yield sse_event({"done": True, "finish_reason": meta.finish_reason})
             
             # Log the interaction asynchronously
             await log_ai_interaction_async(
                 user_id=user_id,
                 prompt=body.message,
-                response=full_response,
-                model=config["model"]
+                response=stream.text,
+                model=route.model,
+                routing=route.as_log()
             )
             
         except Exception as e:
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield sse_event({"error": str(e)})
     
     return StreamingResponse(
         generate(),
@@ -110,7 +141,8 @@ async def chat_with_tutor(request: Request, body: TutorChatRequest):
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
+            "X-Accel-Buffering": "no",
+            "X-Tokens-Saved": str(window.tokens_saved)
         }
     )
 
@@ -124,27 +156,40 @@ async def chat_with_tutor_sync(request: Request, body: TutorChatRequest):
     """
     config = MODEL_CONFIGS["tutor"]
     
-    messages = [
-        {"role": "system", "content": config["system_prompt"]}
-    ]
-    
-    if body.context:
-        messages.append({
-            "role": "system",
-            "content": f"Current lesson context: {body.context}"
-        })
-    
-    for msg in (body.history or []):
-        messages.append({"role": msg.role, "content": msg.content})
-    
-    messages.append({"role": "user", "content": body.message})
+    with span("prompt"):
+        messages = [
+            {"role": "system", "content": config["system_prompt"]}
+        ]
+        
+        if body.context:
+            context = truncate_to_tokens(body.context, settings.tutor_context_budget_tokens)
+            messages.append({
+                "role": "system",
+                "content": f"Current lesson context: {context}"
+            })
+        
+        history = [{"role": msg.role, "content": msg.content} for msg in (body.history or [])]
+        current = {"role": "user", "content": body.message}
+        
+        prompt_tokens = (
+            sum(message_tokens(m) for m in messages + [current])
+            + min(sum(message_tokens(m) for m in history), conversation_window.budget(config["model"]))
+        )
+        token_quota.check(get_user_id_or_ip(request), "tutor", prompt_tokens + config["max_tokens"])
+        route = model_router.route("tutor", prompt_tokens)
+        
+        window = await conversation_window.fit(history, route.model)
+        messages.extend(window.history)
+        
+        messages.append(current)
     
     try:
-        response = await groq_client.chat_completion(
+        response = await model_router.chat_completion(
+            route,
             messages=messages,
-            model=config["model"],
             temperature=config["temperature"],
-            max_tokens=config["max_tokens"]
+            max_tokens=config["max_tokens"],
+            client=groq_client
         )
         
         content = response["choices"][0]["message"]["content"]
@@ -155,11 +200,18 @@ async def chat_with_tutor_sync(request: Request, body: TutorChatRequest):
             user_id=user_id,
             prompt=body.message,
             response=content,
-            model=config["model"],
-            tokens_used=response.get("usage", {}).get("total_tokens")
+            model=route.model,
+            tokens_used=response.get("usage", {}).get("total_tokens"),
+            routing=route.as_log()
         )
         
-        return TutorChatResponse(response=content, model=config["model"])
+        return TutorChatResponse(
+            response=content,
+            model=route.model,
+            tokens_saved=window.tokens_saved
+        )
         
+    except UpstreamBusy:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,12 +1,34 @@
+"""
+Bulk course seeder.
+
+Generates and saves courses for a list of topics through the running
+backend, with bounded concurrency, rate-limit-aware pacing and a local
+checkpoint manifest so a rerun skips topics that were already seeded.
+
+Usage:
+    python seed_courses.py                                # built-in TOPICS
+    python seed_courses.py --topics-file topics.txt --concurrency 8 --per-minute 30
+
+A save whose outcome is unknown (a 5xx or a lost response, after which the
+course may or may not exist) is recorded as ``save_unknown`` together with
+the generated payload. Reruns skip those topics so they are not duplicated;
+check the catalogue and pass ``--retry-unknown`` to save them again from
+the recorded payload.
+"""
+import argparse
 import asyncio
-import httpx
 import json
+import os
 import random
+import time
+from typing import Optional
+
+import httpx
 
 API_URL = "http://127.0.0.1:8000/api/courses"
-# Use a hardcoded ID for now, or fetch one if we had a user endpoint. 
+# Use a hardcoded ID for now, or fetch one if we had a user endpoint.
 # This ID will be the "instructor".
-INSTRUCTOR_ID = "00000000-0000-0000-0000-000000000000" 
+INSTRUCTOR_ID = "00000000-0000-0000-0000-000000000000"
 
 TOPICS = [
     "Introduction to Artificial Intelligence",
@@ -15,43 +37,243 @@ TOPICS = [
     "Digital Marketing 101"
 ]
 
-async def generate_and_save_course(topic):
-    async with httpx.AsyncClient(timeout=300.0) as client:
+MAX_ATTEMPTS = 4
+
+
+class Pacer:
+    """Spaces out request starts to stay under a per-minute budget."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def back_off(self, seconds: float):
+        """Push every future start back after the server said 429."""
+        self._next = max(self._next, time.monotonic() + seconds)
+
+
+class Manifest:
+    """Append-only JSONL checkpoint of seeded topics."""
+
+    def __init__(self, path: str, retry_unknown: bool = False):
+        self.path = path
+        self.retry_unknown = retry_unknown
+        self.done: dict[str, dict] = {}
+        self.unknown: dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # partial line from an interrupted run
+                    self._track(entry)
+
+    def _track(self, entry: dict):
+        topic = entry["topic"]
+        if entry.get("status") == "save_unknown":
+            self.unknown[topic] = entry
+            if not self.retry_unknown:
+                self.done[topic] = entry
+        elif entry.get("status") == "saved":
+            self.unknown.pop(topic, None)
+            self.done[topic] = entry
+
+    def record(self, entry: dict):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._track(entry)
+
+
+def _retry_after(response: httpx.Response) -> float:
+    header = response.headers.get("Retry-After")
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass
+    try:
+        return float(response.json().get("retry_after", 0)) or 10.0
+    except Exception:
+        return 10.0
+
+
+async def _post(
+    client: httpx.AsyncClient,
+    pacer: Pacer,
+    url: str,
+    idempotent: bool = True,
+    **kwargs
+) -> httpx.Response:
+    """
+    POST with pacing, 429 handling and jittered backoff on transient errors.
+    A non-idempotent request is only retried when the server cannot have
+    acted on it (429, or the connection was never made), never after a
+    lost response or a 5xx.
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        await pacer.wait()
+        try:
+            response = await client.post(url, **kwargs)
+        except httpx.TransportError as e:
+            if attempt == MAX_ATTEMPTS or not (idempotent or isinstance(e, httpx.ConnectError)):
+                raise
+            await asyncio.sleep(2 ** attempt + random.random())
+            continue
+
+        if response.status_code == 429 and attempt < MAX_ATTEMPTS:
+            wait = _retry_after(response)
+            print(f"⏳ Rate limited, backing off {wait:.0f}s")
+            pacer.back_off(wait)
+            continue
+        if response.status_code >= 500 and idempotent and attempt < MAX_ATTEMPTS:
+            await asyncio.sleep(2 ** attempt + random.random())
+            continue
+        response.raise_for_status()
+        return response
+
+
+async def generate_and_save_course(
+    client: httpx.AsyncClient,
+    pacer: Pacer,
+    topic: str,
+    difficulty: str,
+    instructor_id: str,
+    course_data: Optional[dict] = None
+) -> dict:
+    """Generate (unless ``course_data`` is given) and save one course."""
+    entry = {"topic": topic}
+
+    # 1. Generate
+    if course_data is None:
         print(f"🚀 Generating course: '{topic}'...")
-        
-        # 1. Generate
+        started = time.perf_counter()
         try:
-            gen_res = await client.post(
-                f"{API_URL}/generate", 
-                json={"topic": topic, "difficulty": "Beginner"}
+            gen_res = await _post(
+                client, pacer, f"{API_URL}/generate",
+                json={"topic": topic, "difficulty": difficulty}
             )
-            gen_res.raise_for_status()
             course_data = gen_res.json()
+            entry["generate_s"] = round(time.perf_counter() - started, 3)
             print(f"✅ Generated: {course_data.get('title')}")
         except Exception as e:
             print(f"❌ Generation failed for '{topic}': {e}")
-            return
+            return {**entry, "status": "generate_failed", "error": str(e)}
+    else:
+        print(f"🔁 Retrying save from recorded payload: '{topic}'...")
 
-        # 2. Save
-        try:
-            save_res = await client.post(
-                f"{API_URL}/save",
-                json=course_data,
-                headers={"Authorization": f"Bearer {INSTRUCTOR_ID}"}
-            )
-            save_res.raise_for_status()
-            print(f"💾 Saved: {course_data.get('title')} (ID: {save_res.json()['id']})")
-        except Exception as e:
+    # 2. Save
+    started = time.perf_counter()
+    try:
+        save_res = await _post(
+            client, pacer, f"{API_URL}/save",
+            idempotent=False,
+            json=course_data,
+            headers={"Authorization": f"Bearer {instructor_id}"}
+        )
+        entry["save_s"] = round(time.perf_counter() - started, 3)
+        entry["course_id"] = save_res.json()["id"]
+        print(f"💾 Saved: {course_data.get('title')} (ID: {entry['course_id']})")
+        return {**entry, "status": "saved"}
+    except Exception as e:
+        rejected = isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500
+        if rejected or isinstance(e, httpx.ConnectError):
+            # The server never acted on the request, so a rerun may regenerate.
             print(f"❌ Save failed for '{topic}': {e}")
+            return {**entry, "status": "save_failed", "error": str(e)}
+        # 5xx or lost response: the course may exist, keep the payload so a
+        # --retry-unknown rerun can save it without regenerating.
+        print(f"❓ Save outcome unknown for '{topic}': {e}")
+        return {**entry, "status": "save_unknown", "error": str(e), "course": course_data}
+
+
+def _percentiles(values: list[float]) -> str:
+    if not values:
+        return "n/a"
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return f"p50={pick(0.50):.1f}s p90={pick(0.90):.1f}s p99={pick(0.99):.1f}s max={values[-1]:.1f}s"
+
+
+def load_topics(path: Optional[str]) -> list[str]:
+    if not path:
+        return TOPICS
+    with open(path) as f:
+        topics = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return list(dict.fromkeys(topics))  # de-duplicate, keep order
+
 
 async def main():
+    global API_URL
+
+    parser = argparse.ArgumentParser(description="Seed the course catalogue.")
+    parser.add_argument("--topics-file", help="one topic per line (defaults to built-in TOPICS)")
+    parser.add_argument("--api-url", default=API_URL)
+    parser.add_argument("--instructor-id", default=INSTRUCTOR_ID)
+    parser.add_argument("--difficulty", default="Beginner")
+    parser.add_argument("--concurrency", type=int, default=4, help="topics in flight at once")
+    parser.add_argument("--per-minute", type=float, default=20, help="max request starts per minute (0 = unpaced)")
+    parser.add_argument("--manifest", default="seed_manifest.jsonl", help="checkpoint file")
+    parser.add_argument("--retry-unknown", action="store_true",
+                        help="save topics whose earlier save outcome was unknown again")
+    args = parser.parse_args()
+    API_URL = args.api_url.rstrip("/")
+
     print("🌱 Starting Course Seeder...")
-    
-    # Run sequentially to be nice to the LLM rate limits
-    for topic in TOPICS:
-        await generate_and_save_course(topic)
-        
+
+    manifest = Manifest(args.manifest, retry_unknown=args.retry_unknown)
+    all_topics = load_topics(args.topics_file)
+    topics = [t for t in all_topics if t not in manifest.done]
+    skipped = len(all_topics) - len(topics)
+    if skipped:
+        print(f"⏭️  Skipping {skipped} topics already in {args.manifest}")
+    unknown = [t for t in all_topics if manifest.done.get(t, {}).get("status") == "save_unknown"]
+    if unknown:
+        print(f"⚠️  {len(unknown)} skipped topics have an unknown save outcome; "
+              f"check the catalogue and rerun with --retry-unknown")
+
+    pacer = Pacer(args.per_minute)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    results = []
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(300.0, connect=10.0), limits=limits) as client:
+
+        async def run(topic: str):
+            async with semaphore:
+                entry = await generate_and_save_course(
+                    client, pacer, topic, args.difficulty, args.instructor_id,
+                    course_data=manifest.unknown.get(topic, {}).get("course")
+                )
+                manifest.record(entry)
+                results.append(entry)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[run(topic) for topic in topics])
+        elapsed = time.perf_counter() - started
+
+    saved = [r for r in results if r["status"] == "saved"]
+    unsure = sum(r["status"] == "save_unknown" for r in results)
+    failed = len(results) - len(saved) - unsure
     print("✨ Seeding Complete!")
+    print(f"   saved={len(saved)} failed={failed} unknown={unsure} skipped={skipped} in {elapsed:.1f}s "
+          f"({len(saved) / elapsed * 60 if elapsed else 0:.1f} courses/min)")
+    print(f"   generate latency: {_percentiles([r['generate_s'] for r in results if 'generate_s' in r])}")
+    print(f"   save latency:     {_percentiles([r['save_s'] for r in results if 'save_s' in r])}")
+
 
 if __name__ == "__main__":
     asyncio.run(main())
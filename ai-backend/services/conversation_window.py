@@ -0,0 +1,185 @@
+"""
+Token-budgeted conversation window for the AI tutor.
+
+The tutor endpoints receive the full chat history from the client on every
+turn. Instead of forwarding it verbatim, the window keeps the most recent
+messages as-is and folds older turns into a rolling summary generated by the
+cheap summary model. Summaries are cached by a hash of the folded prefix, so
+each turn only summarizes the messages that fell out of the window since the
+previous turn.
+"""
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from config import settings, get_model_config, HISTORY_TOKEN_BUDGETS
+from openrouter_client import groq_client
+from services.tokens import estimate_tokens, message_tokens
+
+logger = logging.getLogger(__name__)
+
+# A kept message cut below this many tokens is dropped instead.
+MIN_TRUNCATED_TOKENS = 32
+
+
+def _trim_to_budget(messages: list[dict], budget: int) -> tuple[list[dict], int]:
+    """
+    Truncate, then drop, the oldest messages until ``messages`` fit
+    ``budget``. Returns the messages and their token count.
+    """
+    trimmed = list(messages)
+    used = sum(message_tokens(msg) for msg in trimmed)
+    while trimmed and used > budget:
+        oldest = trimmed[0]
+        content = oldest.get("content", "")
+        tokens = estimate_tokens(content)
+        allowed = tokens - (used - budget)
+        # Keep the start, cut in proportion to the estimate.
+        shortened = content[:len(content) * allowed // tokens].rsplit(" ", 1)[0] + " …"
+        if allowed < MIN_TRUNCATED_TOKENS or len(shortened) >= len(content):
+            trimmed.pop(0)
+        else:
+            trimmed[0] = {**oldest, "content": shortened}
+        used = sum(message_tokens(msg) for msg in trimmed)
+    return trimmed, used
+
+
+@dataclass
+class WindowResult:
+    """History to send upstream plus accounting for the request."""
+    history: list[dict]
+    original_tokens: int
+    window_tokens: int
+    summarized_messages: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.original_tokens - self.window_tokens, 0)
+
+
+class ConversationWindow:
+    """Fits chat history into a per-model token budget."""
+
+    def __init__(self, max_summaries: int = 2048):
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self.max_summaries = max_summaries
+
+    @staticmethod
+    def _prefix_hashes(messages: list[dict]) -> list[str]:
+        """Hash of messages[:i + 1] for every i, computed incrementally."""
+        digest = hashlib.sha256()
+        hashes = []
+        for msg in messages:
+            digest.update(msg.get("role", "").encode())
+            digest.update(b"\x00")
+            digest.update(msg.get("content", "").encode())
+            digest.update(b"\x01")
+            hashes.append(digest.copy().hexdigest())
+        return hashes
+
+    def _remember(self, key: str, summary: str):
+        self._summaries[key] = summary
+        self._summaries.move_to_end(key)
+        while len(self._summaries) > self.max_summaries:
+            self._summaries.popitem(last=False)
+
+    async def _summarize(self, previous: Optional[str], turns: list[dict]) -> str:
+        config = get_model_config("conversation_summary")
+        transcript = "\n".join(
+            f"{msg.get('role', 'user')}: {msg.get('content', '')}" for msg in turns
+        )
+        prompt = (
+            f"Previous summary:\n{previous or '(none)'}\n\n"
+            f"Next turns:\n{transcript}\n\n"
+            "Updated summary:"
+        )
+        response = await groq_client.chat_completion(
+            messages=[
+                {"role": "system", "content": config["system_prompt"]},
+                {"role": "user", "content": prompt}
+            ],
+            model=config["model"],
+            temperature=config["temperature"],
+            max_tokens=config["max_tokens"]
+        )
+        return response["choices"][0]["message"]["content"].strip()
+
+    async def _rolling_summary(self, folded: list[dict]) -> str:
+        hashes = self._prefix_hashes(folded)
+
+        # Reuse the longest already-summarized prefix and only fold the rest.
+        start, previous = 0, None
+        for i in range(len(hashes) - 1, -1, -1):
+            cached = self._summaries.get(hashes[i])
+            if cached is not None:
+                self._summaries.move_to_end(hashes[i])
+                start, previous = i + 1, cached
+                break
+
+        if start == len(folded):
+            return previous
+
+        summary = await self._summarize(previous, folded[start:])
+        self._remember(hashes[-1], summary)
+        return summary
+
+    @staticmethod
+    def budget(model: str) -> int:
+        """History token budget for ``model``."""
+        return HISTORY_TOKEN_BUDGETS.get(model, settings.tutor_history_budget_tokens)
+
+    async def fit(self, history: list[dict], model: str) -> WindowResult:
+        """
+        Return the history to send for ``model``.
+
+        Recent messages are kept verbatim (at least
+        ``settings.tutor_keep_recent_messages``, more if they fit the
+        budget); everything older is replaced by one summary message. If
+        the mandatory recent messages alone exceed the budget, the oldest
+        of them are truncated or dropped.
+        """
+        budget = self.budget(model)
+        sizes = [message_tokens(msg) for msg in history]
+        original = sum(sizes)
+
+        if original <= budget:
+            return WindowResult(history, original, original, 0)
+
+        # Walk back from the newest message while it fits the budget.
+        keep_from = len(history)
+        used = 0
+        while keep_from > 0:
+            size = sizes[keep_from - 1]
+            must_keep = len(history) - keep_from < settings.tutor_keep_recent_messages
+            if used + size > budget and not must_keep:
+                break
+            used += size
+            keep_from -= 1
+
+        recent = history[keep_from:]
+        folded = history[:keep_from]
+        if used > budget:
+            # The mandatory recent turns alone overrun the model's budget.
+            recent, used = _trim_to_budget(recent, budget)
+        if not folded:
+            return WindowResult(recent, original, used, 0)
+
+        try:
+            summary = await self._rolling_summary(folded)
+        except Exception as e:
+            # The summary is an optimisation; fall back to plain truncation.
+            logger.warning(f"Conversation summary failed, dropping {len(folded)} old messages: {e}")
+            return WindowResult(recent, original, used, len(folded))
+
+        summary_msg = {
+            "role": "system",
+            "content": f"Summary of the earlier conversation:\n{summary}"
+        }
+        window = [summary_msg] + recent
+        return WindowResult(window, original, used + message_tokens(summary_msg), len(folded))
+
+
+# Global window instance
+conversation_window = ConversationWindow()
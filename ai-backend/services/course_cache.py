@@ -0,0 +1,87 @@
+"""
+Read-through cache for assembled course responses.
+
+Course content almost never changes after it is saved, so
+``GET /api/courses/{course_id}`` keeps the fully assembled, already
+serialized response body together with a strong ETag. Entries expire after
+a TTL, which bounds staleness across workers. Courses without lessons are
+never cached, since the lessons are written after the course row and a read
+in between would otherwise pin a half-saved course.
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from config import settings
+
+
+class CachedCourse:
+    """A serialized course body and its strong validator."""
+
+    __slots__ = ("body", "etag", "expires_at")
+
+    def __init__(self, body: bytes, expires_at: float):
+        self.body = body
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.expires_at = expires_at
+
+
+def serialize_course(course: dict) -> bytes:
+    """Serialize deterministically so identical content yields the same ETag."""
+    return json.dumps(course, sort_keys=True, separators=(",", ":"), default=str).encode()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header against a strong ETag."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class CourseCache:
+    """Per-course LRU of assembled responses."""
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, CachedCourse]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, course_id: str) -> Optional[CachedCourse]:
+        entry = self._entries.get(course_id)
+        if entry is None or entry.expires_at < time.time():
+            if entry is not None:
+                del self._entries[course_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(course_id)
+        self.hits += 1
+        return entry
+
+    def put(self, course_id: str, course: dict) -> CachedCourse:
+        entry = CachedCourse(serialize_course(course), time.time() + self.ttl_seconds)
+        self._entries[course_id] = entry
+        self._entries.move_to_end(course_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Global cache instance
+course_cache = CourseCache(
+    max_entries=settings.course_cache_max_entries,
+    ttl_seconds=settings.course_cache_ttl_seconds,
+)
@@ -1,34 +1,208 @@
-
-import json
+import asyncio
 import logging
-from openrouter_client import generate_response
+from typing import AsyncGenerator
+
+from openrouter_client import groq_client
+from config import settings, get_model_config
+from services.llm_json import parse_llm_json, LLMJSONError
+from services.upstream_governor import UpstreamBusy
 
 logger = logging.getLogger(__name__)
 
-async def generate_course_content(topic: str, difficulty: str = "intermediate") -> dict:
+WORDS_PER_MINUTE = 200
+
+
+def _complete_outline_modules(modules: list) -> list[dict]:
+    """Keep outline modules and lessons that survived parsing with a title."""
+    kept = []
+    for module in modules:
+        if not isinstance(module, dict) or not module.get("title"):
+            continue
+        lessons = [
+            {"title": lesson["title"], "brief": lesson.get("brief") or lesson.get("description") or ""}
+            for lesson in module.get("lessons", [])
+            if isinstance(lesson, dict) and lesson.get("title")
+        ]
+        if lessons:
+            kept.append({"title": module["title"], "lessons": lessons})
+    return kept
+
+
+async def _request(tool: str, prompt: str) -> tuple[str, str, int]:
+    config = get_model_config(tool)
+    response = await groq_client.chat_completion(
+        messages=[
+            {"role": "system", "content": config["system_prompt"]},
+            {"role": "user", "content": prompt}
+        ],
+        model=config["model"],
+        temperature=config["temperature"],
+        max_tokens=config["max_tokens"]
+    )
+    choice = response["choices"][0]
+    return (
+        choice["message"]["content"],
+        choice.get("finish_reason"),
+        response.get("usage", {}).get("total_tokens", 0)
+    )
+
+
+async def _continue_outline(outline: dict, topic: str, difficulty: str) -> list[dict]:
     """
-    Generate a full course structure using AI.
+    Ask only for the modules missing after a truncated outline,
+    rather than regenerating the whole plan.
+    """
+    existing = "\n".join(f"- {m['title']}" for m in outline["modules"])
+    prompt = f"""A {difficulty} level course plan about "{topic}" was cut off part-way.
+Course title: {outline.get("title", topic)}
+Modules already planned:
+{existing}
+
+Plan ONLY the remaining modules needed to complete the course, continuing after the last one above.
+Respond ONLY with valid JSON: {{"modules": [ ... ]}} using the same module/lesson format."""
+
+    text, _, _ = await _request("course_outline", prompt)
+    data = parse_llm_json(text).data
+    modules = data.get("modules", []) if isinstance(data, dict) else data
+    return _complete_outline_modules(modules if isinstance(modules, list) else [])
+
+
+async def generate_outline(topic: str, difficulty: str = "intermediate") -> dict:
     """
-    prompt = f"Create a comprehensive {difficulty} level course about: {topic}"
-    
+    Phase 1: a compact course plan (module and lesson titles with briefs).
+    """
+    prompt = f"Plan a comprehensive {difficulty} level course about: {topic}"
+    response_text = ""
+
     try:
-        response_text = await generate_response(
-            tool="course_generator",
-            user_message=prompt,
-            stream=False
-        )
-        
-        # Parse JSON from response
-        # Llama sometimes adds markdown blocks despite instructions, so we clean it
-        clean_text = response_text.replace("```json", "").replace("```", "").strip()
-        course_data = json.loads(clean_text)
-        
-        return course_data
-        
-    except json.JSONDecodeError as e:
+        response_text, finish_reason, _ = await _request("course_outline", prompt)
+
+        # Llama sometimes adds markdown blocks or gets cut off at max_tokens;
+        # salvage whatever complete modules came back.
+        parsed = parse_llm_json(response_text)
+        outline = parsed.data
+        outline["modules"] = _complete_outline_modules(outline.get("modules", []))
+
+        if parsed.truncated or finish_reason == "length":
+            # The last module may be missing lessons; re-plan from there.
+            partial = outline["modules"].pop() if outline["modules"] else None
+            logger.info(f"Course outline truncated, salvaged {len(outline['modules'])} modules")
+            try:
+                outline["modules"] += await _continue_outline(outline, topic, difficulty)
+            except Exception as e:
+                logger.warning(f"Outline continuation failed, using salvaged modules: {e}")
+                if partial is not None:
+                    outline["modules"].append(partial)
+
+        if not outline["modules"]:
+            raise LLMJSONError("No complete modules in model output")
+
+        outline.setdefault("title", topic)
+        outline.setdefault("description", "")
+        return outline
+
+    except (LLMJSONError, AttributeError) as e:
         logger.error(f"Failed to parse AI response as JSON: {e}")
         logger.debug(f"Raw response: {response_text}")
         raise ValueError("AI failed to generate valid course structure")
+
+
+async def expand_lesson(outline: dict, module: dict, lesson: dict, difficulty: str) -> dict:
+    """
+    Phase 2: write one lesson body from its outline entry.
+    """
+    prompt = f"""Course: {outline["title"]} ({difficulty} level)
+Course description: {outline.get("description", "")}
+Module: {module["title"]}
+Lesson: {lesson["title"]}
+Brief: {lesson["brief"]}
+
+Write this lesson."""
+
+    content, _, _ = await _request("course_lesson", prompt)
+    return _lesson_entry(lesson["title"], content.strip())
+
+
+def _lesson_entry(title: str, content: str) -> dict:
+    minutes = max(1, round(len(content.split()) / WORDS_PER_MINUTE))
+    return {
+        "title": title,
+        "description": content,
+        "type": "text",
+        "duration": f"{minutes} min read"
+    }
+
+
+async def generate_course_events(topic: str, difficulty: str = "intermediate") -> AsyncGenerator[dict, None]:
+    """
+    Run the two-phase pipeline, yielding progress events:
+        {"outline": {...}}                                    plan is ready
+        {"lesson": {...}, "module_index": m, "lesson_index": l}  one lesson written
+        {"course": {...}}                                     assembled course
+    Lessons are expanded concurrently, so total time is roughly the outline
+    plus the slowest lesson rather than the sum of all lessons.
+
+    A lesson that fails to generate falls back to its outline brief, up to
+    ``course_max_lesson_fallbacks`` lessons; past that, or if the upstream
+    is overloaded (``UpstreamBusy``), the whole course fails.
+    """
+    outline = await generate_outline(topic, difficulty)
+    yield {"outline": outline}
+
+    semaphore = asyncio.Semaphore(settings.course_lesson_concurrency)
+    fallbacks = 0
+
+    async def expand(m: int, l: int, module: dict, lesson: dict):
+        nonlocal fallbacks
+        async with semaphore:
+            try:
+                return m, l, await expand_lesson(outline, module, lesson, difficulty)
+            except UpstreamBusy:
+                raise
+            except Exception as e:
+                fallbacks += 1
+                if fallbacks > settings.course_max_lesson_fallbacks:
+                    raise ValueError(f"{fallbacks} lessons failed to generate") from e
+                logger.warning(f"Lesson expansion failed for '{lesson['title']}', using its brief: {e}")
+                return m, l, _lesson_entry(lesson["title"], lesson["brief"])
+
+    tasks = [
+        asyncio.create_task(expand(m, l, module, lesson))
+        for m, module in enumerate(outline["modules"])
+        for l, lesson in enumerate(module["lessons"])
+    ]
+
+    modules = [
+        {"title": module["title"], "lessons": [None] * len(module["lessons"])}
+        for module in outline["modules"]
+    ]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            m, l, lesson = await finished
+            modules[m]["lessons"][l] = lesson
+            yield {"lesson": lesson, "module_index": m, "lesson_index": l}
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    yield {
+        "course": {
+            "title": outline["title"],
+            "description": outline["description"],
+            "modules": modules
+        }
+    }
+
+
+async def generate_course_content(topic: str, difficulty: str = "intermediate") -> dict:
+    """
+    Generate a full course structure using AI.
+    """
+    try:
+        async for event in generate_course_events(topic, difficulty):
+            if "course" in event:
+                return event["course"]
     except Exception as e:
         logger.error(f"Error generating course: {e}")
         raise
+    raise ValueError("AI failed to generate valid course structure")
@@ -0,0 +1,239 @@
+"""
+Non-blocking data-access layer for Supabase.
+
+supabase-py's ``.execute()`` is synchronous; calling it inside an
+``async def`` handler stalls the event loop and every SSE stream on the
+worker with it. All queries here run on a dedicated, bounded thread pool so
+a slow PostgREST round trip only occupies one DB thread, never the loop.
+Routes should use these helpers instead of touching the client directly.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypedDict
+
+from config import settings
+from services.db import get_supabase_client
+from services.metrics import DB_QUERY_DURATION
+from services.tracing import record
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseUnavailable(Exception):
+    """Raised when Supabase is not configured."""
+
+
+class CourseRow(TypedDict, total=False):
+    id: str
+    title: str
+    description: Optional[str]
+    thumbnail_url: Optional[str]
+    instructor_id: Optional[str]
+    category: Optional[str]
+    difficulty: Optional[str]
+    created_at: str
+
+
+class LessonRow(TypedDict, total=False):
+    id: str
+    course_id: str
+    title: str
+    content: Optional[str]
+    video_url: Optional[str]
+    duration: Optional[int]
+    order_index: int
+    quiz_id: Optional[str]
+
+
+class ProgressRow(TypedDict, total=False):
+    id: str
+    user_id: str
+    lesson_id: str
+    is_completed: bool
+    last_watched_position: int
+    completed_at: Optional[str]
+
+
+class QuizRow(TypedDict, total=False):
+    id: str
+    lesson_id: str
+    questions: list[dict]
+    created_at: str
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def is_configured() -> bool:
+    """Whether Supabase credentials are present."""
+    return get_supabase_client() is not None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.db_max_workers,
+            thread_name_prefix="supabase"
+        )
+    return _executor
+
+
+def shutdown_executor():
+    """Release the DB thread pool (called at app shutdown)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+async def run_query(build: Callable[[Any], Any]) -> list[dict]:
+    """
+    Build a PostgREST query against the client and execute it off-loop.
+
+    Args:
+        build: Receives the Supabase client and returns an executable query
+
+    Returns:
+        The response rows (empty list when there are none)
+    """
+    client = get_supabase_client()
+    if client is None:
+        raise DatabaseUnavailable("Supabase is not configured")
+
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        response = await loop.run_in_executor(
+            _get_executor(),
+            lambda: build(client).execute()
+        )
+    except Exception:
+        DB_QUERY_DURATION.observe(time.perf_counter() - started, "error")
+        record("db", time.perf_counter() - started)
+        raise
+    DB_QUERY_DURATION.observe(time.perf_counter() - started, "ok")
+    record("db", time.perf_counter() - started)
+    return response.data or []
+
+
+# ----------------------------------------------------------------
+# Courses
+# ----------------------------------------------------------------
+
+async def insert_course(row: CourseRow) -> CourseRow:
+    rows = await run_query(lambda c: c.table("courses").insert(row))
+    if not rows:
+        raise Exception("Failed to save course")
+    return rows[0]
+
+
+async def fetch_course(course_id: str, columns: str = "*") -> Optional[CourseRow]:
+    rows = await run_query(
+        lambda c: c.table("courses").select(columns).eq("id", course_id).limit(1)
+    )
+    return rows[0] if rows else None
+
+
+async def list_courses(columns: str = "*") -> list[CourseRow]:
+    return await run_query(lambda c: c.table("courses").select(columns))
+
+
+DASHBOARD_COURSE_COLUMNS = "id, title, description, thumbnail_url, created_at, instructor:users(full_name)"
+
+
+async def list_dashboard_courses(
+    user_id: Optional[str],
+    limit: int,
+    after: Optional[tuple[str, str]] = None,
+) -> list[dict]:
+    """
+    One page of dashboard courses with lesson and progress data embedded.
+
+    Keyset-paginated on (created_at, id) so each page costs the same no
+    matter how deep into the catalogue it is. Lessons and the user's
+    progress rows are embedded in the same PostgREST request, so a page is
+    a single round trip. Without a user only lesson counts are embedded.
+    """
+    if user_id:
+        columns = f"{DASHBOARD_COURSE_COLUMNS}, lessons(id, progress(is_completed))"
+    else:
+        columns = f"{DASHBOARD_COURSE_COLUMNS}, lessons(count)"
+
+    def build(c):
+        query = c.table("courses").select(columns)
+        if user_id:
+            query = query.eq("lessons.progress.user_id", user_id)
+        if after is not None:
+            created_at, course_id = after
+            query = query.or_(
+                f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{course_id})'
+            )
+        return query.order("created_at", desc=True).order("id", desc=True).limit(limit)
+
+    return await run_query(build)
+
+
+# ----------------------------------------------------------------
+# Lessons
+# ----------------------------------------------------------------
+
+async def insert_lessons(rows: list[LessonRow]) -> list[LessonRow]:
+    if not rows:
+        return []
+    return await run_query(lambda c: c.table("lessons").insert(rows))
+
+
+async def fetch_lessons(course_id: str, columns: str = "*") -> list[LessonRow]:
+    return await run_query(
+        lambda c: c.table("lessons").select(columns).eq("course_id", course_id).order("order_index")
+    )
+
+
+# ----------------------------------------------------------------
+# Progress
+# ----------------------------------------------------------------
+
+async def fetch_progress(user_id: str, lesson_ids: Optional[list[str]] = None) -> list[ProgressRow]:
+    def build(c):
+        query = c.table("progress").select("lesson_id, is_completed, last_watched_position").eq("user_id", user_id)
+        if lesson_ids is not None:
+            query = query.in_("lesson_id", lesson_ids)
+        return query
+    return await run_query(build)
+
+
+async def upsert_progress(row: ProgressRow) -> ProgressRow:
+    rows = await run_query(
+        lambda c: c.table("progress").upsert(row, on_conflict="user_id,lesson_id")
+    )
+    return rows[0] if rows else row
+
+
+# ----------------------------------------------------------------
+# Quizzes
+# ----------------------------------------------------------------
+
+async def fetch_quiz(lesson_id: str) -> Optional[QuizRow]:
+    rows = await run_query(
+        lambda c: c.table("quizzes").select("*").eq("lesson_id", lesson_id).limit(1)
+    )
+    return rows[0] if rows else None
+
+
+async def insert_quiz(lesson_id: str, questions: list[dict]) -> QuizRow:
+    rows = await run_query(
+        lambda c: c.table("quizzes").insert({"lesson_id": lesson_id, "questions": questions})
+    )
+    return rows[0] if rows else {"lesson_id": lesson_id, "questions": questions}
+
+
+# ----------------------------------------------------------------
+# AI logs
+# ----------------------------------------------------------------
+
+async def insert_ai_logs(rows: list[dict]):
+    if rows:
+        await run_query(lambda c: c.table("ai_logs").insert(rows))
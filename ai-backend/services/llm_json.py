@@ -0,0 +1,215 @@
+"""
+JSON handling for LLM output.
+
+Models asked for "ONLY valid JSON" still wrap it in code fences, prefix it
+with prose, leave trailing commas and get cut off at ``max_tokens``. Rather
+than discarding an expensive generation over one bad byte, ``parse_llm_json``
+cleans those up and, for truncated output, salvages every complete object
+by cutting back to the last complete value and closing the open brackets.
+"""
+import json
+import re
+from dataclasses import dataclass
+from typing import Any
+
+_TRAILING_FENCE_RE = re.compile(r"\s*```\s*$")
+
+
+class LLMJSONError(ValueError):
+    """Raised when no JSON value can be recovered from model output."""
+
+
+@dataclass
+class ParsedJSON:
+    """A recovered JSON value; ``truncated`` means objects were dropped or closed."""
+    data: Any
+    truncated: bool = False
+
+
+def _extract_json_text(text: str) -> str:
+    """
+    Drop any prose or opening code fence before the first JSON container
+    and a closing fence after it. Fences inside the value (Markdown code
+    blocks in string content) are left alone.
+    """
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        raise LLMJSONError("No JSON object or array found in model output")
+    return _TRAILING_FENCE_RE.sub("", text[min(starts):])
+
+
+def _scan(text: str) -> tuple[str, int, str]:
+    """
+    Single pass over ``text`` that removes trailing commas and finds where the
+    top-level value ends.
+
+    Returns the cleaned text, the end of the top-level value (or -1 if it
+    never closed) and, for truncated text, a repaired version that keeps
+    every complete value and closes the containers still open.
+    """
+    out = []
+    stack = []
+    in_string = escape = False
+    # (length of out, open containers) after the last complete value
+    safe_point = None
+    pending_comma = None
+
+    for i, ch in enumerate(text):
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch in " \t\r\n":
+            out.append(ch)
+            continue
+
+        if ch == ",":
+            # Defer commas so one followed by a closer can be dropped.
+            pending_comma = len(out)
+            safe_point = (len(out), "".join(stack))
+            out.append(ch)
+            continue
+
+        if ch in "}]":
+            if pending_comma is not None:
+                out[pending_comma] = ""
+            pending_comma = None
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                return "".join(out), len(out), ""
+            safe_point = (len(out), "".join(stack))
+            continue
+
+        pending_comma = None
+        if ch == '"':
+            in_string = True
+        elif ch == "{":
+            stack.append("}")
+        elif ch == "[":
+            stack.append("]")
+        out.append(ch)
+
+    # Ran out of text with containers still open: cut back and close them.
+    if safe_point is None:
+        return "".join(out), -1, ""
+    cut, open_stack = safe_point
+    repaired = "".join(out[:cut]).rstrip().rstrip(",") + "".join(reversed(open_stack))
+    return "".join(out), -1, repaired
+
+
+def parse_llm_json(text: str) -> ParsedJSON:
+    """
+    Parse JSON from model output, tolerating fences, leading prose,
+    trailing commas and truncation.
+    """
+    candidate = _extract_json_text(text)
+    try:
+        return ParsedJSON(json.loads(candidate))
+    except json.JSONDecodeError:
+        pass
+
+    cleaned, end, repaired = _scan(candidate)
+    if end != -1:
+        try:
+            return ParsedJSON(json.loads(cleaned[:end]))
+        except json.JSONDecodeError as e:
+            raise LLMJSONError(f"Malformed JSON in model output: {e}") from e
+
+    if repaired:
+        try:
+            return ParsedJSON(json.loads(repaired), truncated=True)
+        except json.JSONDecodeError as e:
+            raise LLMJSONError(f"Could not salvage truncated JSON: {e}") from e
+    raise LLMJSONError("Model output ended before any complete JSON value")
+
+
+def salvage_items(text: str, key: str, is_valid=None) -> tuple[list, bool]:
+    """
+    Recover the complete items of the ``key`` array (or a bare top-level
+    array) from model output. Returns (items, truncated).
+    """
+    parsed = parse_llm_json(text)
+    data = parsed.data
+    items = data.get(key, []) if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise LLMJSONError(f"Expected '{key}' to be a list")
+    if is_valid is not None:
+        kept = [item for item in items if isinstance(item, dict) and is_valid(item)]
+        return kept, parsed.truncated or len(kept) != len(items)
+    return items, parsed.truncated
+
+
+class ArrayItemStream:
+    """
+    Incremental extractor for the items of the first JSON array in a stream.
+
+    Feed it text deltas as they arrive; each call returns the raw JSON text of
+    every array element that closed within that delta. Anything before the
+    array (code fences, prose, ``{"questions":``) is skipped, so an item can
+    be parsed and shown to the user as soon as its closing brace arrives
+    rather than after the whole completion.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._array_depth = None
+        self._item_start = None
+        self.finished = False
+
+    def feed(self, delta: str) -> list[str]:
+        if self.finished:
+            return []
+
+        self._text += delta
+        items = []
+        text = self._text
+        i = self._pos
+
+        while i < len(text):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._array_depth is None and ch == "[":
+                    self._array_depth = self._depth + 1
+                elif self._depth == self._array_depth and self._item_start is None:
+                    self._item_start = i
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._array_depth is not None:
+                    if self._depth == self._array_depth and self._item_start is not None:
+                        items.append(text[self._item_start:i + 1])
+                        self._item_start = None
+                    elif self._depth < self._array_depth:
+                        self.finished = True
+                        i += 1
+                        break
+            i += 1
+
+        # Drop consumed text so the buffer only holds the open item.
+        keep_from = self._item_start if self._item_start is not None else i
+        self._text = text[keep_from:]
+        self._pos = i - keep_from
+        if self._item_start is not None:
+            self._item_start = 0
+        return items
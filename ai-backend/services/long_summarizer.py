@@ -0,0 +1,213 @@
+"""
+Map-reduce summarization for long documents.
+
+Content is split into token-bounded chunks on paragraph boundaries, the
+chunks are summarized concurrently (bounded by
+``settings.summarizer_map_concurrency``), and a final reduce pass combines
+the partial summaries in the requested format. Wall-clock time is roughly
+one chunk plus the reduce instead of the whole document in one prompt.
+"""
+import asyncio
+import re
+from typing import AsyncGenerator, Optional
+
+from config import settings, get_model_config
+from services.tokens import estimate_tokens
+from services.single_flight import single_flight
+from services.sse import StreamMeta
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+MAP_PROMPT = """Summarize part {index} of {total} of a longer document.
+Capture every key fact, definition and argument in this part as concise notes.
+Do not add an introduction or conclusion; another step will combine the parts.
+
+---
+{chunk}
+---"""
+
+REDUCE_PROMPT = """The following are summaries of consecutive parts of one document.
+Combine them into a single summary of the whole document, removing repetition
+and keeping the original order of ideas.
+
+---
+{partials}
+---
+
+{instructions}
+
+Create a clear, educational summary that captures all key information."""
+
+
+def _split_oversized(paragraph: str, max_tokens: int) -> list[str]:
+    """Split a paragraph that alone exceeds the budget on sentence boundaries."""
+    pieces, current = [], ""
+    for sentence in _SENTENCE_RE.split(paragraph):
+        candidate = f"{current} {sentence}".strip()
+        if current and estimate_tokens(candidate) > max_tokens:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_into_chunks(content: str, max_tokens: int) -> list[str]:
+    """Pack paragraphs into chunks of at most ~``max_tokens`` tokens."""
+    chunks, current, current_tokens = [], [], 0
+    for paragraph in _PARAGRAPH_RE.split(content):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        for piece in _split_oversized(paragraph, max_tokens):
+            size = estimate_tokens(piece)
+            if current and current_tokens + size > max_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += size
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def is_long_document(content: str) -> bool:
+    return estimate_tokens(content) > settings.summarizer_long_doc_tokens
+
+
+class _Mapper:
+    """Runs the map phase with a concurrency cap and tracks token usage."""
+
+    def __init__(self):
+        self.config = get_model_config("summarizer")
+        self.semaphore = asyncio.Semaphore(settings.summarizer_map_concurrency)
+        self.tokens_used = 0
+
+    async def summarize_chunk(self, index: int, total: int, chunk: str) -> tuple[int, str]:
+        async with self.semaphore:
+            response = await single_flight.chat_completion(
+                messages=[
+                    {"role": "system", "content": self.config["system_prompt"]},
+                    {"role": "user", "content": MAP_PROMPT.format(index=index + 1, total=total, chunk=chunk)}
+                ],
+                model=self.config["model"],
+                temperature=self.config["temperature"],
+                max_tokens=settings.summarizer_map_max_tokens
+            )
+        self.tokens_used += response.get("usage", {}).get("total_tokens", 0)
+        return index, response["choices"][0]["message"]["content"]
+
+    async def map(self, chunks: list[str]) -> AsyncGenerator[tuple[int, str], None]:
+        """Yield (index, partial summary) pairs in completion order."""
+        tasks = [
+            asyncio.create_task(self.summarize_chunk(i, len(chunks), chunk))
+            for i, chunk in enumerate(chunks)
+        ]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def collapse(self, content: str, on_progress=None) -> tuple[str, int]:
+        """
+        Map until the joined partials fit one reduce prompt.
+        Returns the joined partials and the number of top-level chunks.
+        """
+        max_tokens = settings.summarizer_chunk_tokens
+        chunks = split_into_chunks(content, max_tokens)
+        total = len(chunks)
+        while True:
+            partials = [""] * len(chunks)
+            done = 0
+            async for index, partial in self.map(chunks):
+                partials[index] = partial
+                done += 1
+                if on_progress is not None:
+                    await on_progress(done, len(chunks))
+            joined = "\n\n".join(
+                f"[Part {i + 1}]\n{partial}" for i, partial in enumerate(partials)
+            )
+            if len(chunks) == 1 or estimate_tokens(joined) <= max_tokens:
+                return joined, total
+            # Partials are still too long for one prompt: map them again.
+            chunks = split_into_chunks(joined, max_tokens)
+
+    def reduce_messages(self, partials: str, instructions: str) -> list[dict]:
+        return [
+            {"role": "system", "content": self.config["system_prompt"]},
+            {"role": "user", "content": REDUCE_PROMPT.format(partials=partials, instructions=instructions)}
+        ]
+
+
+async def map_reduce_summarize(content: str, instructions: str) -> dict:
+    """Summarize a long document; returns summary, chunk count and token usage."""
+    mapper = _Mapper()
+    partials, chunks = await mapper.collapse(content)
+
+    response = await single_flight.chat_completion(
+        messages=mapper.reduce_messages(partials, instructions),
+        model=mapper.config["model"],
+        temperature=mapper.config["temperature"],
+        max_tokens=mapper.config["max_tokens"]
+    )
+    mapper.tokens_used += response.get("usage", {}).get("total_tokens", 0)
+
+    return {
+        "summary": response["choices"][0]["message"]["content"],
+        "chunks": chunks,
+        "tokens_used": mapper.tokens_used,
+    }
+
+
+async def map_reduce_summarize_stream(
+    content: str,
+    instructions: str,
+    meta: Optional[StreamMeta] = None
+) -> AsyncGenerator[dict, None]:
+    """
+    Streaming variant. Yields ``{"progress": {...}}`` events while chunks
+    complete, then ``{"content": ...}`` deltas from the reduce pass, whose
+    finish reason and usage go to ``meta``.
+    """
+    mapper = _Mapper()
+    progress: asyncio.Queue = asyncio.Queue()
+
+    async def on_progress(done: int, total: int):
+        await progress.put({"progress": {"stage": "map", "completed": done, "total": total}})
+
+    collapse = asyncio.create_task(mapper.collapse(content, on_progress))
+    getter = None
+    try:
+        while not collapse.done() or not progress.empty():
+            getter = asyncio.create_task(progress.get())
+            finished, _ = await asyncio.wait({getter, collapse}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in finished:
+                yield getter.result()
+            else:
+                getter.cancel()
+        partials, chunks = collapse.result()
+    finally:
+        # Also runs when the consumer closes the stream early (client disconnect).
+        for task in (getter, collapse):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+
+    yield {"progress": {"stage": "reduce", "chunks": chunks}}
+
+    async for delta in single_flight.chat_completion_stream(
+        messages=mapper.reduce_messages(partials, instructions),
+        model=mapper.config["model"],
+        temperature=mapper.config["temperature"],
+        max_tokens=mapper.config["max_tokens"],
+        meta=meta
+    ):
+        yield {"content": delta}
@@ -0,0 +1,261 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+A deliberately small registry instead of prometheus_client: recording is a
+dict lookup and a few additions on the event loop (no locks, no label
+objects), and ``GET /api/ai/metrics`` renders everything on scrape. Values
+are per worker process; Prometheus sums them across workers by ``instance``.
+
+Modules record into the metric families defined at the bottom of this file.
+State that already lives elsewhere (governor queue depth, breaker states)
+is copied into gauges by collectors registered with
+``registry.add_collector`` and run just before each scrape.
+"""
+import bisect
+import math
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+# Seconds; spans a cached reply (ms) to a long map-reduce summary (minutes).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TTFT_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+
+# AI tool serving the current request ("tutor", "quiz", "courses", ...), set
+# by MetricsMiddleware so upstream metrics can be split by tool.
+current_tool: ContextVar[str] = ContextVar("metrics_tool", default="other")
+
+
+def tool_for_path(path: str) -> str:
+    """``/api/ai/tutor/chat`` -> ``tutor``, ``/api/courses/generate`` -> ``courses``."""
+    parts = path.split("/", 4)
+    if len(parts) > 3 and parts[2] == "ai":
+        return parts[3] or "other"
+    if len(parts) > 2 and parts[1] == "api":
+        return parts[2] or "other"
+    return "other"
+
+
+class Histogram:
+    """Fixed-bucket histogram (cumulative on export, like Prometheus)."""
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        cumulative, running = {}, 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            running += count
+            cumulative["+Inf" if bound == float("inf") else str(bound)] = running
+        return {"buckets": cumulative, "sum": round(self.sum, 6), "count": self.count}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A named family of samples keyed by a tuple of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, object] = {}
+
+    def _selector(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{label}="{_escape(value)}"' for label, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, value in self._values.items():
+            lines.append(f"{self.name}{self._selector(values)} {_format(value)}")
+        return lines
+
+    def clear(self):
+        self._values.clear()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, *labels, value: float):
+        self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+
+class LabeledHistogram(Metric):
+    """One ``Histogram`` per combination of label values."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels):
+        histogram = self._values.get(labels)
+        if histogram is None:
+            histogram = self._values[labels] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def attach(self, histogram: Histogram, *labels):
+        """Export a histogram that another component already maintains."""
+        self._values[labels] = histogram
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, histogram in self._values.items():
+            running = 0
+            for bound, count in zip(histogram.buckets + (math.inf,), histogram.counts):
+                running += count
+                le = self._selector(values, f'le="{_format(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {running}")
+            selector = self._selector(values)
+            lines.append(f"{self.name}_sum{selector} {_format(histogram.sum)}")
+            lines.append(f"{self.name}_count{selector} {histogram.count}")
+        return lines
+
+
+class Registry:
+    """All metric families of this process, rendered together on scrape."""
+
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._collectors: list[Callable[[], None]] = []
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS
+    ) -> LabeledHistogram:
+        return self._register(LabeledHistogram(name, help, labels, buckets))
+
+    def add_collector(self, collect: Callable[[], None]):
+        """Run ``collect`` before every scrape to refresh derived gauges."""
+        self._collectors.append(collect)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        for collect in self._collectors:
+            collect()
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Global registry
+registry = Registry()
+
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds",
+    "Time from request to the last response byte, by route template",
+    ("method", "route", "status")
+)
+SSE_ACTIVE_STREAMS = registry.gauge(
+    "sse_active_streams",
+    "Server-Sent Event responses currently streaming",
+    ("route",)
+)
+LLM_TTFT = registry.histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from sending a streaming completion to its first content delta",
+    ("tool", "model"),
+    TTFT_BUCKETS
+)
+LLM_GENERATION_DURATION = registry.histogram(
+    "llm_generation_duration_seconds",
+    "Time to a complete upstream completion, including retries and queueing",
+    ("tool", "model", "stream")
+)
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total",
+    "Tokens reported by the upstream, by kind (prompt or completion)",
+    ("tool", "model", "kind")
+)
+LLM_UPSTREAM_ERRORS = registry.counter(
+    "llm_upstream_errors_total",
+    "Failed upstream attempts by HTTP status or error kind",
+    ("model", "error")
+)
+DB_QUERY_DURATION = registry.histogram(
+    "supabase_query_duration_seconds",
+    "Supabase round trip including the wait for a DB thread",
+    ("outcome",)
+)
+UPSTREAM_CONCURRENCY_LIMIT = registry.gauge(
+    "upstream_concurrency_limit",
+    "Current AIMD limit on concurrent upstream requests"
+)
+UPSTREAM_IN_FLIGHT = registry.gauge(
+    "upstream_in_flight_requests",
+    "Upstream requests holding a governor slot"
+)
+UPSTREAM_QUEUE_DEPTH = registry.gauge(
+    "upstream_queue_depth",
+    "Requests waiting for a governor slot"
+)
+UPSTREAM_QUEUE_WAIT = registry.histogram(
+    "upstream_queue_wait_seconds",
+    "Time spent waiting for a governor slot"
+)
+CIRCUIT_OPEN = registry.gauge(
+    "llm_circuit_open",
+    "1 while the model's circuit breaker is open or half-open",
+    ("model",)
+)
+
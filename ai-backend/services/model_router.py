@@ -0,0 +1,229 @@
+"""
+Input-aware model routing across the ``MODEL_TIERS`` of each tool.
+
+``config.MODEL_CONFIGS`` hard-wires one model per tool, so a two-line notes
+request pays 70B latency. ``model_router.route`` picks the cheapest tier
+whose limits fit the request's estimated input and output tokens, steps
+past a tier whose recent p95 latency is over its ``latency_slo`` when a
+faster eligible tier exists, and orders the rest as failovers. Tiers with
+an open circuit breaker go last.
+
+``model_router.chat_completion`` / ``chat_completion_stream`` run the call
+down that list: if a model is erroring (open circuit, 5xx, timeouts,
+throttling) the next tier is tried. Streams only fail over before their
+first chunk. The resulting ``RouteDecision`` records which model served the
+request and why, and is written to ``ai_logs.routing`` so per-tool latency
+and cost savings can be measured.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Optional
+
+import httpx
+
+from config import settings, get_model_config, MODEL_TIERS
+from services.single_flight import single_flight
+from services.sse import StreamMeta
+from services.upstream_governor import UpstreamBusy
+from services.upstream_resilience import GroqAPIError, circuit_breakers, latency_tracker
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean "this model is unhealthy right now", not "bad request".
+FAILOVER_ERRORS = (UpstreamBusy, GroqAPIError, httpx.TransportError, asyncio.TimeoutError)
+
+
+@dataclass
+class RouteDecision:
+    """
+    Which model a request was routed to, and why. ``latency_ms`` is the
+    time to the full response, or to the first chunk for streams.
+    """
+    tool: str
+    model: str
+    reason: str
+    candidates: list[str]
+    input_tokens: int
+    output_tokens: Optional[int]
+    failovers: int = 0
+    latency_ms: Optional[int] = None
+    default_model: str = ""
+    errors: list[str] = field(default_factory=list)
+
+    def as_log(self) -> dict:
+        return {
+            "tool": self.tool,
+            "model": self.model,
+            "default_model": self.default_model,
+            "reason": self.reason,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "failovers": self.failovers,
+            "latency_ms": self.latency_ms,
+        }
+
+
+def _fits(tier: dict, input_tokens: int, output_tokens: Optional[int]) -> bool:
+    if input_tokens > tier.get("max_input_tokens", float("inf")):
+        return False
+    if output_tokens is not None and output_tokens > tier.get("max_output_tokens", float("inf")):
+        return False
+    return True
+
+
+class ModelRouter:
+    """Chooses a model per request and fails over between tiers."""
+
+    def __init__(self):
+        self._routed: dict[str, Counter] = defaultdict(Counter)
+        self._reasons: dict[str, Counter] = defaultdict(Counter)
+        self._failovers: Counter = Counter()
+
+    def route(
+        self,
+        tool: str,
+        input_tokens: int,
+        output_tokens: Optional[int] = None
+    ) -> RouteDecision:
+        """
+        Pick a model for ``tool`` given the estimated prompt size and, if
+        known, the expected reply size in tokens.
+        """
+        default_model = get_model_config(tool)["model"]
+        tiers = MODEL_TIERS.get(tool)
+        if not settings.model_routing_enabled or not tiers:
+            return RouteDecision(
+                tool, default_model, "fixed", [default_model],
+                input_tokens, output_tokens, default_model=default_model
+            )
+
+        eligible = [t for t in tiers if _fits(t, input_tokens, output_tokens)] or [tiers[-1]]
+        chosen, reason = eligible[0], "size"
+
+        # Observed latency: skip a tier running over its SLO if a faster
+        # eligible tier is available.
+        slo = chosen.get("latency_slo")
+        p95 = latency_tracker.percentile(chosen["model"], 0.95)
+        if slo and p95 and p95 > slo:
+            for tier in eligible[1:]:
+                other = latency_tracker.percentile(tier["model"], 0.95)
+                if other is not None and other < p95:
+                    chosen, reason = tier, "latency"
+                    break
+
+        order = [chosen] + [t for t in eligible if t is not chosen]
+        order += [t for t in tiers if t not in order]
+        models = [t["model"] for t in order]
+
+        # Health: models whose circuit is open go to the back of the line.
+        healthy = [m for m in models if circuit_breakers.get(m).state != "open"]
+        if healthy and healthy[0] != models[0]:
+            reason = "circuit_open"
+        models = healthy + [m for m in models if m not in healthy]
+
+        return RouteDecision(
+            tool, models[0], reason, models,
+            input_tokens, output_tokens, default_model=default_model
+        )
+
+    def _failed(self, decision: RouteDecision, model: str, error: Exception):
+        decision.errors.append(f"{model}: {error}")
+        logger.warning(f"Routing {decision.tool}: {model} failed ({error}), failing over")
+
+    def _record(self, decision: RouteDecision, model: str, started: float):
+        if model != decision.model:
+            decision.failovers = decision.candidates.index(model)
+            decision.reason = "failover"
+            self._failovers[decision.tool] += 1
+        decision.model = model
+        decision.latency_ms = int((time.perf_counter() - started) * 1000)
+        self._routed[decision.tool][model] += 1
+        self._reasons[decision.tool][decision.reason] += 1
+        logger.info(
+            f"Routed {decision.tool} to {model} ({decision.reason}, "
+            f"~{decision.input_tokens} input tokens, {decision.latency_ms}ms)"
+        )
+
+    async def chat_completion(
+        self,
+        decision: RouteDecision,
+        messages: list[dict],
+        temperature: float,
+        max_tokens: int,
+        client=None
+    ) -> dict:
+        """Non-streaming completion on the routed model, failing over down the tiers."""
+        client = client or single_flight
+        started = time.perf_counter()
+        error = None
+        for model in decision.candidates:
+            try:
+                response = await client.chat_completion(
+                    messages=messages,
+                    model=model,
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                )
+            except FAILOVER_ERRORS as e:
+                if isinstance(e, GroqAPIError) and not e.retryable:
+                    raise
+                self._failed(decision, model, e)
+                error = e
+                continue
+            self._record(decision, model, started)
+            return response
+        raise error
+
+    async def chat_completion_stream(
+        self,
+        decision: RouteDecision,
+        messages: list[dict],
+        temperature: float,
+        max_tokens: int,
+        client=None,
+        meta: Optional[StreamMeta] = None
+    ) -> AsyncGenerator[str, None]:
+        """Streaming completion; fails over only before the first chunk."""
+        client = client or single_flight
+        started = time.perf_counter()
+        error = None
+        for model in decision.candidates:
+            stream = client.chat_completion_stream(
+                messages=messages,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                meta=meta
+            )
+            try:
+                first = await anext(stream)
+            except StopAsyncIteration:
+                self._record(decision, model, started)
+                return
+            except FAILOVER_ERRORS as e:
+                if isinstance(e, GroqAPIError) and not e.retryable:
+                    raise
+                self._failed(decision, model, e)
+                error = e
+                continue
+            self._record(decision, model, started)
+            yield first
+            async for chunk in stream:
+                yield chunk
+            return
+        raise error
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.model_routing_enabled,
+            "routed": {tool: dict(models) for tool, models in self._routed.items()},
+            "reasons": {tool: dict(reasons) for tool, reasons in self._reasons.items()},
+            "failovers": dict(self._failovers),
+        }
+
+
+# Global router instance
+model_router = ModelRouter()
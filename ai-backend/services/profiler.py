@@ -0,0 +1,202 @@
+"""
+Opt-in sampling profiler for individual requests.
+
+A fraction of requests (``sample_rate``) is profiled: while any of them is
+in flight, a CPU-time interval timer (``setitimer(ITIMER_PROF)``) interrupts
+the event loop thread every ``interval`` of CPU, and the SIGPROF handler
+counts the interrupted stack against the request whose task is running.
+Tasks a profiled request starts (stream producers, hedged attempts) are
+attributed to it through a task factory. Samples therefore show where the
+event loop spends CPU on the request (serialization, parsing, framing),
+not time spent awaiting the upstream. The loop must run in the main thread,
+as it does under uvicorn; elsewhere profiling is skipped with a warning.
+
+Each profiled request writes ``<time>-<pid>-<seq>-<route>.folded`` to the profile
+directory: one ``frame;frame;frame count`` line per distinct stack, the
+collapsed format read by flamegraph.pl, speedscope and inferno.
+
+The rate is set at startup from ``PROFILE_SAMPLE_RATE`` and changed at
+runtime through ``PUT /api/ai/admin/profiling``; the new rate is written to
+the profile directory so every worker picks it up within a second.
+"""
+import asyncio
+import logging
+import os
+import random
+import re
+import signal
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+from config import settings
+from services.tracing import RequestTrace, current_trace
+
+logger = logging.getLogger(__name__)
+
+RATE_FILE = "sample_rate"
+_BACKEND_DIR = str(Path(__file__).resolve().parent.parent) + os.sep
+_UNSAFE = re.compile(r"[^A-Za-z0-9]+")
+
+
+def _frame_name(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(_BACKEND_DIR):
+        filename = filename[len(_BACKEND_DIR):]
+    else:
+        filename = filename.rsplit("site-packages" + os.sep, 1)[-1]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _fold(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+class SamplingProfiler:
+    """Samples the event loop's stack on behalf of selected requests."""
+
+    def __init__(self, sample_rate: float, interval: float, directory: str, max_files: int):
+        self.default_rate = sample_rate
+        self.interval = interval
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self._rate = sample_rate
+        self._next_check = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._owners: dict[asyncio.Task, RequestTrace] = {}
+        self._active = 0
+        self._profiled = 0
+        self._written = 0
+
+    @property
+    def sample_rate(self) -> float:
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + 1.0
+            try:
+                self._rate = float((self.directory / RATE_FILE).read_text())
+            except (OSError, ValueError):
+                self._rate = self.default_rate
+        return self._rate
+
+    def set_sample_rate(self, rate: float):
+        """Change the rate for every worker sharing the profile directory."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self.directory / f".{RATE_FILE}.{os.getpid()}"
+        tmp.write_text(str(rate))
+        os.replace(tmp, self.directory / RATE_FILE)
+        self._rate = rate
+        self._next_check = time.monotonic() + 1.0
+
+    def should_sample(self) -> bool:
+        rate = self.sample_rate
+        return rate > 0 and random.random() < rate
+
+    def _task_factory(self, loop, coro, **kwargs):
+        task = asyncio.Task(coro, loop=loop, **kwargs)
+        trace = current_trace.get()
+        if trace is not None and trace.profile is not None:
+            self._owners[task] = trace
+        return task
+
+    def _install(self) -> bool:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return True
+        if not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+            logger.warning("Request profiling needs the event loop in the main thread on a POSIX system")
+            return False
+        self._loop = loop
+        signal.signal(signal.SIGPROF, self._sample)
+        if loop.get_task_factory() is None:
+            loop.set_task_factory(self._task_factory)
+        else:
+            logger.warning("Event loop already has a task factory; child tasks will not be profiled")
+        return True
+
+    def _sample(self, signum, frame):
+        # Signal handlers run on the main thread, which is the loop's thread.
+        task = asyncio.current_task(self._loop)
+        trace = self._owners.get(task) if task is not None else None
+        if trace is not None and trace.profile is not None and frame is not None:
+            trace.profile[_fold(frame)] += 1
+
+    def begin(self, trace: RequestTrace):
+        """Start profiling the current task on behalf of ``trace``."""
+        if not self._install():
+            return
+        trace.profile = Counter()
+        self._owners[asyncio.current_task()] = trace
+        self._profiled += 1
+        self._active += 1
+        if self._active == 1:
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def end(self, trace: RequestTrace, label: str) -> Optional[Path]:
+        """Stop profiling ``trace`` and write its samples, if any."""
+        if trace.profile is None:
+            return None
+        self._active -= 1
+        if self._active == 0:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+        for task in [task for task, owner in self._owners.items() if owner is trace]:
+            del self._owners[task]
+        samples, trace.profile = trace.profile, None
+        if not samples:
+            return None
+        try:
+            return self._write(samples, label)
+        except OSError as e:
+            logger.warning(f"Could not write profile: {e}")
+            return None
+
+    def _write(self, samples: Counter, label: str) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        slug = _UNSAFE.sub("_", label).strip("_")[:80]
+        path = self.directory / f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._written}-{slug}.folded"
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in samples.most_common()))
+        self._written += 1
+        logger.info(f"Profile of {label} written to {path} ({sum(samples.values())} samples)")
+        for old in self.list_profiles()[self.max_files:]:
+            (self.directory / old).unlink(missing_ok=True)
+        return path
+
+    def list_profiles(self) -> list[str]:
+        """Profile file names, newest first."""
+        try:
+            paths = [p for p in self.directory.iterdir() if p.suffix == ".folded"]
+        except OSError:
+            return []
+        paths.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+        return [p.name for p in paths]
+
+    def read_profile(self, name: str) -> Optional[str]:
+        if name not in self.list_profiles():
+            return None
+        return (self.directory / name).read_text()
+
+    def stats(self) -> dict:
+        return {
+            "sample_rate": self.sample_rate,
+            "interval_ms": self.interval * 1000,
+            "directory": str(self.directory),
+            "active": self._active,
+            "profiled_requests": self._profiled,
+            "profiles_written": self._written,
+        }
+
+
+# Global profiler instance
+profiler = SamplingProfiler(
+    sample_rate=settings.profile_sample_rate,
+    interval=settings.profile_interval_ms / 1000,
+    directory=settings.profile_dir,
+    max_files=settings.profile_max_files,
+)
@@ -0,0 +1,265 @@
+"""
+Quiz generation with sharding and cross-shard deduplication.
+
+A large quiz is one long completion whose latency grows with the number of
+questions. Instead, counts above ``settings.quiz_shard_size`` are split into
+shards that run concurrently, each focused on its own section of the
+content. The merged result is de-duplicated with a cheap normalized-text
+similarity check and topped up if duplicates left it short, so the caller
+always gets exactly ``count`` questions in roughly the time of one shard.
+"""
+import asyncio
+import logging
+import re
+from typing import Optional
+
+from config import settings, get_model_config
+from services.llm_json import salvage_items
+from services.model_router import model_router, RouteDecision
+from services.tokens import message_tokens
+
+logger = logging.getLogger(__name__)
+
+DIFFICULTY_GUIDE = {
+    "easy": "straightforward questions testing basic recall and understanding",
+    "medium": "questions requiring application and analysis of concepts",
+    "hard": "challenging questions requiring synthesis and evaluation"
+}
+
+# Typical reply size of one question with its options and explanation
+QUESTION_TOKENS = 120
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by does do for from how in is it of on or the this "
+    "to what when where which who why with".split()
+)
+
+
+def build_quiz_messages(
+    content: str,
+    count: int,
+    difficulty: str,
+    topic: Optional[str] = None,
+    avoid: Optional[list[str]] = None,
+    shard: Optional[tuple[int, int]] = None
+) -> list[dict]:
+    """
+    Build the quiz prompt.
+    ``avoid`` lists question stems not to repeat; ``shard`` is (index, total)
+    when this prompt is one of several concurrent batches.
+    """
+    config = get_model_config("quiz")
+
+    avoid_section = ""
+    if avoid:
+        stems = "\n".join(f"- {q}" for q in avoid)
+        avoid_section = f"\nDo NOT repeat or rephrase any of these existing questions:\n{stems}\n"
+    if shard and shard[1] > 1:
+        avoid_section += (
+            f"\nThis is question batch {shard[0] + 1} of {shard[1]} generated in parallel. "
+            f"Concentrate on part {shard[0] + 1} of {shard[1]} of the material so batches do not overlap.\n"
+        )
+
+    prompt = f"""Generate exactly {count} {difficulty} difficulty quiz questions based on this content:
+
+---
+{content}
+---
+
+{f"Focus specifically on: {topic}" if topic else ""}
+{avoid_section}
+Difficulty guideline: {DIFFICULTY_GUIDE.get(difficulty, DIFFICULTY_GUIDE["medium"])}
+
+IMPORTANT: Respond ONLY with valid JSON in this exact format:
+{{
+  "questions": [
+    {{
+      "question": "Question text here?",
+      "options": ["Option A", "Option B", "Option C", "Option D"],
+      "correct_answer": 0,
+      "explanation": "Brief explanation of why this is correct"
+    }}
+  ]
+}}
+
+Make sure:
+- Each question has exactly 4 options
+- correct_answer is the index (0-3) of the correct option
+- Questions are diverse and test different aspects of the content
+- Explanations are educational and helpful"""
+
+    return [
+        {"role": "system", "content": config["system_prompt"]},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def route_quiz(content: str, count: int, difficulty: str, topic: Optional[str] = None) -> RouteDecision:
+    """Route on the prompt size and the largest shard's expected reply."""
+    messages = build_quiz_messages(content, count, difficulty, topic)
+    return model_router.route(
+        "quiz",
+        sum(message_tokens(m) for m in messages),
+        max(plan_shards(count)) * QUESTION_TOKENS
+    )
+
+
+def is_valid_question(q: dict) -> bool:
+    options = q.get("options")
+    answer = q.get("correct_answer")
+    return (
+        isinstance(q.get("question"), str)
+        and isinstance(options, list)
+        and len(options) >= 2
+        and all(isinstance(option, str) for option in options)
+        and len({option.strip().lower() for option in options}) == len(options)
+        and isinstance(answer, int)
+        and not isinstance(answer, bool)
+        and 0 <= answer < len(options)
+        and isinstance(q.get("explanation"), str)
+    )
+
+
+# ----------------------------------------------------------------
+# Deduplication
+# ----------------------------------------------------------------
+
+def _signature(question: str) -> frozenset:
+    words = _WORD_RE.findall(question.lower())
+    return frozenset(w for w in words if w not in _STOPWORDS)
+
+
+def _similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 1.0 if a == b else 0.0
+    return len(a & b) / len(a | b)
+
+
+def dedupe_questions(questions: list[dict], threshold: float) -> list[dict]:
+    """Drop questions whose normalized wording is near-identical to an earlier one."""
+    kept, signatures = [], []
+    for q in questions:
+        sig = _signature(q["question"])
+        if any(_similarity(sig, seen) >= threshold for seen in signatures):
+            continue
+        kept.append(q)
+        signatures.append(sig)
+    return kept
+
+
+# ----------------------------------------------------------------
+# Sharding
+# ----------------------------------------------------------------
+
+def plan_shards(count: int) -> list[int]:
+    """Split ``count`` into near-equal shard sizes."""
+    shards = min(-(-count // settings.quiz_shard_size), settings.quiz_max_shards)
+    shards = max(shards, 1)
+    base, extra = divmod(count, shards)
+    return [base + (1 if i < extra else 0) for i in range(shards)]
+
+
+def split_sections(content: str, parts: int) -> list[str]:
+    """
+    Split content into ``parts`` contiguous sections on paragraph boundaries.
+    Short content that cannot be split is shared by every shard.
+    """
+    paragraphs = [p for p in re.split(r"\n\s*\n", content) if p.strip()]
+    if parts <= 1 or len(paragraphs) < parts:
+        return [content] * parts
+
+    # Assign each paragraph to a section by where its midpoint falls.
+    total = sum(len(p) for p in paragraphs)
+    sections = [[] for _ in range(parts)]
+    offset = 0
+    for p in paragraphs:
+        midpoint = offset + len(p) / 2
+        sections[min(int(midpoint / total * parts), parts - 1)].append(p)
+        offset += len(p)
+    return ["\n\n".join(s) if s else content for s in sections]
+
+
+async def _generate(
+    content: str,
+    count: int,
+    difficulty: str,
+    topic: Optional[str],
+    route: RouteDecision,
+    avoid: Optional[list[str]] = None,
+    shard: Optional[tuple[int, int]] = None
+) -> tuple[list[dict], int]:
+    config = get_model_config("quiz")
+    response = await model_router.chat_completion(
+        route,
+        messages=build_quiz_messages(content, count, difficulty, topic, avoid, shard),
+        temperature=config["temperature"],
+        max_tokens=config["max_tokens"]
+    )
+    text = response["choices"][0]["message"]["content"]
+    # Truncated or partly malformed output still yields its complete
+    # questions; the top-up pass re-requests only what is missing.
+    questions, _ = salvage_items(text, "questions", is_valid_question)
+    return questions, response.get("usage", {}).get("total_tokens", 0)
+
+
+async def generate_quiz_questions(
+    content: str,
+    count: int,
+    difficulty: str,
+    topic: Optional[str] = None,
+    route: Optional[RouteDecision] = None
+) -> tuple[list[dict], int]:
+    """
+    Generate exactly ``count`` distinct questions (fewer only if top-up
+    rounds run out). Returns the questions and total tokens used.
+    ``route`` is the model routing decision; one is made if not given.
+    """
+    sizes = plan_shards(count)
+    sections = split_sections(content, len(sizes))
+    if route is None:
+        route = route_quiz(content, count, difficulty, topic)
+
+    results = await asyncio.gather(
+        *[
+            _generate(section, size, difficulty, topic, route, shard=(i, len(sizes)))
+            for i, (section, size) in enumerate(zip(sections, sizes))
+        ],
+        return_exceptions=True
+    )
+
+    questions, tokens = [], 0
+    errors = []
+    for result in results:
+        if isinstance(result, Exception):
+            errors.append(result)
+            continue
+        questions.extend(result[0])
+        tokens += result[1]
+    if errors and not questions:
+        raise errors[0]
+    if errors:
+        logger.warning(f"{len(errors)} of {len(sizes)} quiz shards failed: {errors[0]}")
+
+    threshold = settings.quiz_similarity_threshold
+    questions = dedupe_questions(questions, threshold)
+
+    for _ in range(settings.quiz_topup_rounds):
+        shortfall = count - len(questions)
+        if shortfall <= 0:
+            break
+        logger.info(f"Topping up quiz with {shortfall} questions")
+        try:
+            extra, used = await _generate(
+                content, shortfall, difficulty, topic, route,
+                avoid=[q["question"] for q in questions]
+            )
+        except Exception as e:
+            if not questions:
+                raise
+            logger.warning(f"Quiz top-up failed, returning {len(questions)} questions: {e}")
+            break
+        tokens += used
+        questions = dedupe_questions(questions + extra, threshold)
+
+    return questions[:count], tokens
@@ -0,0 +1,282 @@
+"""
+Content-addressed cache for deterministic AI tool responses.
+
+Responses for the summarizer, notes and quiz tools are keyed on a hash of
+the normalized input content plus every parameter that changes the output
+(tool, model, temperature, max_tokens, system prompt and per-request
+options). Entries live in an in-memory LRU bounded by count, bytes and TTL,
+with an optional SQLite tier that survives restarts and is shared by every
+uvicorn worker on the host.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncGenerator, Optional
+
+from config import settings, get_model_config
+from services.sse import sse_event
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_content(content: str) -> str:
+    """Collapse whitespace so trivially different copies share a key."""
+    return _WHITESPACE_RE.sub(" ", content).strip()
+
+
+def make_cache_key(tool: str, content: str, **params) -> str:
+    """Build a content-addressed key for a tool invocation."""
+    config = get_model_config(tool)
+    material = {
+        "tool": tool,
+        "model": params.pop("model", config["model"]),
+        "temperature": config["temperature"],
+        "max_tokens": config["max_tokens"],
+        "system_prompt": hashlib.sha256(config["system_prompt"].encode()).hexdigest(),
+        "params": params,
+        "content": hashlib.sha256(normalize_content(content).encode()).hexdigest(),
+    }
+    encoded = json.dumps(material, sort_keys=True, default=str).encode()
+    return f"{tool}:{hashlib.sha256(encoded).hexdigest()}"
+
+
+class _SQLiteTier:
+    """On-disk cache tier shared across worker processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS response_cache_expires"
+            " ON response_cache (expires_at)"
+        )
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[tuple[str, float]]:
+        """The stored value and its expiry time, unless missing or expired."""
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] < time.time():
+            self.delete(key)
+            return None
+        return row[0], row[1]
+
+    def set(self, key: str, value: str, expires_at: float):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, expires_at),
+        )
+
+    def delete(self, key: str):
+        self._connect().execute("DELETE FROM response_cache WHERE key = ?", (key,))
+
+    def prune(self, max_rows: int) -> int:
+        """Delete expired rows, then the oldest rows beyond ``max_rows``."""
+        conn = self._connect()
+        removed = conn.execute(
+            "DELETE FROM response_cache WHERE expires_at < ?", (time.time(),)
+        ).rowcount
+        excess = conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0] - max_rows
+        if excess > 0:
+            # Every row gets the same TTL, so the earliest expiry is the oldest write.
+            removed += conn.execute(
+                "DELETE FROM response_cache WHERE key IN"
+                " (SELECT key FROM response_cache ORDER BY expires_at LIMIT ?)",
+                (excess,)
+            ).rowcount
+        return removed
+
+
+class ResponseCache:
+    """Two-tier (memory LRU + optional SQLite) response cache."""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 24 * 3600,
+        sqlite_path: str = "",
+        disk_max_entries: int = 100000,
+        prune_every: int = 256,
+        enabled: bool = True,
+    ):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+        self._bytes = 0
+        self._disk: Optional[_SQLiteTier] = None
+        self._sqlite_path = sqlite_path
+        self.disk_max_entries = disk_max_entries
+        self.prune_every = prune_every
+        self._disk_writes = 0
+        self.disk_pruned = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def disk(self) -> Optional[_SQLiteTier]:
+        if self._disk is None and self._sqlite_path:
+            try:
+                self._disk = _SQLiteTier(self._sqlite_path)
+            except sqlite3.Error as e:
+                logger.error(f"Disabling on-disk response cache: {e}")
+                self._sqlite_path = ""
+        return self._disk
+
+    # ---------------- memory tier ----------------
+
+    def _remember(self, key: str, encoded: str, expires_at: float):
+        if key in self._entries:
+            self._bytes -= len(self._entries.pop(key)[0])
+        size = len(encoded)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (encoded, expires_at)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def _lookup(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        encoded, expires_at = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            self._bytes -= len(encoded)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return encoded
+
+    # ---------------- public API ----------------
+
+    async def get(self, key: str) -> Optional[dict]:
+        """Return the cached payload for ``key`` or None."""
+        if not self.enabled:
+            return None
+
+        encoded = self._lookup(key)
+        if encoded is not None:
+            self.hits += 1
+            return json.loads(encoded)
+
+        disk = self.disk
+        if disk is not None:
+            try:
+                row = await asyncio.to_thread(disk.get, key)
+            except sqlite3.Error as e:
+                logger.warning(f"Response cache disk read failed: {e}")
+                row = None
+            if row is not None:
+                encoded, expires_at = row
+                self.disk_hits += 1
+                self._remember(key, encoded, expires_at)
+                return json.loads(encoded)
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: dict):
+        """Store a payload under ``key`` in both tiers."""
+        if not self.enabled:
+            return
+
+        encoded = json.dumps(value)
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, encoded, expires_at)
+
+        disk = self.disk
+        if disk is not None:
+            try:
+                await asyncio.to_thread(disk.set, key, encoded, expires_at)
+            except sqlite3.Error as e:
+                logger.warning(f"Response cache disk write failed: {e}")
+            # Expired rows are otherwise only dropped when read again.
+            if self._disk_writes % self.prune_every == 0:
+                await self._prune_disk(disk)
+            self._disk_writes += 1
+
+    async def _prune_disk(self, disk: _SQLiteTier):
+        try:
+            self.disk_pruned += await asyncio.to_thread(disk.prune, self.disk_max_entries)
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache disk prune failed: {e}")
+
+    def clear(self):
+        """Drop the in-memory tier."""
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        """Hit/miss/eviction counters and current occupancy."""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "disk_tier": bool(self._sqlite_path),
+            "disk_max_entries": self.disk_max_entries,
+            "disk_pruned": self.disk_pruned,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+async def replay_as_sse(text: str, chunk_size: int = 64) -> AsyncGenerator[str, None]:
+    """Replay a cached completion as the same SSE frames a live stream sends."""
+    for i in range(0, len(text), chunk_size):
+        yield sse_event({"content": text[i:i + chunk_size]})
+    yield sse_event({"done": True, "cached": True})
+
+
+# Global cache instance
+response_cache = ResponseCache(
+    max_entries=settings.response_cache_max_entries,
+    max_bytes=settings.response_cache_max_bytes,
+    ttl_seconds=settings.response_cache_ttl_seconds,
+    sqlite_path=settings.response_cache_sqlite_path,
+    disk_max_entries=settings.response_cache_disk_max_entries,
+    enabled=settings.response_cache_enabled,
+)
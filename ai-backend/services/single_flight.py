@@ -0,0 +1,191 @@
+"""
+Single-flight coalescing of identical in-flight AI generations.
+
+When many students open the same lesson at once, identical summarize/notes/
+quiz requests arrive within seconds of each other. Requests with the same
+fingerprint (model, messages, temperature, max_tokens) share one upstream
+call through ``groq_client``: non-streaming callers await the same task,
+streaming callers fan out from one token stream and first receive the chunks
+already produced.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from typing import AsyncGenerator, Callable, Optional
+
+from openrouter_client import groq_client
+from services.sse import StreamMeta
+
+logger = logging.getLogger(__name__)
+
+
+def request_fingerprint(
+    messages: list[dict],
+    model: str,
+    temperature: float,
+    max_tokens: int,
+    stream: bool,
+) -> str:
+    """Stable hash of everything that determines an upstream completion."""
+    encoded = json.dumps(
+        {
+            "messages": messages,
+            "model": model,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": stream,
+        },
+        sort_keys=True,
+    ).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class _StreamBroadcast:
+    """One upstream token stream replayed to any number of subscribers."""
+
+    def __init__(
+        self,
+        source: AsyncGenerator[str, None],
+        meta: StreamMeta,
+        on_close: Optional[Callable[[], None]] = None,
+    ):
+        self.chunks: list[str] = []
+        self.meta = meta
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._on_close = on_close
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(self._pump(source))
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def _close(self):
+        """Stop new subscribers from joining (runs ``on_close`` once)."""
+        on_close, self._on_close = self._on_close, None
+        if on_close is not None:
+            on_close()
+
+    async def _pump(self, source: AsyncGenerator[str, None]):
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._notify()
+        except asyncio.CancelledError:
+            # Subscribers get an ordinary error, not a cancellation of their own task.
+            self.error = RuntimeError("upstream stream cancelled")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self._close()
+            self.done = True
+            self._notify()
+
+    async def subscribe(self, meta: Optional[StreamMeta] = None) -> AsyncGenerator[str, None]:
+        self.subscribers += 1
+        index = 0
+        try:
+            while True:
+                if index < len(self.chunks):
+                    chunk = self.chunks[index]
+                    index += 1
+                    yield chunk
+                    continue
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    if meta is not None:
+                        meta.finish_reason = self.meta.finish_reason
+                        meta.usage = self.meta.usage
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            # Nobody is listening any more: stop paying for tokens.
+            if self.subscribers == 0 and not self.done:
+                self._close()
+                self._task.cancel()
+
+
+class SingleFlight:
+    """Coalesces concurrent identical requests onto one upstream call."""
+
+    def __init__(self, client=groq_client):
+        self.client = client
+        self._calls: dict[str, asyncio.Task] = {}
+        self._streams: dict[str, _StreamBroadcast] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def chat_completion(
+        self,
+        messages: list[dict],
+        model: str,
+        temperature: float,
+        max_tokens: int,
+    ) -> dict:
+        """Non-streaming completion shared by identical concurrent callers."""
+        key = request_fingerprint(messages, model, temperature, max_tokens, False)
+
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(self.client.chat_completion(
+                messages=messages,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens
+            ))
+            self._calls[key] = task
+            task.add_done_callback(lambda _t, k=key: self._calls.pop(k, None))
+        else:
+            self.coalesced += 1
+            logger.debug(f"Coalesced completion onto in-flight call {key[:12]}")
+
+        # Shield so one caller disconnecting does not cancel the shared call.
+        return await asyncio.shield(task)
+
+    def chat_completion_stream(
+        self,
+        messages: list[dict],
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        meta: Optional[StreamMeta] = None,
+    ) -> AsyncGenerator[str, None]:
+        """Streaming completion fanned out to identical concurrent callers."""
+        key = request_fingerprint(messages, model, temperature, max_tokens, True)
+
+        broadcast = self._streams.get(key)
+        if broadcast is None or broadcast.done:
+            self.leaders += 1
+            upstream_meta = StreamMeta()
+            broadcast = _StreamBroadcast(self.client.chat_completion_stream(
+                messages=messages,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                meta=upstream_meta
+            ), upstream_meta, on_close=lambda k=key: self._streams.pop(k, None))
+            self._streams[key] = broadcast
+        else:
+            self.coalesced += 1
+            logger.debug(f"Joined in-flight stream {key[:12]} at chunk {len(broadcast.chunks)}")
+
+        return broadcast.subscribe(meta)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight_calls": len(self._calls),
+            "in_flight_streams": len(self._streams),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
+
+# Global single-flight instance
+single_flight = SingleFlight()
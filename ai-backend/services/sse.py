@@ -0,0 +1,261 @@
+"""
+Server-Sent Event framing for the streaming AI endpoints.
+
+Groq streams a delta every token or two. Framing each one separately costs a
+JSON encode, a frame and a socket write per token, and accumulating the reply
+with ``text += chunk`` copies it over and over. ``TextStream`` keeps the
+deltas in a list and coalesces them into ``{"content": ...}`` frames once
+``max_chars`` are pending or the oldest pending delta has waited
+``max_delay_ms`` (per endpoint, see ``config.SSE_COALESCING``). The timer
+also runs while the upstream is silent, so a stall never holds text back
+longer than the window.
+
+The other direction, Groq's own SSE stream, is read by ``SSEParser``: it
+splits raw bytes into ``data:`` lines, takes the text of content-only
+deltas straight out of the bytes, and fully decodes only the chunks that
+need it (role, ``finish_reason``, ``usage``, escapes), reporting the finish
+reason and usage on a ``StreamMeta`` instead of dropping them.
+
+JSON is encoded and decoded with orjson when it is installed, else the stdlib.
+"""
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from typing import AsyncGenerator, AsyncIterable, Optional, Union
+
+from config import settings, SSE_COALESCING
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+
+    def dumps(payload) -> str:
+        return orjson.dumps(payload).decode()
+
+    loads = orjson.loads
+except ImportError:
+    orjson = None
+
+    def dumps(payload) -> str:
+        return json.dumps(payload, separators=(",", ":"))
+
+    loads = json.loads
+
+_DATA = b"data:"
+_DONE = b"[DONE]"
+_CONTENT = b'"delta":{"content":"'
+_NOT_FINISHED = b'"finish_reason":null'
+_USAGE = b'"usage"'
+
+
+def sse_event(payload: dict) -> str:
+    """Encode one SSE ``data:`` frame."""
+    return f"data: {dumps(payload)}\n\n"
+
+
+class TextStream:
+    """
+    Frames a stream of text deltas for one endpoint and keeps the full text.
+
+    ``frames(source)`` accepts ``str`` deltas (or ``{"content": ...}``
+    events), which are coalesced, and other ``dict`` events such as progress
+    updates, which flush any pending text and are sent unchanged. ``text``
+    is the complete reply so far.
+
+    The source is read by its own task so the window can expire while the
+    upstream is silent; per delta it only appends to a list, and the
+    response side wakes once per frame.
+    """
+
+    def __init__(self, endpoint: str):
+        config = SSE_COALESCING.get(endpoint, SSE_COALESCING["default"])
+        self.coalesce = settings.sse_coalesce_enabled
+        self.max_chars = config["max_chars"]
+        self.max_delay = config["max_delay_ms"] / 1000
+        self.parts: list[str] = []
+        self.frames_sent = 0
+
+        self._items: list = []  # received, not yet framed
+        self._pending_chars = 0
+        self._ready = False
+        self._done = False
+        self._error: Optional[Exception] = None
+        self._wakeup: Optional[asyncio.Future] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def _wake(self):
+        self._ready = True
+        if self._wakeup is not None and not self._wakeup.done():
+            self._wakeup.set_result(None)
+
+    async def _produce(self, source: AsyncIterable[Union[str, dict]]):
+        loop = asyncio.get_running_loop()
+        try:
+            async for item in source:
+                if isinstance(item, dict) and item.keys() == {"content"}:
+                    item = item["content"]
+                if isinstance(item, dict):
+                    if "content" in item:
+                        self.parts.append(item["content"])
+                    self._items.append(item)
+                    self._wake()
+                    continue
+                if not item:
+                    continue
+
+                # The first delta goes straight out so time-to-first-token
+                # is unchanged; later ones may wait for company.
+                first = not self.parts
+                self.parts.append(item)
+                self._items.append(item)
+                self._pending_chars += len(item)
+                if first or self._pending_chars >= self.max_chars:
+                    self._wake()
+                elif self._timer is None and not self._ready:
+                    self._timer = loop.call_later(self.max_delay, self._wake)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done = True
+            self._wake()
+
+    def _take(self) -> list:
+        """Hand over everything received so far and restart the window."""
+        items, self._items = self._items, []
+        self._pending_chars = 0
+        self._ready = False
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return items
+
+    async def frames(self, source: AsyncIterable[Union[str, dict]]) -> AsyncGenerator[str, None]:
+        if not self.coalesce:
+            async for item in source:
+                if isinstance(item, str):
+                    if not item:
+                        continue
+                    self.parts.append(item)
+                    item = {"content": item}
+                elif "content" in item:
+                    self.parts.append(item["content"])
+                self.frames_sent += 1
+                yield sse_event(item)
+            return
+
+        loop = asyncio.get_running_loop()
+        producer = asyncio.ensure_future(self._produce(source))
+        try:
+            while True:
+                if not self._ready:
+                    self._wakeup = loop.create_future()
+                    await self._wakeup
+
+                text: list[str] = []
+                for item in self._take():
+                    if isinstance(item, str):
+                        text.append(item)
+                        continue
+                    if text:
+                        self.frames_sent += 1
+                        yield sse_event({"content": "".join(text)})
+                        text = []
+                    self.frames_sent += 1
+                    yield sse_event(item)
+                if text:
+                    self.frames_sent += 1
+                    yield sse_event({"content": "".join(text)})
+
+                if self._done and not self._items:
+                    break
+            if self._error is not None:
+                raise self._error
+        finally:
+            if self._timer is not None:
+                self._timer.cancel()
+            if not producer.done():
+                producer.cancel()
+
+
+@dataclass
+class StreamMeta:
+    """What the upstream said about a stream besides its text."""
+    finish_reason: Optional[str] = None
+    usage: Optional[dict] = None
+
+
+class SSEParser:
+    """
+    Incremental parser for an OpenAI-style completion stream.
+
+    ``feed(data)`` takes raw bytes as they arrive and returns the content
+    deltas completed by them. ``done`` is set on ``data: [DONE]``. Each
+    ``data:`` line is one event (Groq never splits a chunk over several
+    lines); comments, ``event:``/``id:`` fields and blank lines are skipped.
+    """
+
+    def __init__(self, meta: Optional[StreamMeta] = None):
+        self.meta = meta or StreamMeta()
+        self.done = False
+        self._buffer = b""
+
+    def feed(self, data: bytes) -> list[str]:
+        if self.done:
+            return []
+        lines = data.split(b"\n")
+        if self._buffer:
+            lines[0] = self._buffer + lines[0]
+        self._buffer = lines.pop()  # incomplete until its newline arrives
+        deltas = []
+        for line in lines:
+            if not line.startswith(_DATA):
+                continue
+            payload = line[5:].strip()
+            if payload == _DONE:
+                self.done = True
+                self._buffer = b""
+                break
+            delta = self._content(payload)
+            if delta:
+                deltas.append(delta)
+        return deltas
+
+    def _content(self, payload: bytes) -> Optional[str]:
+        # Fast path: a mid-stream delta whose text has no escapes is sliced
+        # straight out of the bytes. Quotes inside the text are escaped, so
+        # the markers below can only match the chunk's own structure.
+        begin = payload.find(_CONTENT)
+        if begin != -1:
+            begin += len(_CONTENT)
+            end = payload.find(b'"', begin)
+            if (
+                end != -1
+                and payload.find(b"\\", begin, end) == -1
+                and payload.find(_NOT_FINISHED, end) != -1
+                and payload.find(_USAGE, end) == -1
+            ):
+                return payload[begin:end].decode()
+
+        try:
+            chunk = loads(payload)
+        except ValueError:
+            logger.debug(f"Skipping undecodable stream chunk: {payload[:80]!r}")
+            return None
+        if chunk.get("error"):
+            logger.warning(f"Groq stream error event: {chunk['error']}")
+        usage = (chunk.get("x_groq") or {}).get("usage") or chunk.get("usage")
+        if usage:
+            self.meta.usage = usage
+        choices = chunk.get("choices")
+        if not choices:
+            return None
+        if choices[0].get("finish_reason"):
+            self.meta.finish_reason = choices[0]["finish_reason"]
+        return (choices[0].get("delta") or {}).get("content")
+
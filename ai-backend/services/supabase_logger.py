@@ -2,57 +2,235 @@
 Supabase logger service for AI interactions.
 """
 import asyncio
+import logging
+import time
 from datetime import datetime
 from typing import Optional
 from config import settings
 
+from postgrest.exceptions import APIError
+
 from services.db import get_supabase_client
+from services.data_access import insert_ai_logs
+from services.tracing import span
+
+logger = logging.getLogger(__name__)
 
 
-async def log_ai_interaction(
+def _build_row(
     user_id: Optional[str],
     prompt: str,
     response: str,
     model: str,
-    tokens_used: Optional[int] = None
-) -> bool:
+    tokens_used: Optional[int],
+    routing: Optional[dict] = None
+) -> dict:
+    row = {
+        "user_id": user_id,
+        "prompt": prompt[:5000],  # Limit prompt length
+        "response": response[:10000],  # Limit response length
+        "model": model,
+        "tokens_used": tokens_used,
+        "created_at": datetime.utcnow().isoformat()
+    }
+    # Every row of a batch must have the same keys, so this is all-or-nothing.
+    if settings.ai_log_routing:
+        row["routing"] = routing
+    return row
+
+
+def _is_row_error(error: APIError) -> bool:
+    """Data exception (22xxx) or integrity violation (23xxx) caused by a row's values."""
+    return str(error.code or "")[:2] in ("22", "23")
+
+
+class AILogWriter:
     """
-    Log an AI interaction to Supabase.
+    Write-behind pipeline for ai_logs.
     
-    Args:
-        user_id: Optional user ID (can be None for anonymous)
-        prompt: The user's prompt/message
-        response: The AI's response
-        model: Model identifier used
-        tokens_used: Optional token count
-        
-    Returns:
-        True if logged successfully, False otherwise
+    Interactions are queued in a bounded in-process queue and a single
+    background task drains it in multi-row inserts, flushing when a batch
+    fills up or the flush window elapses. When the queue is full the
+    configured drop policy applies: "block" applies backpressure to the
+    caller (up to ``enqueue_timeout``), "drop_newest" discards the new row
+    and "drop_oldest" discards the oldest queued row.
     """
-    client = get_supabase_client()
     
-    if client is None:
-        # Supabase not configured, skip logging
-        return False
+    def __init__(
+        self,
+        max_queue: int = 10000,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        drop_policy: str = "drop_newest",
+        enqueue_timeout: float = 0.5,
+    ):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flushing: Optional[asyncio.Future] = None
+        self._pending: list[dict] = []
+        self.enqueued = 0
+        self.dropped = 0
+        self.flushed_rows = 0
+        self.failed_rows = 0
+        self.rejected_rows = 0
+        self.batches = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
     
-    try:
-        # Run in executor to avoid blocking
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(
-            None,
-            lambda: client.table("ai_logs").insert({
-                "user_id": user_id,
-                "prompt": prompt[:5000],  # Limit prompt length
-                "response": response[:10000],  # Limit response length
-                "model": model,
-                "tokens_used": tokens_used,
-                "created_at": datetime.utcnow().isoformat()
-            }).execute()
-        )
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        return self._queue
+    
+    def start(self):
+        """Start the background drain task."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the drain task and flush everything still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        
+        if self._flushing is not None and not self._flushing.done():
+            await self._flushing
+        if self._pending:
+            batch, self._pending = self._pending, []
+            await self._flush(batch)
+        while self._queue is not None and not self._queue.empty():
+            await self._flush(self._take_batch())
+    
+    async def enqueue(self, row: dict) -> bool:
+        """Queue a row for insertion. Returns False if it was dropped."""
+        self.start()
+        queue = self.queue
+        
+        try:
+            queue.put_nowait(row)
+        except asyncio.QueueFull:
+            if self.drop_policy == "block":
+                try:
+                    await asyncio.wait_for(queue.put(row), timeout=self.enqueue_timeout)
+                except asyncio.TimeoutError:
+                    self.dropped += 1
+                    return False
+            elif self.drop_policy == "drop_oldest":
+                queue.get_nowait()
+                self.dropped += 1
+                queue.put_nowait(row)
+            else:
+                self.dropped += 1
+                return False
+        
+        self.enqueued += 1
         return True
-    except Exception as e:
-        print(f"Failed to log AI interaction: {e}")
-        return False
+    
+    def _take_batch(self) -> list[dict]:
+        batch = []
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+    
+    async def _run(self):
+        queue = self.queue
+        loop = asyncio.get_running_loop()
+        while True:
+            self._pending = [await queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(self._pending) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._pending.append(await asyncio.wait_for(queue.get(), timeout=timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            batch, self._pending = self._pending, []
+            # Shield the insert so shutdown never cancels a half-sent batch.
+            self._flushing = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._flushing)
+    
+    async def _flush(self, batch: list[dict]):
+        if not batch:
+            return
+        
+        if get_supabase_client() is None:
+            return
+        
+        started = time.perf_counter()
+        try:
+            await self._insert(batch)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.batches += 1
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+    
+    async def _insert(self, rows: list[dict]):
+        """
+        Insert ``rows``; if the database rejects row data (e.g. a malformed
+        user_id), split the batch in half and retry so only the offending
+        rows are lost. Anything else (outage, permissions, schema) fails the
+        batch once without retrying.
+        """
+        try:
+            await insert_ai_logs(rows)
+            self.flushed_rows += len(rows)
+        except APIError as e:
+            if not _is_row_error(e):
+                self.failed_rows += len(rows)
+                logger.error(f"Failed to flush {len(rows)} AI log rows: {e}")
+                return
+            if len(rows) == 1:
+                self.rejected_rows += 1
+                logger.warning(f"AI log row rejected: {e}")
+                return
+            middle = len(rows) // 2
+            await self._insert(rows[:middle])
+            await self._insert(rows[middle:])
+        except Exception as e:
+            self.failed_rows += len(rows)
+            logger.error(f"Failed to flush {len(rows)} AI log rows: {e}")
+    
+    def stats(self) -> dict:
+        """Queue depth and flush counters."""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "drop_policy": self.drop_policy,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "flushed_rows": self.flushed_rows,
+            "failed_rows": self.failed_rows,
+            "rejected_rows": self.rejected_rows,
+            "batches": self.batches,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / self.batches, 2) if self.batches else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
+
+
+# Global writer instance
+ai_log_writer = AILogWriter(
+    max_queue=settings.ai_log_queue_size,
+    batch_size=settings.ai_log_batch_size,
+    flush_interval=settings.ai_log_flush_interval,
+    drop_policy=settings.ai_log_drop_policy,
+)
 
 
 async def log_ai_interaction_async(
@@ -60,12 +238,17 @@ async def log_ai_interaction_async(
     prompt: str,
     response: str,
     model: str,
-    tokens_used: Optional[int] = None
+    tokens_used: Optional[int] = None,
+    routing: Optional[dict] = None
 ):
     """
-    Fire-and-forget async logging.
-    This won't block the response to the user.
+    Queue an interaction for batched logging.
+    This won't block the response to the user beyond the drop policy.
     """
-    asyncio.create_task(
-        log_ai_interaction(user_id, prompt, response, model, tokens_used)
-    )
+    if get_supabase_client() is None:
+        return
+    
+    with span("ai_log"):
+        await ai_log_writer.enqueue(
+            _build_row(user_id, prompt, response, model, tokens_used, routing)
+        )
@@ -0,0 +1,166 @@
+"""
+Token-based quotas per user and tool.
+
+Request-count limits treat a 20-token tutor reply like a 4096-token notes
+generation. These quotas meter what actually costs money upstream: every
+user gets a tokens-per-minute and tokens-per-day budget for each tool.
+
+Before dispatch a route calls ``token_quota.check`` with a projected cost
+(prompt estimate plus ``max_tokens``); if that would overrun a window the
+request is refused with ``TokenQuotaExceeded`` and the seconds until the
+window resets. The check also opens a quota scope for the request, and
+``GroqClient`` charges the real ``usage.total_tokens`` of every completion
+made inside it (estimated for streams without usage), including sharded and
+map-reduce fan-out. Responses served from cache or coalesced onto another
+user's in-flight request are not charged.
+
+Counters live in the rate limiter's storage (``settings.rate_limit_storage_uri``)
+so they are shared by every worker that shares the request limits.
+"""
+import logging
+import math
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from limits.storage import storage_from_string
+
+import middleware.limiter_storage  # noqa: F401  (registers sqlite://)
+from config import settings
+from services.tokens import message_tokens
+
+logger = logging.getLogger(__name__)
+
+WINDOWS = {"minute": 60, "day": 86400}
+
+# Token budgets per tool, per user
+TOKEN_QUOTAS = {
+    "default": {"minute": settings.token_quota_per_minute, "day": settings.token_quota_per_day},
+    "tutor": {"minute": 12000, "day": 150000},
+    "quiz": {"minute": 24000, "day": 150000},
+    "summarize": {"minute": 30000, "day": 200000},
+    "notes": {"minute": 24000, "day": 150000},
+}
+
+
+class TokenQuotaExceeded(Exception):
+    """A request's projected cost does not fit the caller's token quota."""
+
+    def __init__(self, tool: str, window: str, limit: int, used: int, retry_after: int):
+        self.tool = tool
+        self.window = window
+        self.limit = limit
+        self.used = used
+        self.retry_after = retry_after
+        super().__init__(
+            f"{tool} token quota of {limit}/{window} exceeded ({used} used); "
+            f"retry in {retry_after}s"
+        )
+
+
+@dataclass
+class QuotaScope:
+    """The user and tool that upstream calls in this request are charged to."""
+    user: str
+    tool: str
+    charged: int = 0
+
+
+_scope: ContextVar[Optional[QuotaScope]] = ContextVar("token_quota_scope", default=None)
+
+
+def projected_cost(messages: list[dict], max_tokens: int) -> int:
+    """Worst-case tokens for one completion: the prompt plus a full reply."""
+    return sum(message_tokens(m) for m in messages) + max_tokens
+
+
+class TokenQuota:
+    """Per-user, per-tool token windows over a ``limits`` storage backend."""
+
+    def __init__(self, storage_uri: str, enabled: bool = True):
+        self.storage_uri = storage_uri
+        self.enabled = enabled
+        self._storage = None
+        self._rejected = 0
+        self._charged = 0
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            self._storage = storage_from_string(self.storage_uri)
+        return self._storage
+
+    @staticmethod
+    def _key(user: str, tool: str, window: str) -> str:
+        return f"tokens/{tool}/{window}/{user}"
+
+    def usage(self, user: str, tool: str) -> dict:
+        """Tokens used, limit and seconds to reset for each window."""
+        quotas = TOKEN_QUOTAS.get(tool, TOKEN_QUOTAS["default"])
+        now = time.time()
+        report = {}
+        for window, limit in quotas.items():
+            key = self._key(user, tool, window)
+            used = self.storage.get(key)
+            reset_in = math.ceil(self.storage.get_expiry(key) - now) if used else 0
+            report[window] = {"used": used, "limit": limit, "reset_in": max(reset_in, 0)}
+        return report
+
+    def check(self, user: str, tool: str, projected: int):
+        """
+        Refuse the request if ``projected`` tokens would overrun any window,
+        otherwise charge this request's upstream usage to ``user``/``tool``.
+
+        A projection larger than a whole window is capped at the window, so
+        an expensive request still runs once the user's budget is untouched.
+        Storage failures fail open.
+        """
+        if not self.enabled:
+            return
+        try:
+            exceeded = [
+                (window, state) for window, state in self.usage(user, tool).items()
+                if state["used"] + min(projected, state["limit"]) > state["limit"]
+            ]
+            if exceeded:
+                # Report the window that resets last, so Retry-After is enough for all.
+                window, state = max(exceeded, key=lambda item: item[1]["reset_in"])
+                self._rejected += 1
+                raise TokenQuotaExceeded(
+                    tool, window, state["limit"], state["used"], max(state["reset_in"], 1)
+                )
+        except TokenQuotaExceeded:
+            raise
+        except Exception as e:
+            logger.warning(f"Token quota check failed, allowing request: {e}")
+        _scope.set(QuotaScope(user=user, tool=tool))
+
+    def charge(self, tokens: int):
+        """Add ``tokens`` to the current request's scope, if there is one."""
+        scope = _scope.get()
+        if scope is None or tokens <= 0:
+            return
+        try:
+            for window, seconds in WINDOWS.items():
+                self.storage.incr(self._key(scope.user, scope.tool, window), seconds, amount=tokens)
+        except Exception as e:
+            logger.warning(f"Failed to charge {tokens} tokens to {scope.user}: {e}")
+            return
+        scope.charged += tokens
+        self._charged += tokens
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "storage": self.storage_uri.split("://", 1)[0],
+            "tokens_charged": self._charged,
+            "requests_rejected": self._rejected,
+        }
+
+
+# Global quota instance
+token_quota = TokenQuota(
+    settings.rate_limit_storage_uri,
+    enabled=settings.token_quota_enabled,
+)
@@ -0,0 +1,29 @@
+"""
+Cheap token estimates shared by the tutor window, summarizer and quotas.
+"""
+
+# Per-message framing overhead (role tags, separators) in the chat template.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate for Llama-family tokenizers.
+
+    Roughly four characters per token for English prose; words are used as a
+    floor so short, whitespace-heavy text is not undercounted.
+    """
+    if not text:
+        return 0
+    return max(len(text) // 4, int(len(text.split()) * 1.3)) + 1
+
+
+def message_tokens(message: dict) -> int:
+    return estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Trim text to roughly ``budget`` tokens, keeping the beginning."""
+    if estimate_tokens(text) <= budget:
+        return text
+    return text[:budget * 4].rsplit(" ", 1)[0] + " …"
@@ -0,0 +1,93 @@
+"""
+Request-scoped span timing.
+
+TracingMiddleware puts a ``RequestTrace`` in a ContextVar for every request;
+code on the request path wraps its phases in ``span("name")`` (or calls
+``record`` for durations it already measures), and the middleware reports
+the spans in a ``Server-Timing`` header and one log line per request.
+Tasks started by the request (stream producers, hedged attempts) copy the
+context and record into the same trace. Outside a request, or with tracing
+disabled, ``span`` and ``record`` do nothing.
+
+Spans in use:
+
+    prompt      building messages (context truncation, history window)
+    queue       waiting for an upstream governor slot
+    llm         a non-streaming completion, including retries
+    llm_ttft    a streaming completion up to its first content delta
+    llm_stream  a streaming completion from request to the last delta
+    ai_log      handing the ai_logs row to the batch writer (or writing it)
+    db          a Supabase query, including the wait for a DB thread
+
+The same name recorded several times (map-reduce chunks, parallel lessons)
+is summed, so spans can add up to more than the request's wall time.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+class RequestTrace:
+    """Spans recorded while serving one request."""
+
+    __slots__ = ("started", "spans", "profile")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: list[tuple[str, float]] = []
+        # Folded stack -> sample count while this request is being profiled.
+        self.profile = None
+
+    def add(self, name: str, seconds: float):
+        self.spans.append((name, seconds))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def totals(self) -> dict[str, tuple[float, int]]:
+        """Span name -> (total seconds, occurrences), in first-seen order."""
+        totals: dict[str, tuple[float, int]] = {}
+        for name, seconds in self.spans:
+            total, count = totals.get(name, (0.0, 0))
+            totals[name] = (total + seconds, count + 1)
+        return totals
+
+    def server_timing(self, app: Optional[float] = None) -> str:
+        """Render as a ``Server-Timing`` header value (durations in ms)."""
+        metrics = []
+        for name, (seconds, count) in self.totals().items():
+            metric = f"{name};dur={seconds * 1000:.1f}"
+            if count > 1:
+                metric += f';desc="x{count}"'
+            metrics.append(metric)
+        if app is not None:
+            metrics.append(f"app;dur={app * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def as_log(self) -> dict:
+        return {name: round(seconds * 1000, 1) for name, (seconds, _) in self.totals().items()}
+
+
+current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the enclosed block as span ``name`` of the current request."""
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - started)
+
+
+def record(name: str, seconds: float):
+    """Add a span measured elsewhere to the current request."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
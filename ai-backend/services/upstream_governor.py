@@ -0,0 +1,218 @@
+"""
+Process-wide concurrency governor for upstream Groq calls.
+
+Every completion takes a slot before it is sent. The number of slots is
+adjusted AIMD-style, like TCP congestion control: it grows by roughly one
+per window of healthy responses (time to response headers under
+``settings.upstream_latency_target``) and is cut multiplicatively when
+Groq answers 429 or 503, after which dispatch pauses for the ``Retry-After``
+the upstream asked for. Requests over the limit wait in a FIFO queue rather
+than failing; only a full queue or a wait longer than
+``settings.upstream_queue_timeout`` raises ``UpstreamBusy``.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from config import settings
+from services.metrics import (
+    Histogram,
+    registry,
+    UPSTREAM_CONCURRENCY_LIMIT,
+    UPSTREAM_IN_FLIGHT,
+    UPSTREAM_QUEUE_DEPTH,
+    UPSTREAM_QUEUE_WAIT,
+)
+from services.tracing import record
+
+logger = logging.getLogger(__name__)
+
+QUEUE_WAIT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class UpstreamBusy(Exception):
+    """The upstream is saturated and this request could not be scheduled."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Slot:
+    """One admitted upstream request; the caller reports how it went."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.latency: Optional[float] = None
+        self.retry_after: Optional[float] = None
+
+    def mark_ready(self):
+        """Response headers arrived with a success status."""
+        self.latency = time.monotonic() - self.started
+
+    def throttle(self, retry_after: float):
+        """Upstream answered 429/503; back off for ``retry_after`` seconds."""
+        self.retry_after = retry_after
+
+
+class UpstreamGovernor:
+    """AIMD concurrency limit with a FIFO wait queue."""
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        latency_target: float,
+        backoff_factor: float,
+        max_queue: int,
+        queue_timeout: float
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff_factor = backoff_factor
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._paused_until = 0.0
+        self._last_backoff = 0.0
+        self._wake_handle: Optional[asyncio.TimerHandle] = None
+
+        self.queue_wait = Histogram(QUEUE_WAIT_BUCKETS)
+        self._peak_queue = 0
+        self._throttled = 0
+        self._rejected = 0
+        self._latency_ewma: Optional[float] = None
+
+    def _capacity(self) -> bool:
+        return self._in_flight < int(self.limit) and time.monotonic() >= self._paused_until
+
+    def _wake(self):
+        """Hand free slots to waiters in arrival order."""
+        self._wake_handle = None
+        while self._waiters and self._capacity():
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self._in_flight += 1
+            waiter.set_result(None)
+
+        delay = self._paused_until - time.monotonic()
+        if self._waiters and delay > 0 and self._wake_handle is None:
+            self._wake_handle = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    async def acquire(self):
+        started = time.monotonic()
+        if not self._waiters and self._capacity():
+            self._in_flight += 1
+            self.queue_wait.observe(0.0)
+            record("queue", 0.0)
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self._rejected += 1
+            raise UpstreamBusy("Upstream queue is full", self._retry_hint())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._peak_queue = max(self._peak_queue, len(self._waiters))
+        self._wake()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # A slot was handed over as we gave up; pass it on.
+                self._in_flight -= 1
+                self._wake()
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+            if isinstance(e, asyncio.TimeoutError):
+                self._rejected += 1
+                raise UpstreamBusy(
+                    f"Timed out after {self.queue_timeout:.0f}s waiting for upstream capacity",
+                    self._retry_hint()
+                ) from None
+            raise
+        self.queue_wait.observe(time.monotonic() - started)
+        record("queue", time.monotonic() - started)
+
+    def release(self, slot: Slot):
+        self._in_flight -= 1
+        now = time.monotonic()
+
+        if slot.retry_after is not None:
+            self._throttled += 1
+            self._paused_until = max(self._paused_until, now + slot.retry_after)
+            # Responses already in flight when the limit was hit all come
+            # back throttled; cut once per back-off period, not per response.
+            if now - self._last_backoff >= max(slot.retry_after, 1.0):
+                self.limit = max(self.min_limit, self.limit * self.backoff_factor)
+                self._last_backoff = now
+                logger.warning(
+                    f"Upstream throttled, concurrency limit -> {int(self.limit)}, "
+                    f"pausing {slot.retry_after:.1f}s"
+                )
+        elif slot.latency is not None:
+            ewma = self._latency_ewma
+            self._latency_ewma = slot.latency if ewma is None else ewma * 0.8 + slot.latency * 0.2
+            if slot.latency <= self.latency_target:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[Slot]:
+        await self.acquire()
+        slot = Slot()
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    def _retry_hint(self) -> float:
+        return max(self._paused_until - time.monotonic(), 1.0)
+
+    def stats(self) -> dict:
+        return {
+            "concurrency_limit": int(self.limit),
+            "in_flight": self._in_flight,
+            "queue_depth": len(self._waiters),
+            "peak_queue_depth": self._peak_queue,
+            "paused_for_seconds": round(max(self._paused_until - time.monotonic(), 0.0), 3),
+            "throttled_responses": self._throttled,
+            "rejected_requests": self._rejected,
+            "latency_ewma_seconds": round(self._latency_ewma, 3) if self._latency_ewma else None,
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+        }
+
+
+# Global governor instance
+upstream_governor = UpstreamGovernor(
+    initial=settings.upstream_initial_concurrency,
+    min_limit=settings.upstream_min_concurrency,
+    max_limit=settings.upstream_max_concurrency,
+    latency_target=settings.upstream_latency_target,
+    backoff_factor=settings.upstream_backoff_factor,
+    max_queue=settings.upstream_max_queue,
+    queue_timeout=settings.upstream_queue_timeout,
+)
+UPSTREAM_QUEUE_WAIT.attach(upstream_governor.queue_wait)
+
+
+def _collect_metrics():
+    UPSTREAM_CONCURRENCY_LIMIT.set(value=int(upstream_governor.limit))
+    UPSTREAM_IN_FLIGHT.set(value=upstream_governor._in_flight)
+    UPSTREAM_QUEUE_DEPTH.set(value=len(upstream_governor._waiters))
+
+
+registry.add_collector(_collect_metrics)
+
@@ -0,0 +1,173 @@
+"""
+Retry, hedging and circuit-breaker primitives for upstream Groq calls.
+
+``GroqClient`` uses these around non-streaming completions:
+
+- transient failures (transport errors, timeouts, 5xx) are retried with
+  full-jitter exponential backoff;
+- with hedging enabled, a second identical request is sent once the first
+  has been outstanding longer than that model's recent p95 latency, and
+  whichever finishes first wins;
+- a per-model circuit breaker opens after consecutive failures so callers
+  fail fast (``CircuitOpen``, a 503 with ``Retry-After``) instead of each
+  waiting out the same outage, then lets one probe through after a
+  cool-down.
+"""
+import logging
+import random
+import time
+from collections import deque
+from typing import Optional
+
+from config import settings
+from services.metrics import registry, CIRCUIT_OPEN
+from services.upstream_governor import UpstreamBusy
+
+logger = logging.getLogger(__name__)
+
+
+class GroqAPIError(Exception):
+    """Non-success response from the Groq API."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Groq API error: {status_code}")
+        self.status_code = status_code
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code >= 500 or self.status_code == 408
+
+
+class CircuitOpen(UpstreamBusy):
+    """The model's circuit breaker is open; the call was not attempted."""
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for retry ``attempt`` (0-based)."""
+    ceiling = min(settings.groq_retry_max_delay, settings.groq_retry_base_delay * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+class LatencyTracker:
+    """Recent successful latencies per model, for hedge delays."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: dict[str, deque] = {}
+
+    def observe(self, model: str, seconds: float):
+        samples = self._samples.get(model)
+        if samples is None:
+            samples = self._samples[model] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile(self, model: str, q: float) -> Optional[float]:
+        samples = self._samples.get(model)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None to not hedge."""
+        if not settings.groq_hedge_enabled:
+            return None
+        p95 = self.percentile(model, 0.95)
+        if p95 is None:
+            return None
+        return max(p95, settings.groq_hedge_min_delay)
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open -> closed."""
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.times_opened = 0
+
+    def before_call(self):
+        """Raise ``CircuitOpen`` unless a call may go through now."""
+        if self.state == "closed":
+            return
+        remaining = self._opened_at + self.reset_timeout - time.monotonic()
+        if self.state == "open" and remaining <= 0:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return
+        raise CircuitOpen(
+            f"Model {self.name} is temporarily unavailable",
+            max(remaining, 1.0)
+        )
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info(f"Circuit for {self.name} closed")
+        self.state = "closed"
+        self._failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                logger.warning(
+                    f"Circuit for {self.name} opened after {self._failures} failures, "
+                    f"cooling down {self.reset_timeout:.0f}s"
+                )
+            self.state = "open"
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self):
+        """A half-open probe ended without a verdict (e.g. cancelled)."""
+        self._probing = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "times_opened": self.times_opened,
+        }
+
+
+class CircuitBreakers:
+    """Lazily created breaker per model."""
+
+    def __init__(self):
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def get(self, model: str) -> CircuitBreaker:
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            breaker = self._breakers[model] = CircuitBreaker(
+                model,
+                settings.groq_breaker_failure_threshold,
+                settings.groq_breaker_reset_timeout
+            )
+        return breaker
+
+    def stats(self) -> dict:
+        return {model: breaker.stats() for model, breaker in self._breakers.items()}
+
+
+# Global instances
+latency_tracker = LatencyTracker()
+circuit_breakers = CircuitBreakers()
+
+
+def _collect_metrics():
+    for model, breaker in circuit_breakers._breakers.items():
+        CIRCUIT_OPEN.set(model, value=0 if breaker.state == "closed" else 1)
+
+
+registry.add_collector(_collect_metrics)
+
@@ -77,9 +77,21 @@ CREATE TABLE public.ai_logs (
   response TEXT,
   model TEXT, -- 'llama-3', 'gpt-4', etc.
   tokens_used INT,
+  routing JSONB, -- model routing decision: tool, reason, failovers, latency_ms
   created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Existing databases: add the routing column, then set AI_LOG_ROUTING=true
+ALTER TABLE public.ai_logs ADD COLUMN IF NOT EXISTS routing JSONB;
+
+-- INDEXES
+
+-- Dashboard listing: keyset pagination on (created_at, id)
+CREATE INDEX IF NOT EXISTS courses_created_at_id_idx ON public.courses (created_at DESC, id DESC);
+
+-- Embedded lessons lookups per course (progress is covered by its UNIQUE(user_id, lesson_id))
+CREATE INDEX IF NOT EXISTS lessons_course_id_order_idx ON public.lessons (course_id, order_index);
+
 -- ROW LEVEL SECURITY (RLS) POLICIES
 
 -- Enable RLS on all tables